@@ -5,13 +5,14 @@ v5.0 - Industrial UI & Image Gallery Integration
 
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import firebase_admin
 from firebase_admin import credentials, db
 from datetime import datetime
 import time
 
+from dashboard_data import RECENT_LIMIT, fetch_detections, summary_metrics, build_charts
+from gallery import Gallery
+
 # ============================================================================
 # 1. PAGE CONFIGURATION & STYLING
 # ============================================================================
@@ -70,25 +71,8 @@ def get_data():
     if not database: return pd.DataFrame()
     
     try:
-        ref = database.reference('detections')
         # Fetch last 50 records for performance
-        snapshot = ref.order_by_key().limit_to_last(50).get()
-        
-        if not snapshot: return pd.DataFrame()
-        
-        data_list = []
-        for key, val in snapshot.items():
-            val['id'] = key
-            data_list.append(val)
-            
-        df = pd.DataFrame(data_list)
-        
-        # Process timestamps
-        if 'unix_timestamp' in df.columns:
-            df['datetime'] = pd.to_datetime(df['unix_timestamp'], unit='s')
-            df = df.sort_values('unix_timestamp', ascending=False)
-            
-        return df
+        return fetch_detections(database, RECENT_LIMIT)
     except Exception as e:
         return pd.DataFrame()
 
@@ -101,6 +85,41 @@ def get_system_status():
     except:
         return {}
 
+@st.cache_resource
+def get_gallery():
+    """Index of the local detected_faults/ images (shared across reruns)"""
+    return Gallery()
+
+GALLERY_PAGE_SIZE = 12
+
+def local_gallery():
+    """Paginated thumbnails of the images test.py saved on this machine (works offline)"""
+    st.markdown("### Local Defect Gallery")
+    gallery = get_gallery()
+    gallery.refresh()
+    counts = gallery.counts()
+    if not counts:
+        st.info(f"No local defect images yet in {gallery.directory}")
+        return
+
+    f1, f2, f3 = st.columns([2, 2, 1])
+    defect = f1.selectbox("Defect type", ["All"] + list(counts), key="gallery_type")
+    min_conf = f2.slider("Min. confidence", 0.0, 1.0, 0.0, 0.05, key="gallery_conf")
+    defect = None if defect == "All" else defect
+    min_conf = min_conf or None
+    pages = max(1, -(-gallery.count(defect, min_conf) // GALLERY_PAGE_SIZE))
+    page = f3.number_input("Page", min_value=1, max_value=pages, value=1, key="gallery_page")
+
+    rows, total = gallery.page(page - 1, GALLERY_PAGE_SIZE, defect, min_conf)
+    cols = st.columns(4)
+    for idx, row in enumerate(rows):
+        with cols[idx % 4]:
+            st.image(row['thumb_path'], use_container_width=True)
+            conf = f"{row['confidence']:.1%} | " if row['confidence'] is not None else ""
+            st.caption(f"**{str(row['defect_type']).upper()}** {conf}"
+                       f"{datetime.fromtimestamp(row['captured']).strftime('%Y-%m-%d %H:%M:%S')}")
+    st.caption(f"{total} images · page {page} of {pages}")
+
 # ============================================================================
 # 4. DASHBOARD LAYOUT
 # ============================================================================
@@ -134,51 +153,32 @@ def main():
     else:
         m1.error(f"System: {status_text}")
     
+    total_count, latest_defect, avg_conf = summary_metrics(df)
+
     # 2. Total Defects
-    total_count = len(df)
     m2.metric("Total Detections", total_count)
     
     # 3. Latest Defect
-    latest_defect = "N/A"
-    if not df.empty:
-        latest_defect = df.iloc[0].get('defect_type', 'N/A').upper()
     m3.metric("Last Defect Type", latest_defect)
     
     # 4. Average Confidence
-    avg_conf = 0
-    if not df.empty and 'confidence' in df.columns:
-        avg_conf = df['confidence'].mean()
     m4.metric("Avg. Confidence", f"{avg_conf:.1%}")
 
     # --- MAIN CONTENT AREA ---
     if not df.empty:
         st.markdown("### Operations Analytics")
         c1, c2 = st.columns([1, 2])
+        pie, timeline = build_charts(df)
         
         with c1:
             # Donut Chart for Defect Distribution
-            if 'defect_type' in df.columns:
-                counts = df['defect_type'].value_counts().reset_index()
-                counts.columns = ['Type', 'Count']
-                fig = px.pie(counts, values='Count', names='Type', hole=0.5, 
-                             color_discrete_sequence=px.colors.qualitative.Bold)
-                fig.update_layout(showlegend=True, margin=dict(t=20, b=20, l=20, r=20), height=280)
-                st.plotly_chart(fig, use_container_width=True)
+            if pie is not None:
+                st.plotly_chart(pie, use_container_width=True)
         
         with c2:
             # Scatter Plot Timeline
-            if 'datetime' in df.columns:
-                fig2 = px.scatter(df, x='datetime', y='confidence', color='defect_type',
-                                size='confidence', hover_data=['defect_type'],
-                                color_discrete_sequence=px.colors.qualitative.Bold)
-                fig2.update_layout(
-                    xaxis_title="Timestamp", 
-                    yaxis_title="Confidence Score",
-                    margin=dict(t=20, b=20, l=0, r=0),
-                    height=280,
-                    showlegend=True
-                )
-                st.plotly_chart(fig2, use_container_width=True)
+            if timeline is not None:
+                st.plotly_chart(timeline, use_container_width=True)
 
         # --- IMAGE GALLERY SECTION ---
         st.divider()
@@ -224,6 +224,10 @@ def main():
     else:
         st.info("System Ready. Waiting for incoming data stream...")
 
+    # --- LOCAL GALLERY (detected_faults/ on this machine) ---
+    st.divider()
+    local_gallery()
+
     # Auto-refresh every 3 seconds to keep dashboard live
     time.sleep(3)
     st.rerun()
@@ -0,0 +1,203 @@
+"""
+Detection Pipeline Benchmark
+Replays test/ and valid/ images through the same steps run_detection_system
+uses and reports p50/p95/p99 latency per stage, swept over image size, batch
+size and model backend. Results are written as JSON and can be compared with
+a stored baseline to flag slowdowns.
+"""
+
+import io
+import sys
+import json
+import hashlib
+import time
+import platform
+import argparse
+import tempfile
+import contextlib
+from pathlib import Path
+from datetime import datetime
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+from cloud_client import CloudClient
+from local_db import LocalDatabase
+from model_registry import backend_name
+from postprocess import process_results
+
+STAGES = ['decode', 'preprocess', 'inference', 'nms', 'results', 'plot', 'imwrite', 'upload']
+
+
+def percentiles(samples):
+    a = np.asarray(samples, dtype=np.float64)
+    return {
+        'p50': round(float(np.percentile(a, 50)), 3),
+        'p95': round(float(np.percentile(a, 95)), 3),
+        'p99': round(float(np.percentile(a, 99)), 3),
+        'mean': round(float(a.mean()), 3),
+        'n': int(a.size),
+    }
+
+
+def run_config(model, image_files, imgsz, batch, conf, out_dir, client, repeat=1):
+    """Time every stage for each image; returns {stage: [ms, ...]}"""
+    times = {stage: [] for stage in STAGES}
+    files = list(image_files) * repeat
+
+    # Warm-up so lazy initialisation does not land in the first sample
+    model.predict(source=cv2.imread(str(files[0])), imgsz=imgsz, conf=conf, verbose=False)
+
+    for start in range(0, len(files), batch):
+        chunk = files[start:start + batch]
+
+        frames = []
+        for f in chunk:
+            t0 = time.perf_counter()
+            frames.append(cv2.imread(str(f)))
+            times['decode'].append((time.perf_counter() - t0) * 1000)
+
+        results = model.predict(source=frames, imgsz=imgsz, conf=conf, save=False, verbose=False)
+
+        for result in results:
+            # ultralytics reports per-image ms; postprocess is NMS + box rescaling
+            times['preprocess'].append(result.speed['preprocess'])
+            times['inference'].append(result.speed['inference'])
+            times['nms'].append(result.speed['postprocess'])
+
+            t0 = time.perf_counter()
+            _, defects_found, max_conf, detected_types = process_results([result], model.names)
+            times['results'].append((time.perf_counter() - t0) * 1000)
+
+            # The defect branch always runs so every stage has a full sample
+            t0 = time.perf_counter()
+            annotated = result.plot()
+            times['plot'].append((time.perf_counter() - t0) * 1000)
+
+            t0 = time.perf_counter()
+            cv2.imwrite(str(out_dir / "bench.jpg"), annotated)
+            times['imwrite'].append((time.perf_counter() - t0) * 1000)
+
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                client.send_detection(confidence=round(max_conf, 2), ring_count=defects_found,
+                                      defect_type=detected_types[0] if detected_types else "none",
+                                      image_filename="bench.jpg")
+            times['upload'].append((time.perf_counter() - t0) * 1000)
+
+    return times
+
+
+def model_id(model_path):
+    """Model part of a result key: file stem plus a short hash of the path (best.pt is a common name)"""
+    digest = hashlib.sha1(Path(model_path).as_posix().encode()).hexdigest()[:8]
+    return f"{Path(model_path).stem}-{digest}"
+
+
+def compare(report, baseline, tolerance, min_ms):
+    """List of regressions where a stage p95 grew beyond tolerance"""
+    base = {c['key']: c for c in baseline.get('configs', [])}
+    regressions = []
+    for config in report['configs']:
+        ref = base.get(config['key'])
+        if not ref:
+            continue
+        for stage, stats in config['stages'].items():
+            old = ref['stages'].get(stage)
+            if not old:
+                continue
+            if stats['p95'] > old['p95'] * (1 + tolerance) and stats['p95'] - old['p95'] > min_ms:
+                regressions.append((config['key'], stage, old['p95'], stats['p95']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-stage latency benchmark for the detection pipeline')
+    parser.add_argument('--models', nargs='+', default=['runs/detect/train/weights/best.pt'],
+                        help='Model files to compare (.pt, .onnx, *_openvino_model, ...)')
+    parser.add_argument('--sources', nargs='+', default=['test/images', 'valid/images'],
+                        help='Image directories to replay')
+    parser.add_argument('--imgsz', type=int, nargs='+', default=[640], help='Image sizes to sweep')
+    parser.add_argument('--batch', type=int, nargs='+', default=[1], help='Batch sizes to sweep')
+    parser.add_argument('--conf', type=float, default=0.5, help='Confidence threshold (as test.py)')
+    parser.add_argument('--repeat', type=int, default=1, help='Replay the image set N times')
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON output file')
+    parser.add_argument('--baseline', default=None, help='Baseline JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Write results to --baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Allowed relative p95 increase')
+    parser.add_argument('--min-ms', type=float, default=0.5, help='Ignore p95 increases below this')
+    args = parser.parse_args()
+
+    image_files = []
+    for src in args.sources:
+        image_files.extend(sorted(p for p in Path(src).glob("*") if p.suffix.lower() in ('.jpg', '.jpeg', '.png')))
+    if not image_files:
+        print("❌ No images found in sources")
+        return 1
+    print(f"📁 {len(image_files)} images from {', '.join(args.sources)}")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        client = CloudClient(database=LocalDatabase())
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'host': {'machine': platform.machine(), 'processor': platform.processor(),
+                 'python': platform.python_version()},
+        'images': len(image_files),
+        'configs': [],
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for model_path in args.models:
+            model = YOLO(model_path)
+            backend = backend_name(model_path)
+            for imgsz in args.imgsz:
+                for batch in args.batch:
+                    key = f"{model_id(model_path)}|{backend}|imgsz={imgsz}|batch={batch}"
+                    print(f"\n⏱ {key} ({model_path})")
+                    t0 = time.perf_counter()
+                    times = run_config(model, image_files, imgsz, batch, args.conf, Path(tmp), client,
+                                       args.repeat)
+                    elapsed = time.perf_counter() - t0
+
+                    stages = {s: percentiles(v) for s, v in times.items()}
+                    per_frame = np.sum([times[s] for s in STAGES], axis=0)
+                    stages['total'] = percentiles(per_frame)
+                    report['configs'].append({
+                        'key': key, 'model': str(model_path), 'backend': backend,
+                        'imgsz': imgsz, 'batch': batch, 'stages': stages,
+                        'images_per_sec': round(len(per_frame) / elapsed, 2),
+                    })
+
+                    print(f"   {'stage':<11} {'p50':>8} {'p95':>8} {'p99':>8}  (ms)")
+                    for s, st in stages.items():
+                        print(f"   {s:<11} {st['p50']:>8.2f} {st['p95']:>8.2f} {st['p99']:>8.2f}")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📄 Results saved to: {args.output}")
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📌 Baseline updated: {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance, args.min_ms)
+        known = {c['key'] for c in baseline.get('configs', [])}
+        missing = [c['key'] for c in report['configs'] if c['key'] not in known]
+        if missing:
+            print(f"\n⚠ Not in the baseline (not compared): {', '.join(missing)}")
+        if regressions:
+            print(f"\n🚨 {len(regressions)} stage(s) slower than baseline:")
+            for key, stage, old, new in regressions:
+                print(f"   {key} {stage}: p95 {old:.2f} → {new:.2f} ms (+{new / max(old, 1e-9) - 1:.0%})")
+            return 1
+        print("\n✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+"""
+Camera Health Monitor
+Owns a camera connection in a background thread: frames are read on request
+with a timeout, repeated failures move the camera through
+connected -> degraded -> reconnecting -> failed, and reconnects use jittered
+exponential backoff without blocking the detection loop.
+"""
+
+import time
+import random
+import threading
+
+from metrics import CAMERA_RECONNECTS, CAMERA_STATE, CAMERA_RECOVERY_SECONDS
+
+CONNECTED = 'connected'
+DEGRADED = 'degraded'
+RECONNECTING = 'reconnecting'
+FAILED = 'failed'
+STATES = (CONNECTED, DEGRADED, RECONNECTING, FAILED)
+
+
+class Backoff:
+    """Exponential backoff with jitter: delay n is uniform in [(1-jitter)*d, d], d = initial*factor^n"""
+
+    def __init__(self, initial=1.0, maximum=60.0, factor=2.0, jitter=0.5):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.attempt = 0
+
+    def next(self):
+        delay = min(self.maximum, self.initial * self.factor ** self.attempt)
+        self.attempt += 1
+        return delay * (1 - self.jitter * random.random())
+
+    def reset(self):
+        self.attempt = 0
+
+
+class CameraHealth:
+    """
+    Background reader/reconnector for one camera.
+
+    `open_capture` returns an opened cv2.VideoCapture-like object (or raises);
+    `cap` optionally hands over a capture that is already open.
+    read() hands a request to the worker thread and waits at most
+    `read_timeout` seconds. After `reconnect_after` consecutive bad reads the
+    capture is reopened; after `fail_after` consecutive failed reconnects the
+    camera is reported as failed but retries continue at the maximum backoff.
+    """
+
+    def __init__(self, open_capture, name, read_timeout=5.0, reconnect_after=3, fail_after=10,
+                 backoff=None, cap=None):
+        self.open_capture = open_capture
+        self.name = name
+        self.read_timeout = read_timeout
+        self.reconnect_after = reconnect_after
+        self.fail_after = fail_after
+        self.backoff = backoff or Backoff()
+
+        self.state = RECONNECTING
+        self.bad_reads = 0
+        self.failed_attempts = 0
+        self.outage_started = time.monotonic()
+        self._cap = None
+        self._ever_connected = False
+
+        self._cond = threading.Condition()
+        self._requested = 0
+        self._served = 0
+        self._result = (False, None)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'camera-{name}', daemon=True)
+
+        if cap is not None and cap.isOpened():
+            # Adopt an already opened capture (e.g. from a blocking connect_camera())
+            self._cap = cap
+            self._ever_connected = True
+            self._set_state(CONNECTED)
+        else:
+            self._set_state(RECONNECTING)
+
+    # --- caller side ---
+    def start(self, wait=None):
+        """Start the worker; optionally block up to `wait` seconds for the first connection"""
+        self._thread.start()
+        if wait:
+            self.wait_connected(wait)
+        return self
+
+    def wait_connected(self, timeout=None):
+        """Block until the camera is usable (connected or degraded) or the timeout expires"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.usable or self._stop.is_set(), timeout)
+
+    @property
+    def usable(self):
+        return self.state in (CONNECTED, DEGRADED)
+
+    def read(self, timeout=None):
+        """(ok, frame) from the worker thread; (False, None) if unusable or the read times out"""
+        timeout = self.read_timeout if timeout is None else timeout
+        with self._cond:
+            if not self.usable:
+                return False, None
+            self._requested += 1
+            ticket = self._requested
+            self._cond.notify_all()
+            if not self._cond.wait_for(lambda: self._served >= ticket, timeout):
+                # The worker is stuck in cap.read(); count it as a bad read
+                self._bad_read_locked()
+                return False, None
+            return self._result
+
+    def close(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread.is_alive():
+            self._thread.join(timeout=2)
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    # --- worker side ---
+    def _set_state(self, state):
+        previous, self.state = self.state, state
+        for s in STATES:
+            CAMERA_STATE.set(1 if s == state else 0, camera=self.name, state=s)
+        if previous != state:
+            print(f"📷 Camera {self.name}: {previous} → {state}")
+
+    def _bad_read_locked(self):
+        self.bad_reads += 1
+        if self.state == CONNECTED:
+            self._set_state(DEGRADED)
+        if self.bad_reads >= self.reconnect_after and self.usable:
+            self.outage_started = time.monotonic()
+            self._set_state(RECONNECTING)
+            self._cond.notify_all()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.usable:
+                self._reconnect_step()
+                continue
+
+            with self._cond:
+                self._cond.wait_for(lambda: self._requested > self._served or not self.usable
+                                    or self._stop.is_set(), timeout=1.0)
+                if self._requested <= self._served or not self.usable:
+                    continue
+                ticket = self._requested
+
+            ok, frame = self._cap.read()
+
+            with self._cond:
+                self._result = (ok, frame)
+                self._served = ticket
+                if ok:
+                    self.bad_reads = 0
+                    if self.state == DEGRADED:
+                        self._set_state(CONNECTED)
+                else:
+                    self._bad_read_locked()
+                self._cond.notify_all()
+
+    def _reconnect_step(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+        # First attempt after a drop is immediate, later ones back off
+        if self.failed_attempts and self._stop.wait(self.backoff.next()):
+            return
+
+        cap, error = None, None
+        try:
+            cap = self.open_capture()
+        except Exception as e:
+            error = e
+        if cap is None or not cap.isOpened():
+            if cap is not None:
+                cap.release()
+            self.failed_attempts += 1
+            if self._ever_connected:
+                CAMERA_RECONNECTS.inc(camera=self.name, result='failure')
+            if self.failed_attempts == 1 or self.failed_attempts % 10 == 0:
+                print(f"⚠ Camera {self.name}: connect attempt {self.failed_attempts} failed"
+                      + (f" ({error})" if error else ""))
+            with self._cond:
+                if self.failed_attempts >= self.fail_after and self.state != FAILED:
+                    self._set_state(FAILED)
+            return
+
+        with self._cond:
+            self._cap = cap
+            if self._ever_connected:
+                CAMERA_RECONNECTS.inc(camera=self.name, result='success')
+                CAMERA_RECOVERY_SECONDS.observe(time.monotonic() - self.outage_started, camera=self.name)
+            self._ever_connected = True
+            self.bad_reads = 0
+            self.failed_attempts = 0
+            self.backoff.reset()
+            self._set_state(CONNECTED)
+            self._cond.notify_all()
@@ -0,0 +1,235 @@
+"""
+Two-Stage Cascade Inference
+Most rings are fine, so every frame first gets a cheap screening pass (the
+same model at a reduced imgsz, or a smaller model such as a distilled nano)
+at a low confidence. Only frames it flags get the full pass: either the whole
+frame at full imgsz, or ('crops') native-resolution crops around the flagged
+boxes, which also shows small scratches at more pixels than a downscaled
+full frame would. Cascade.predict() returns the same results as
+model.predict(), so test.py and IPCameraCapture use it as a drop-in.
+
+Recall/CPU check on a labeled split (no camera needed):
+python cascade.py --model runs/detect/train/weights/best.pt --split valid/images --screen-conf 0.02 0.05 0.1
+"""
+
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from metrics import CASCADE_FRAMES
+from profiling import stage
+
+CONFIRM_MODES = ('frame', 'crops')
+# Low enough to keep the full model's recall on valid/ in testing (0.05 already lost
+# most of it); raise it only after checking recall for your model with this script
+DEFAULT_SCREEN_CONF = 0.02
+
+
+def _with_boxes(result, data):
+    """Copy of `result` whose boxes are `data` ([n, 6]: xyxy, conf, cls in frame pixels)"""
+    out = result[:0]
+    if hasattr(out, 'update'):
+        # ultralytics Results: boxes are a tensor on the result's device
+        import torch
+        out.update(boxes=torch.as_tensor(data, dtype=torch.float32))
+    else:
+        out.boxes = type(out.boxes)(data)
+    return out
+
+
+def _boxes_array(result):
+    data = result.boxes.data if result.boxes is not None else np.zeros((0, 6), dtype=np.float32)
+    if not isinstance(data, np.ndarray):
+        data = data.cpu().numpy()
+    # Tracked results carry an id column before conf
+    return np.concatenate([data[:, :4], data[:, -2:]], 1) if data.shape[1] == 7 else data
+
+
+class Cascade:
+    """Screen with a cheap pass, confirm flagged frames with the full model"""
+
+    def __init__(self, model, screen_model=None, screen_imgsz=320, screen_conf=DEFAULT_SCREEN_CONF, confirm_imgsz=640,
+                 confirm='frame', max_crops=4, crop_margin=0.5):
+        if confirm not in CONFIRM_MODES:
+            raise ValueError(f"confirm must be one of {CONFIRM_MODES}, not {confirm!r}")
+        self.model = model
+        self.screen_model = screen_model
+        self.screen_imgsz = screen_imgsz
+        self.screen_conf = screen_conf
+        self.confirm_imgsz = confirm_imgsz
+        self.confirm = confirm
+        self.max_crops = max_crops
+        self.crop_margin = crop_margin
+        self.stats = {'frames': 0, 'flagged': 0, 'confirmed': 0, 'screen_ms': 0.0, 'confirm_ms': 0.0}
+
+    @classmethod
+    def from_config(cls, model, config):
+        """Cascade from the cascade_* keys of ip_camera_config.yaml"""
+        screen_model = None
+        if config.get('cascade_screen_model'):
+            from model_registry import get_model
+            screen_model = get_model(config['cascade_screen_model'], imgsz=config.get('cascade_screen_imgsz', 320))
+        return cls(model, screen_model,
+                   screen_imgsz=config.get('cascade_screen_imgsz', 320),
+                   screen_conf=config.get('cascade_screen_conf', DEFAULT_SCREEN_CONF),
+                   confirm_imgsz=config.get('cascade_confirm_imgsz', 640),
+                   confirm=config.get('cascade_confirm', 'frame'),
+                   max_crops=config.get('cascade_max_crops', 4),
+                   crop_margin=config.get('cascade_crop_margin', 0.5))
+
+    @property
+    def names(self):
+        return self.model.names
+
+    def predict(self, source, conf=0.25, save=False, verbose=False, **kwargs):
+        """Results for one frame, like model.predict(source=frame, conf=conf)"""
+        frame = source
+        self.stats['frames'] += 1
+
+        t0 = time.perf_counter()
+        with stage('cascade_screen'):
+            screen = (self.screen_model or self.model).predict(
+                source=frame, imgsz=self.screen_imgsz, conf=min(self.screen_conf, conf),
+                save=False, verbose=False)
+        self.stats['screen_ms'] += (time.perf_counter() - t0) * 1000
+        candidates = _boxes_array(screen[0])
+        if len(candidates) == 0:
+            CASCADE_FRAMES.inc(stage='screen', result='clear')
+            return [screen[0][:0]]
+        CASCADE_FRAMES.inc(stage='screen', result='flagged')
+        self.stats['flagged'] += 1
+
+        t0 = time.perf_counter()
+        with stage('cascade_confirm'):
+            if self.confirm == 'crops' and len(candidates) <= self.max_crops:
+                results = [self._confirm_crops(frame, candidates, conf, screen[0])]
+            else:
+                results = self.model.predict(source=frame, imgsz=self.confirm_imgsz, conf=conf,
+                                             save=False, verbose=False)
+        self.stats['confirm_ms'] += (time.perf_counter() - t0) * 1000
+        confirmed = bool(results and len(results[0].boxes))
+        self.stats['confirmed'] += confirmed
+        CASCADE_FRAMES.inc(stage='confirm', result='confirmed' if confirmed else 'rejected')
+        return results
+
+    __call__ = predict
+
+    def crop_regions(self, candidates, shape):
+        """Native-resolution crop (x1, y1, x2, y2) per candidate box: at least confirm_imgsz, box plus margin"""
+        height, width = shape[:2]
+        regions = []
+        for x1, y1, x2, y2 in candidates[:, :4]:
+            size = max(self.confirm_imgsz, (x2 - x1) * (1 + 2 * self.crop_margin),
+                       (y2 - y1) * (1 + 2 * self.crop_margin))
+            w, h = min(size, width), min(size, height)
+            cx = min(max((x1 + x2) / 2, w / 2), width - w / 2)
+            cy = min(max((y1 + y2) / 2, h / 2), height - h / 2)
+            regions.append((int(cx - w / 2), int(cy - h / 2), int(cx + w / 2), int(cy + h / 2)))
+        # Crops covering the same area are confirmed once
+        return list(dict.fromkeys(regions))
+
+    def _confirm_crops(self, frame, candidates, conf, template):
+        from eval_thresholds import nms_filter
+
+        regions = self.crop_regions(candidates, frame.shape)
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in regions]
+        results = self.model.predict(source=crops, imgsz=self.confirm_imgsz, conf=conf, save=False, verbose=False)
+        boxes = []
+        for (x1, y1, _, _), result in zip(regions, results):
+            data = _boxes_array(result).copy()
+            data[:, [0, 2]] += x1
+            data[:, [1, 3]] += y1
+            boxes.append(data)
+        data = np.concatenate(boxes) if boxes else np.zeros((0, 6), dtype=np.float32)
+        if len(data) > 1:
+            # Overlapping crops see the same defect twice
+            keep = nms_filter(np.zeros(len(data), dtype=np.int64), data[:, 5].astype(np.int64),
+                              data[:, 4], data[:, :4], 0.5)
+            data = data[keep]
+        return _with_boxes(template, data.astype(np.float32))
+
+    def summary(self):
+        s = self.stats
+        n = max(s['frames'], 1)
+        return (f"{s['frames']} frames, {s['flagged'] / n:.0%} flagged by the screen, "
+                f"{s['confirmed'] / max(s['flagged'], 1):.0%} of those confirmed, "
+                f"{(s['screen_ms'] + s['confirm_ms']) / n:.1f} ms/frame "
+                f"(screen {s['screen_ms'] / n:.1f}, confirm {s['confirm_ms'] / n:.1f})")
+
+
+def evaluate_recall(model, image_dir, conf=0.5, cascades=(), iou=0.5):
+    """
+    Box recall against the split's labels and mean ms/frame for the full
+    model and each cascade. Returns [(label, recall, ms_per_frame, flagged_rate)].
+    """
+    import cv2
+    from eval_thresholds import box_iou, load_labels
+
+    image_dir = Path(image_dir)
+    label_dir = image_dir.parent / "labels"
+    files = sorted(p for p in image_dir.iterdir() if p.suffix.lower() in ('.jpg', '.jpeg', '.png'))
+    frames, truth = [], []
+    for f in files:
+        frame = cv2.imread(str(f))
+        if frame is None:
+            continue
+        cls, xyxy = load_labels(label_dir / f"{f.stem}.txt", frame.shape[1], frame.shape[0])
+        valid = cls < len(model.names)
+        frames.append(frame)
+        truth.append((cls[valid], xyxy[valid]))
+    n_truth = sum(len(c) for c, _ in truth)
+
+    def run(label, predict, cascade=None):
+        predict(source=frames[0], conf=conf, save=False, verbose=False)  # warm-up
+        if cascade:
+            cascade.stats = dict.fromkeys(cascade.stats, 0)
+        found, elapsed = 0, 0.0
+        for frame, (cls, xyxy) in zip(frames, truth):
+            t0 = time.perf_counter()
+            result = predict(source=frame, conf=conf, save=False, verbose=False)[0]
+            elapsed += time.perf_counter() - t0
+            pred = _boxes_array(result)
+            if len(cls) and len(pred):
+                overlap = box_iou(xyxy, pred[:, :4]) * (cls[:, None] == pred[None, :, 5].astype(int))
+                found += int((overlap.max(1) >= iou).sum())
+        flagged = cascade.stats['flagged'] / max(cascade.stats['frames'], 1) if cascade else 1.0
+        return label, found / max(n_truth, 1), elapsed * 1000 / max(len(frames), 1), flagged
+
+    imgsz = cascades[0].confirm_imgsz if cascades else 640
+    rows = [run(f"full imgsz={imgsz}", lambda **kw: model.predict(imgsz=imgsz, **kw))]
+    for c in cascades:
+        rows.append(run(f"cascade {c.screen_imgsz}px@{c.screen_conf:g} → {c.confirm}", c.predict, c))
+    print(f"\n📏 {image_dir}: {len(frames)} images, {n_truth} labeled boxes, conf {conf}")
+    print(f"{'pipeline':<34}{'recall':>8}{'ms/frame':>10}{'flagged':>9}")
+    for label, recall, ms, flagged in rows:
+        print(f"{label:<34}{recall:>8.1%}{ms:>10.1f}{flagged:>9.0%}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check recall and CPU time of the cascade on a labeled split')
+    parser.add_argument('--model', default='runs/detect/train/weights/best.pt', help='Full (confirm) model')
+    parser.add_argument('--screen-model', default=None, help='Smaller screening model (default: --model)')
+    parser.add_argument('--split', default='valid/images', help='Labeled images directory')
+    parser.add_argument('--conf', type=float, default=0.5, help='Detection confidence (as test.py --conf)')
+    parser.add_argument('--screen-imgsz', type=int, default=320, help='Screening image size')
+    parser.add_argument('--screen-conf', type=float, nargs='+', default=[DEFAULT_SCREEN_CONF],
+                        help='Screening confidence(s)')
+    parser.add_argument('--confirm-imgsz', type=int, default=640, help='Confirmation image size')
+    parser.add_argument('--confirm', choices=CONFIRM_MODES, nargs='+', default=['frame'],
+                        help='Confirm on the whole frame and/or on crops around the screen boxes')
+    args = parser.parse_args()
+
+    from model_registry import get_model
+    model = get_model(args.model, imgsz=args.confirm_imgsz)
+    screen_model = get_model(args.screen_model, imgsz=args.screen_imgsz) if args.screen_model else None
+    cascades = [Cascade(model, screen_model, args.screen_imgsz, sc, args.confirm_imgsz, mode)
+                for mode in args.confirm for sc in args.screen_conf]
+    evaluate_recall(model, args.split, args.conf, cascades)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
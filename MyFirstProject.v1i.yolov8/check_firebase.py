@@ -1,82 +1,286 @@
 """
 Check what data is actually in Firebase
+Without downloading whole trees: the top level is listed with a shallow query,
+key/time ranges come from limit-1 key queries, and detections are either
+streamed in key-ordered pages within a time/record budget (default) or
+probed day by day with a few small queries (--shallow). Detection keys are
+millisecond timestamps, so a partial scan extrapolates over the key range.
+
+python check_firebase.py                      # scan up to 30 s / 200k records
+python check_firebase.py --shallow            # a few queries per day, approximate
+python check_firebase.py --local dump.json    # a load_generator.py --save dump
 """
 
-import firebase_admin
-from firebase_admin import credentials, db
-from firebase_config import FIREBASE_DATABASE_URL, SERVICE_ACCOUNT_KEY_PATH
-
-# Initialize Firebase
-if not firebase_admin._apps:
-    cred = credentials.Certificate(SERVICE_ACCOUNT_KEY_PATH)
-    firebase_admin.initialize_app(cred, {
-        'databaseURL': FIREBASE_DATABASE_URL
-    })
-
-print("🔍 Checking Firebase data structure...\n")
-
-# Check detections
-try:
-    ref = db.reference("detections")
-    snapshot = ref.get()
-    
-    # Handle both response types
-    if snapshot is None:
-        data = {}
-    elif hasattr(snapshot, 'val'):
-        data = snapshot.val()
-    else:
-        data = snapshot
-    
-    if data and isinstance(data, dict):
-        count = len(data)
-        print(f"✓ Found {count} detections in 'detections' path")
-        if count > 0:
-            first_key = list(data.keys())[0]
-            first_detection = data[first_key]
-            print(f"  First detection: {first_detection}")
-    else:
-        print("✗ No data in 'detections' path")
-except Exception as e:
-    print(f"✗ Error reading detections: {e}")
-
-# Check statistics
-try:
-    ref = db.reference("statistics")
-    snapshot = ref.get()
-    
-    if snapshot is None:
-        data = {}
-    elif hasattr(snapshot, 'val'):
-        data = snapshot.val()
-    else:
-        data = snapshot
-    
-    if data and isinstance(data, dict):
-        count = len(data)
-        print(f"\n✓ Found {count} statistics in 'statistics' path")
-    else:
-        print("\n✗ No data in 'statistics' path")
-except Exception as e:
-    print(f"\n✗ Error reading statistics: {e}")
-
-# Check system status
-try:
-    ref = db.reference("system/status")
-    snapshot = ref.get()
-    
-    if snapshot is None:
-        data = {}
-    elif hasattr(snapshot, 'val'):
-        data = snapshot.val()
-    else:
-        data = snapshot
-    
-    if data and isinstance(data, dict):
-        print(f"\n✓ System status: {data}")
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timezone
+from collections import Counter
+
+DETECTIONS = "detections"
+
+
+def connect(local=None):
+    """firebase_admin.db, or a LocalDatabase loaded from a JSON dump"""
+    if local:
+        from local_db import LocalDatabase
+        with open(local) as f:
+            return LocalDatabase(json.load(f))
+
+    import firebase_admin
+    from firebase_admin import credentials, db
+    from firebase_config import FIREBASE_DATABASE_URL, SERVICE_ACCOUNT_KEY_PATH
+
+    # Initialize Firebase
+    if not firebase_admin._apps:
+        cred = credentials.Certificate(SERVICE_ACCOUNT_KEY_PATH)
+        firebase_admin.initialize_app(cred, {
+            'databaseURL': FIREBASE_DATABASE_URL
+        })
+    return db
+
+
+def key_seconds(key, record=None):
+    """Unix time of a detection: from its millisecond key, else its unix_timestamp field"""
+    if key.isdigit() and len(key) >= 12:
+        return int(key) / 1000
+    if isinstance(record, dict) and isinstance(record.get('unix_timestamp'), (int, float)):
+        return record['unix_timestamp']
+    return None
+
+
+def day_of(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y-%m-%d")
+
+
+def record_bytes(record):
+    """Approximate stored size of a node (its compact JSON)"""
+    return len(json.dumps(record, separators=(',', ':'), default=str))
+
+
+def top_level(database):
+    """{node: child count or None for leaves}, from shallow queries only"""
+    root = database.reference('/').get(shallow=True) or {}
+    nodes = {}
+    for name in sorted(root):
+        if name == DETECTIONS:
+            nodes[name] = None  # can be huge: counted by scan()/probe_days()
+            continue
+        children = database.reference(name).get(shallow=True)
+        nodes[name] = len(children) if isinstance(children, dict) else None
+    return nodes
+
+
+def key_range(ref):
+    """((first key, record), (last key, record)) with two limit-1 queries, or None if empty"""
+    first = ref.order_by_key().limit_to_first(1).get() or {}
+    last = ref.order_by_key().limit_to_last(1).get() or {}
+    if not first:
+        return None
+    return next(iter(first.items())), next(iter(last.items()))
+
+
+def scan(ref, page_size=1000, time_budget=30.0, max_records=200_000, sample_size=5, seed=None):
+    """
+    Stream records in key order, one page in memory at a time: exact counts,
+    per-day histogram, size and a reservoir sample of what was read. Stops at
+    the time/record budget and reports how far through the key range it got.
+    """
+    rng = random.Random(seed)
+    days, types, sample = Counter(), Counter(), []
+    count = size = pages = 0
+    cursor, last_seconds = None, None
+    start = time.monotonic()
+    complete = False
+    while True:
+        query = ref.order_by_key()
+        if cursor is not None:
+            query = query.start_at(cursor)
+        page = query.limit_to_first(page_size + (cursor is not None)).get() or {}
+        items = list(page.items())
+        if cursor is not None and items and items[0][0] == cursor:
+            items = items[1:]
+        pages += 1
+        for key, record in items:
+            count += 1
+            size += record_bytes(record) + len(key)
+            seconds = key_seconds(key, record)
+            if seconds is not None:
+                days[day_of(seconds)] += 1
+                last_seconds = seconds
+            if isinstance(record, dict):
+                types[str(record.get('defect_type', 'unknown'))] += 1
+            # Reservoir sample of everything read so far
+            if len(sample) < sample_size:
+                sample.append((key, record))
+            elif rng.random() < sample_size / count:
+                sample[rng.randrange(sample_size)] = (key, record)
+        if len(items) < page_size:
+            complete = True
+            break
+        cursor = items[-1][0]
+        if count >= max_records or time.monotonic() - start >= time_budget:
+            break
+    return {'count': count, 'bytes': size, 'pages': pages, 'days': days, 'types': types,
+            'sample': sample, 'complete': complete, 'last_seconds': last_seconds,
+            'seconds': time.monotonic() - start}
+
+
+def probe_days(ref, first_seconds, last_seconds, per_day=100, max_days=30, sample_size=5, probes=4, seed=None):
+    """
+    Approximate per-day counts with a few small queries per day. Each day is
+    split into `probes` segments and each segment fetches at most
+    per_day/probes keys from its start: a segment those keys don't fill is
+    counted exactly, otherwise its count is extrapolated from how much of the
+    segment they span.
+    """
+    rng = random.Random(seed)
+    day = 86400
+    per_probe = max(1, per_day // probes)
+    end_day = int(last_seconds // day) * day
+    start_day = max(int(first_seconds // day) * day, end_day - (max_days - 1) * day)
+    days, sizes, sample, queries = {}, [], [], 0
+    for t in range(start_day, end_day + day, day):
+        lo, hi = max(t, first_seconds), min(t + day, last_seconds + 0.001)
+        total, exact = 0, True
+        for j in range(probes):
+            seg_lo = lo + (hi - lo) * j / probes
+            seg_hi = lo + (hi - lo) * (j + 1) / probes
+            # end_at is inclusive: stop one millisecond before the next segment
+            page = (ref.order_by_key().start_at(str(int(seg_lo * 1000)))
+                    .end_at(str(int(seg_hi * 1000) - 1)).limit_to_first(per_probe).get() or {})
+            queries += 1
+            keys = list(page)
+            if len(keys) < per_probe:
+                total += len(keys)
+            else:
+                covered = int(keys[-1]) / 1000 - seg_lo
+                total += len(keys) * (seg_hi - seg_lo) / max(covered, 1e-3)
+                exact = False
+            for key, record in page.items():
+                sizes.append(record_bytes(record) + len(key))
+                if len(sample) < sample_size:
+                    sample.append((key, record))
+                elif rng.random() < 0.05:
+                    sample[rng.randrange(sample_size)] = (key, record)
+        days[day_of(t)] = (round(total), exact)
+    return {'days': days, 'sample': sample, 'queries': queries,
+            'mean_bytes': sum(sizes) / len(sizes) if sizes else 0}
+
+
+def _mb(n):
+    return f"{n / 1e6:.2f} MB" if n >= 1e5 else f"{n / 1e3:.1f} KB"
+
+
+def print_histogram(days, width=40):
+    if not days:
+        return
+    peak = max(v[0] if isinstance(v, tuple) else v for v in days.values()) or 1
+    for day in sorted(days):
+        value = days[day]
+        n, exact = value if isinstance(value, tuple) else (value, True)
+        bar = '█' * max(1, round(width * n / peak)) if n else ''
+        print(f"    {day}  {n:>9}{'' if exact else '~'}  {bar}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect the Firebase database without downloading whole trees')
+    parser.add_argument('--shallow', action='store_true',
+                        help='Only small key queries: approximate per-day counts, no full scan')
+    parser.add_argument('--time-budget', type=float, default=30.0, help='Seconds for the detections scan')
+    parser.add_argument('--max-records', type=int, default=200_000, help='Stop the scan after this many records')
+    parser.add_argument('--page-size', type=int, default=1000, help='Records per query while scanning')
+    parser.add_argument('--per-day', type=int, default=100, help='Records fetched per day (--shallow)')
+    parser.add_argument('--days', type=int, default=30, help='Most recent days in the --shallow histogram')
+    parser.add_argument('--samples', type=int, default=3, help='Sampled records to print')
+    parser.add_argument('--local', default=None, metavar='DUMP.json', help='Inspect a local JSON dump instead')
+    args = parser.parse_args()
+
+    database = connect(args.local)
+    print("🔍 Checking Firebase data structure...\n")
+
+    # Top level (shallow)
+    try:
+        nodes = top_level(database)
+    except Exception as e:
+        print(f"✗ Error listing the database: {e}")
+        return 1
+    print("📂 Top-level nodes:")
+    for name, children in nodes.items():
+        print(f"  {name:<20} {'(scanned below)' if name == DETECTIONS else children if children is not None else 'value'}")
+
+    for name in ('system_status', 'system'):
+        if name in nodes:
+            print(f"\n✓ System status: {database.reference(name).get()}")
+
+    if DETECTIONS not in nodes:
+        print("\n✗ No data in 'detections' path")
+        return 0
+
+    ref = database.reference(DETECTIONS)
+    bounds = key_range(ref)
+    if bounds is None:
+        print("\n✗ No data in 'detections' path")
+        return 0
+    (first_key, first), (last_key, last) = bounds
+    first_s, last_s = key_seconds(first_key, first), key_seconds(last_key, last)
+    print(f"\n🔑 Detections key range: {first_key} … {last_key}")
+    if first_s is not None and last_s is not None:
+        print(f"   Time range: {datetime.fromtimestamp(first_s):%Y-%m-%d %H:%M:%S} → "
+              f"{datetime.fromtimestamp(last_s):%Y-%m-%d %H:%M:%S} ({(last_s - first_s) / 86400:.1f} days)")
+    print(f"   Newest detection: {last}")
+
+    if args.shallow:
+        if first_s is None or not first_key.isdigit():
+            print("\n⚠ Keys are not millisecond timestamps; run without --shallow for counts")
+            return 0
+        t0 = time.monotonic()
+        probe = probe_days(ref, first_s, last_s, args.per_day, args.days, args.samples)
+        total = sum(n for n, _ in probe['days'].values())
+        exact = all(e for _, e in probe['days'].values())
+        covered = len(probe['days'])
+        print(f"\n📊 Detections in the last {covered} day(s): {'' if exact else '≈'}{total} "
+              f"({probe['queries']} queries, {time.monotonic() - t0:.1f}s; ~ = extrapolated)")
+        print(f"   Approx. size: {_mb(total * probe['mean_bytes'])} "
+              f"({probe['mean_bytes']:.0f} bytes/record)")
+        print_histogram(probe['days'])
+        sample = probe['sample']
     else:
-        print("\n✗ No system status")
-except Exception as e:
-    print(f"\n✗ Error reading system status: {e}")
+        result = scan(ref, args.page_size, args.time_budget, args.max_records, args.samples)
+        count = result['count']
+        if result['complete']:
+            print(f"\n📊 Found {count} detections ({result['pages']} pages, {result['seconds']:.1f}s)")
+            print(f"   Size: {_mb(result['bytes'])} ({result['bytes'] / max(count, 1):.0f} bytes/record)")
+        else:
+            # Keys are timestamps: scale by the share of the key range scanned
+            span = (last_s - first_s) if first_s is not None and last_s is not None else 0
+            done = (result['last_seconds'] - first_s) / span if span and result['last_seconds'] else 0
+            estimate = round(count / done) if done > 0 else None
+            print(f"\n📊 Scanned {count} detections in {result['seconds']:.1f}s "
+                  f"(budget reached, {done:.0%} of the key range)")
+            if estimate:
+                print(f"   Estimated total: ≈{estimate} detections, ≈{_mb(estimate * result['bytes'] / count)}")
+            print("   Histogram below covers the scanned part only (use --shallow for recent days)")
+        if result['types']:
+            print("   Defect types: " + ", ".join(f"{k} {v}" for k, v in result['types'].most_common()))
+        print_histogram(dict(result['days']))
+        sample = result['sample']
+
+    if sample:
+        print(f"\n🎲 Sampled records:")
+        for key, record in sample[:args.samples]:
+            print(f"  {key}: {record}")
+    return 0
+
 
-firebase_admin.delete_app(firebase_admin.get_app())
+if __name__ == "__main__":
+    code = main()
+    try:
+        import firebase_admin
+        if firebase_admin._apps:
+            firebase_admin.delete_app(firebase_admin.get_app())
+    except ImportError:
+        pass
+    sys.exit(code)
@@ -0,0 +1,86 @@
+"""
+Import-time Budget Check
+Runs the CLI entry points under `python -X importtime` and fails when their
+cold-start import cost exceeds its budget or a heavy module (ultralytics,
+torch, firebase_admin, streamlit, ...) is loaded where it isn't needed.
+Budgets are multiples of `python -c "import numpy"` measured alongside each
+check, so interpreter startup, numpy and the machine's speed cancel out.
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent.absolute()
+
+HEAVY = ('ultralytics', 'torch', 'cv2', 'firebase_admin', 'google', 'streamlit', 'pyarrow', 'pandas')
+HEAVY_EXCEPT_CV2 = tuple(m for m in HEAVY if m != 'cv2')
+
+# Reference run the budgets are relative to (startup + numpy, which most entry points need anyway)
+BASELINE = ['-c', 'import numpy']
+
+# (label, python arguments, budget as a multiple of the baseline, modules that must not be imported).
+# Measured ratios on a desktop CPU: ~1.0-1.3, ~1.5-1.9 (cv2), ~0.3-0.5, ~0.4-0.6, ~1.0-1.6;
+# any of the HEAVY packages costs several baselines on its own.
+CHECKS = [
+    ('test.py --help', ['test.py', '--help'], 2.0, HEAVY),
+    ('ip_camera_capture.py --help', ['ip_camera_capture.py', '--help'], 3.0, HEAVY_EXCEPT_CV2),
+    ('import start_ip_capture', ['-c', 'import start_ip_capture'], 1.0, HEAVY),
+    ('import cloud_client, firebase_config, my_secrets',
+     ['-c', 'import cloud_client, firebase_config, my_secrets'], 1.0, HEAVY),
+    ('import detection_log', ['-c', 'import detection_log'], 2.5, HEAVY),
+]
+
+
+def measure(args):
+    """(total import ms, set of top-level packages imported) for one run"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    proc = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=PROJECT_DIR, env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, timeout=120)
+    total_us = 0
+    packages = set()
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        total_us += int(self_us)
+        packages.add(name.strip().split('.')[0])
+    return total_us / 1000, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check cold-start import time of the CLI entry points')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiply all budgets')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per check; the fastest counts')
+    args = parser.parse_args()
+
+    failures = 0
+    print(f"{'entry point':<50} {'ms':>7} {'budget':>7}  (baseline: import numpy)")
+    for label, argv, factor, forbidden in CHECKS:
+        # Interleaved with the baseline so both see the same machine load
+        runs, base = [], []
+        for _ in range(args.repeat):
+            base.append(measure(BASELINE)[0])
+            runs.append(measure(argv))
+        ms = min(r[0] for r in runs)
+        loaded = sorted(set(forbidden) & runs[0][1])
+        budget = min(base) * factor * args.scale
+
+        ok = ms <= budget and not loaded
+        failures += not ok
+        print(f"{'✅' if ok else '❌'} {label:<48} {ms:>7.1f} {budget:>7.0f}")
+        if loaded:
+            print(f"   heavy modules imported: {', '.join(loaded)}")
+
+    if failures:
+        print(f"\n❌ {failures} entry point(s) over budget")
+        return 1
+    print("\n✅ All entry points within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,33 @@
 """
 Cloud Client - Clean Version
 """
-import firebase_admin
-from firebase_admin import credentials, db
 from datetime import datetime
 import time
 
+from metrics import UPLOADS
+
 class CloudClient:
-    def __init__(self, key_input=None, db_url=None):
+    def __init__(self, key_input=None, db_url=None, database=None):
         self.connected = False
         self.app = None
         self.session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self._last_key = 0
         
         print(f"🔌 Initializing Cloud Connection...")
 
+        if database is not None:
+            # Any object with the firebase_admin.db reference API (e.g. local_db.LocalDatabase)
+            self.db = database
+            self.connected = True
+            print("✅ Using local database backend")
+            self.update_system_status(True)
+            return
+
         try:
+            # Imported here so offline/local-database use never loads the Firebase SDK
+            import firebase_admin
+            from firebase_admin import credentials, db
+
             # Import credentials from my_secrets
             from my_secrets import FIREBASE_CREDENTIALS, DATABASE_URL
             
@@ -43,8 +56,10 @@ class CloudClient:
             print(f"❌ Connection Error: {e}")
             self.connected = False
 
-    def send_detection(self, confidence, ring_count=1, defect_type="unknown", image_filename=None):
-        if not self.connected: return
+    def send_detection(self, confidence, ring_count=1, defect_type="unknown", image_filename=None,
+                       extra=None):
+        """Write one detections/<ms> record. Returns its key, or None if nothing was written."""
+        if not self.connected: return None
 
         try:
             timestamp = time.time()
@@ -57,16 +72,35 @@ class CloudClient:
                 "image_filename": str(image_filename) if image_filename else None,
                 "session_id": self.session_id
             }
+            if extra:
+                data.update(extra)
             
-            self.db.reference(f'detections/{int(timestamp * 1000)}').set(data)
+            # Millisecond keys; bump on collision so back-to-back events don't overwrite
+            self._last_key = max(int(timestamp * 1000), self._last_key + 1)
+            key = str(self._last_key)
+            self.db.reference(f'detections/{key}').set(data)
             self.db.reference('statistics/current_session').update({
                 "last_active": time.time(),
                 "last_defect": defect_type
             })
             print(f"   ☁️ Uploaded to Cloud: {defect_type} ({confidence:.1%})")
+            UPLOADS.inc(kind='detection', result='success')
+            return key
             
         except Exception as e:
             print(f"   ⚠ Upload Failed: {e}")
+            UPLOADS.inc(kind='detection', result='failure')
+            return None
+
+    def update_detection(self, key, fields):
+        """Update fields of an existing detections/<key> record (e.g. a tracked defect)"""
+        if not self.connected or key is None: return
+        try:
+            self.db.reference(f'detections/{key}').update(fields)
+            UPLOADS.inc(kind='detection_update', result='success')
+        except Exception as e:
+            print(f"   ⚠ Detection Update Failed: {e}")
+            UPLOADS.inc(kind='detection_update', result='failure')
 
     def update_system_status(self, is_active):
         if not self.connected: return
@@ -77,5 +111,7 @@ class CloudClient:
                 "last_heartbeat": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 "session_id": self.session_id
             })
+            UPLOADS.inc(kind='status', result='success')
         except Exception as e:
-            print(f"   ⚠ Status Update Failed: {e}")
\ No newline at end of file
+            print(f"   ⚠ Status Update Failed: {e}")
+            UPLOADS.inc(kind='status', result='failure')
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""
+Dashboard Data
+Fetching and shaping of detection records for the Streamlit dashboard (app.py).
+Kept free of Streamlit so the same code can be timed headlessly
+(python load_generator.py bench-dashboard).
+"""
+
+import pandas as pd
+
+# app.py only shows the most recent records
+RECENT_LIMIT = 50
+
+
+def detections_frame(snapshot):
+    """DataFrame from a {key: record} snapshot, newest first, with `id` and `datetime` columns"""
+    if not snapshot:
+        return pd.DataFrame()
+    df = pd.DataFrame.from_dict(snapshot, orient='index')
+    df['id'] = df.index
+    df = df.reset_index(drop=True)
+
+    # Process timestamps
+    if 'unix_timestamp' in df.columns:
+        df['datetime'] = pd.to_datetime(df['unix_timestamp'], unit='s')
+        df = df.sort_values('unix_timestamp', ascending=False)
+    return df
+
+
+def fetch_detections(database, limit=RECENT_LIMIT):
+    """Last `limit` detections (all if None) from a firebase_admin.db-like database"""
+    query = database.reference('detections').order_by_key()
+    if limit:
+        query = query.limit_to_last(limit)
+    return detections_frame(query.get())
+
+
+def summary_metrics(df):
+    """(total detections, latest defect type, average confidence) for the metric row"""
+    latest_defect = "N/A"
+    if not df.empty:
+        latest_defect = str(df.iloc[0].get('defect_type', 'N/A')).upper()
+    avg_conf = 0
+    if not df.empty and 'confidence' in df.columns:
+        avg_conf = df['confidence'].mean()
+    return len(df), latest_defect, avg_conf
+
+
+def build_charts(df):
+    """(defect distribution donut, confidence timeline) plotly figures; None where a column is missing"""
+    import plotly.express as px
+
+    pie = timeline = None
+    if 'defect_type' in df.columns:
+        counts = df['defect_type'].value_counts().reset_index()
+        counts.columns = ['Type', 'Count']
+        pie = px.pie(counts, values='Count', names='Type', hole=0.5,
+                     color_discrete_sequence=px.colors.qualitative.Bold)
+        pie.update_layout(showlegend=True, margin=dict(t=20, b=20, l=20, r=20), height=280)
+
+    if 'datetime' in df.columns:
+        timeline = px.scatter(df, x='datetime', y='confidence', color='defect_type',
+                              size='confidence', hover_data=['defect_type'],
+                              color_discrete_sequence=px.colors.qualitative.Bold)
+        timeline.update_layout(
+            xaxis_title="Timestamp",
+            yaxis_title="Confidence Score",
+            margin=dict(t=20, b=20, l=0, r=0),
+            height=280,
+            showlegend=True
+        )
+    return pie, timeline
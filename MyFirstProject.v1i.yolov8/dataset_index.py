@@ -0,0 +1,360 @@
+"""
+Dataset Index
+Scans the train/valid/test splits of data.yaml once and keeps content hashes
+(SHA-1), perceptual hashes (dHash, pHash), image sizes and parsed label boxes
+in one compressed .npz. Re-runs only re-read files whose mtime or size
+changed, so leakage, class balance and box-size queries answer instantly.
+
+python dataset_index.py                      # update the index, print a summary
+python dataset_index.py --leakage --balance --boxes
+"""
+
+import time
+import hashlib
+import argparse
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+PROJECT_DIR = Path(__file__).parent.absolute()
+INDEX_PATH = PROJECT_DIR / "dataset_index.npz"
+INDEX_VERSION = 1
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+SPLITS = ('train', 'val', 'test')
+
+# COCO size buckets (pixel area)
+SMALL_AREA = 32 ** 2
+MEDIUM_AREA = 96 ** 2
+
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _dct_matrix(n=32):
+    k = np.arange(n)[:, None]
+    return np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)).astype(np.float32)
+
+
+_DCT32 = _dct_matrix()
+
+
+def _bits_to_uint64(bits):
+    return np.packbits(bits.astype(np.uint8).ravel()).view('>u8')[0].astype(np.uint64)
+
+
+def read_labels(label_file):
+    """YOLO labels as (cls [n], normalized xywh [n, 4]); polygon rows are reduced to their bounding box"""
+    cls, boxes = [], []
+    try:
+        lines = Path(label_file).read_text().splitlines()
+    except OSError:
+        lines = []
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 5:
+            continue
+        values = np.asarray(parts[1:], dtype=np.float32)
+        if len(values) == 4:
+            boxes.append(values)
+        else:
+            xs, ys = values[0::2], values[1::2]
+            x0, x1, y0, y1 = xs.min(), xs.max(), ys.min(), ys.max()
+            boxes.append([(x0 + x1) / 2, (y0 + y1) / 2, x1 - x0, y1 - y0])
+        cls.append(int(float(parts[0])))
+    return (np.asarray(cls, dtype=np.int16),
+            np.asarray(boxes, dtype=np.float32).reshape(-1, 4))
+
+
+def gray_hashes(gray):
+    """(dhash, phash) of a grayscale PIL image"""
+    from PIL import Image
+
+    d = np.asarray(gray.resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    p = np.asarray(gray.resize((32, 32), Image.BILINEAR), dtype=np.float32)
+    dhash = _bits_to_uint64(d[:, 1:] > d[:, :-1])
+    coeffs = (_DCT32 @ p @ _DCT32.T)[:8, :8].ravel()[1:]   # low frequencies without DC
+    phash = _bits_to_uint64(np.append(coeffs > np.median(coeffs), False))
+    return dhash, phash
+
+
+def image_hashes(path):
+    """(width, height, dhash, phash) with a reduced-size decode"""
+    from PIL import Image
+
+    with Image.open(path) as im:
+        width, height = im.size
+        # JPEG: let the decoder downscale instead of decoding full resolution
+        im.draft('L', (64, 64))
+        dhash, phash = gray_hashes(im.convert('L'))
+    return width, height, dhash, phash
+
+
+def hamming(a, b):
+    """Pairwise bit distance between two uint64 hash arrays, shape [len(a), len(b)]"""
+    x = (a[:, None] ^ b[None, :]).astype('>u8')
+    return _POPCOUNT[x.view(np.uint8).reshape(len(a), len(b), 8)].sum(2)
+
+
+def split_dirs(data_yaml="data.yaml"):
+    """{split: (image dir, label dir)} from a YOLO data.yaml"""
+    data_yaml = Path(data_yaml)
+    if not data_yaml.is_absolute():
+        data_yaml = PROJECT_DIR / data_yaml
+    with open(data_yaml) as f:
+        cfg = yaml.safe_load(f)
+    root = (data_yaml.parent / cfg.get('path', '.')).resolve()
+    dirs = {}
+    for split in SPLITS:
+        if cfg.get(split):
+            images = (root / cfg[split]).resolve()
+            dirs[split] = (images, images.parent / 'labels')
+    names = cfg.get('names', {})
+    names = [names[k] for k in sorted(names)] if isinstance(names, dict) else list(names)
+    return dirs, names, root
+
+
+class DatasetIndex:
+    """Per-image arrays (files, split, hashes, sizes) plus a flat box table pointing back at images"""
+
+    FIELDS = ('files', 'split', 'mtime', 'size', 'label_mtime', 'width', 'height', 'sha1', 'dhash', 'phash',
+              'box_img', 'box_cls', 'box_xywhn')
+
+    def __init__(self, arrays, names, root):
+        self.names = list(names)
+        self.root = Path(root)
+        for field in self.FIELDS:
+            setattr(self, field, arrays[field])
+
+    def __len__(self):
+        return len(self.files)
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        data = np.load(path, allow_pickle=False)
+        if int(data['version']) != INDEX_VERSION:
+            raise ValueError(f"index version {int(data['version'])} != {INDEX_VERSION}")
+        return cls({f: data[f] for f in cls.FIELDS}, data['names'], str(data['root']))
+
+    def save(self, path=INDEX_PATH):
+        np.savez_compressed(path, version=INDEX_VERSION, names=np.array(self.names), root=str(self.root),
+                            **{f: getattr(self, f) for f in self.FIELDS})
+
+    @classmethod
+    def build(cls, data_yaml="data.yaml", path=INDEX_PATH, rebuild=False):
+        """
+        Load the index at `path` and bring it up to date with the splits.
+        Returns (index, {'hashed', 'relabelled', 'unchanged', 'removed'}).
+        """
+        dirs, names, root = split_dirs(data_yaml)
+        old = None
+        if not rebuild and Path(path).exists():
+            try:
+                old = cls.load(path)
+            except (ValueError, KeyError, OSError) as e:
+                print(f"⚠ Rebuilding index ({e})")
+        previous = {f: i for i, f in enumerate(old.files)} if old is not None else {}
+        old_boxes = {}
+        if old is not None and len(old.box_img):
+            order = np.argsort(old.box_img, kind='stable')
+            starts = np.searchsorted(old.box_img[order], np.arange(len(old) + 1))
+            old_boxes = {i: order[starts[i]:starts[i + 1]] for i in range(len(old))}
+
+        rows, box_img, box_cls, box_xywh = [], [], [], []
+        stats = {'hashed': 0, 'relabelled': 0, 'unchanged': 0, 'removed': 0}
+        seen = set()
+        for split, (image_dir, label_dir) in dirs.items():
+            if not image_dir.is_dir():
+                continue
+            for image in sorted(p for p in image_dir.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS):
+                rel = str(image.relative_to(root)) if image.is_relative_to(root) else str(image)
+                seen.add(rel)
+                st = image.stat()
+                label = label_dir / f"{image.stem}.txt"
+                label_mtime = label.stat().st_mtime_ns if label.exists() else -1
+                j = previous.get(rel)
+                same_image = j is not None and old.mtime[j] == st.st_mtime_ns and old.size[j] == st.st_size
+                if same_image:
+                    row = [split, st.st_mtime_ns, st.st_size, label_mtime, old.width[j], old.height[j],
+                           old.sha1[j], old.dhash[j], old.phash[j]]
+                else:
+                    width, height, dhash, phash = image_hashes(image)
+                    sha1 = hashlib.sha1(image.read_bytes()).hexdigest()
+                    row = [split, st.st_mtime_ns, st.st_size, label_mtime, width, height, sha1, dhash, phash]
+                    stats['hashed'] += 1
+
+                i = len(rows)
+                rows.append([rel] + row)
+                if same_image and old.label_mtime[j] == label_mtime:
+                    idx = old_boxes.get(j, [])
+                    cls_ids, xywh = old.box_cls[idx], old.box_xywhn[idx]
+                    stats['unchanged'] += 1
+                else:
+                    cls_ids, xywh = read_labels(label)
+                    stats['relabelled'] += same_image
+                box_img.append(np.full(len(cls_ids), i, dtype=np.int32))
+                box_cls.append(cls_ids)
+                box_xywh.append(xywh)
+        stats['removed'] = len(set(previous) - seen)
+
+        columns = list(zip(*rows)) if rows else [[]] * 10
+        arrays = {
+            'files': np.array(columns[0], dtype=str),
+            'split': np.array(columns[1], dtype=str),
+            'mtime': np.array(columns[2], dtype=np.int64),
+            'size': np.array(columns[3], dtype=np.int64),
+            'label_mtime': np.array(columns[4], dtype=np.int64),
+            'width': np.array(columns[5], dtype=np.int32),
+            'height': np.array(columns[6], dtype=np.int32),
+            'sha1': np.array(columns[7], dtype='S40'),
+            'dhash': np.array(columns[8], dtype=np.uint64),
+            'phash': np.array(columns[9], dtype=np.uint64),
+            'box_img': np.concatenate(box_img) if box_img else np.zeros(0, np.int32),
+            'box_cls': np.concatenate(box_cls) if box_cls else np.zeros(0, np.int16),
+            'box_xywhn': np.concatenate(box_xywh).reshape(-1, 4) if box_xywh else np.zeros((0, 4), np.float32),
+        }
+        index = cls(arrays, names, root)
+        index.save(path)
+        return index, stats
+
+    # --- queries ---
+    def class_name(self, c):
+        return self.names[c] if 0 <= c < len(self.names) else f"class_{c}"
+
+    def leakage(self, max_distance=4, chunk=1024):
+        """
+        Images shared between splits: ('exact', 0, a, b) for identical bytes,
+        ('source', d, a, b) for Roboflow exports of the same original photo
+        (same name before '.rf.'), ('near', d, a, b) for pHash distance <= max_distance.
+        """
+        found, reported = [], set()
+
+        def add(kind, d, i, j):
+            key = (min(i, j), max(i, j))
+            if key not in reported and self.split[i] != self.split[j]:
+                reported.add(key)
+                found.append((kind, int(d), str(self.files[i]), str(self.files[j])))
+
+        for kind, keys in (('exact', self.sha1),
+                           ('source', np.array([Path(f).name.split('.rf.')[0] for f in self.files]))):
+            _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+            for group in np.nonzero(counts > 1)[0]:
+                members = np.nonzero(inverse == group)[0]
+                for a in range(len(members)):
+                    for b in range(a + 1, len(members)):
+                        i, j = members[a], members[b]
+                        add(kind, hamming(self.phash[[i]], self.phash[[j]])[0, 0], i, j)
+
+        # Near duplicates: only compare across splits, in chunks to bound memory
+        for start in range(0, len(self), chunk):
+            rows = np.arange(start, min(start + chunk, len(self)))
+            dist = hamming(self.phash[rows], self.phash)
+            cross = self.split[rows][:, None] != self.split[None, :]
+            for r, j in zip(*np.nonzero((dist <= max_distance) & cross)):
+                if rows[r] < j:
+                    add('near', dist[r, j], rows[r], j)
+        return found
+
+    def balance(self):
+        """{split: {'images', 'empty', 'boxes': {class: n}, 'images_with': {class: n}}}"""
+        out = {}
+        box_split = self.split[self.box_img] if len(self.box_img) else np.zeros(0, dtype=str)
+        for split in dict.fromkeys(self.split):
+            in_split = self.split == split
+            sel = box_split == split
+            labelled = np.unique(self.box_img[sel])
+            boxes, images_with = {}, {}
+            for c in np.unique(self.box_cls[sel]):
+                m = sel & (self.box_cls == c)
+                boxes[self.class_name(int(c))] = int(m.sum())
+                images_with[self.class_name(int(c))] = len(np.unique(self.box_img[m]))
+            out[str(split)] = {'images': int(in_split.sum()), 'empty': int(in_split.sum()) - len(labelled),
+                               'boxes': boxes, 'images_with': images_with}
+        return out
+
+    def box_sizes(self, split=None):
+        """Per class: box count, normalized w/h percentiles, pixel-area size buckets, median aspect ratio"""
+        sel = np.ones(len(self.box_cls), dtype=bool) if split is None else self.split[self.box_img] == split
+        w = self.box_xywhn[:, 2] * self.width[self.box_img]
+        h = self.box_xywhn[:, 3] * self.height[self.box_img]
+        area = w * h
+        out = {}
+        for c in np.unique(self.box_cls[sel]):
+            m = sel & (self.box_cls == c)
+            out[self.class_name(int(c))] = {
+                'count': int(m.sum()),
+                'w_norm_p5_p50_p95': np.percentile(self.box_xywhn[m, 2], [5, 50, 95]).round(3).tolist(),
+                'h_norm_p5_p50_p95': np.percentile(self.box_xywhn[m, 3], [5, 50, 95]).round(3).tolist(),
+                'small': int((area[m] < SMALL_AREA).sum()),
+                'medium': int(((area[m] >= SMALL_AREA) & (area[m] < MEDIUM_AREA)).sum()),
+                'large': int((area[m] >= MEDIUM_AREA).sum()),
+                'aspect_median': round(float(np.median(w[m] / np.maximum(h[m], 1e-6))), 2),
+            }
+        return out
+
+
+def print_balance(index):
+    print("\n⚖️  Class balance (boxes / images containing the class):")
+    for split, info in index.balance().items():
+        print(f"  {split}: {info['images']} images, {info['empty']} without labels")
+        total = sum(info['boxes'].values()) or 1
+        for name, n in sorted(info['boxes'].items(), key=lambda kv: -kv[1]):
+            print(f"    {name:<12} {n:>5} boxes ({n / total:5.1%})  in {info['images_with'][name]} images")
+    unknown = sorted({index.class_name(int(c)) for c in np.unique(index.box_cls) if c >= len(index.names)})
+    if unknown:
+        print(f"  ⚠ Class ids not in data.yaml names: {', '.join(unknown)}")
+
+
+def print_box_sizes(index):
+    print("\n📐 Box sizes (normalized p5/p50/p95; pixel area buckets small<32², medium<96², large):")
+    for name, s in index.box_sizes().items():
+        w, h = s['w_norm_p5_p50_p95'], s['h_norm_p5_p50_p95']
+        print(f"  {name:<12} n={s['count']:<5} w {w[0]:.3f}/{w[1]:.3f}/{w[2]:.3f}  h {h[0]:.3f}/{h[1]:.3f}/{h[2]:.3f}  "
+              f"S/M/L {s['small']}/{s['medium']}/{s['large']}  aspect {s['aspect_median']}")
+
+
+def print_leakage(index, max_distance):
+    found = index.leakage(max_distance)
+    print(f"\n🔍 Cross-split leakage (pHash distance <= {max_distance}):")
+    if not found:
+        print("  ✓ No duplicate or near-duplicate images across splits")
+        return
+    kinds = {}
+    for kind, *_ in found:
+        kinds[kind] = kinds.get(kind, 0) + 1
+    print("  ⚠ " + ", ".join(f"{n} {kind}" for kind, n in kinds.items()) + " pair(s)")
+    for kind, d, a, b in found[:20]:
+        print(f"    [{kind}, d={d}] {a}  ↔  {b}")
+    if len(found) > 20:
+        print(f"    ... {len(found) - 20} more")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incremental dataset index with leakage and balance checks')
+    parser.add_argument('--data', default='data.yaml', help='Dataset config')
+    parser.add_argument('--index', default=str(INDEX_PATH), help='Index file')
+    parser.add_argument('--rebuild', action='store_true', help='Ignore the existing index')
+    parser.add_argument('--leakage', action='store_true', help='Duplicate / near-duplicate images across splits')
+    parser.add_argument('--balance', action='store_true', help='Class balance per split')
+    parser.add_argument('--boxes', action='store_true', help='Box size distribution per class')
+    parser.add_argument('--max-distance', type=int, default=4, help='pHash bit distance counted as near-duplicate')
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    index, stats = DatasetIndex.build(args.data, args.index, args.rebuild)
+    print(f"🗂 Index: {len(index)} images, {len(index.box_cls)} boxes ({time.perf_counter() - t0:.2f}s; "
+          f"{stats['hashed']} hashed, {stats['relabelled']} relabelled, {stats['unchanged']} unchanged, "
+          f"{stats['removed']} removed) → {args.index}")
+    for split in dict.fromkeys(index.split):
+        print(f"  {split}: {int((index.split == split).sum())} images")
+
+    if args.balance:
+        print_balance(index)
+    if args.boxes:
+        print_box_sizes(index)
+    if args.leakage:
+        print_leakage(index, args.max_distance)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
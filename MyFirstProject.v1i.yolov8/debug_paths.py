@@ -4,6 +4,8 @@ Debug: Check what paths Streamlit can access
 import os
 from pathlib import Path
 
+from gallery import Gallery, faults_dir
+
 print("=" * 60)
 print("🔍 STREAMLIT PATH DEBUG")
 print("=" * 60)
@@ -12,18 +14,25 @@ print(f"\n1. Current Working Directory:")
 print(f"   os.getcwd() = {os.getcwd()}")
 
 print(f"\n2. Detected Faults Directory Locations:")
+# Where test.py saves and the dashboard gallery reads (gallery.faults_dir)
+gallery_dir = faults_dir()
 paths_to_check = [
+    gallery_dir,
     Path("detected_faults"),
     Path(os.getcwd()) / "detected_faults",
 ]
 
-for path in paths_to_check:
+for path in dict.fromkeys(p.absolute() for p in paths_to_check):
     exists = path.exists()
-    print(f"   {path}")
+    print(f"   {path}{'  ← used by test.py / app.py' if path == gallery_dir.absolute() else ''}")
     print(f"      → Exists: {exists}")
-    if exists:
-        files = list(path.glob("*.jpg"))
-        print(f"      → Found {len(files)} images")
+    if exists and path == gallery_dir.absolute():
+        # Index lookup instead of listing a possibly huge directory
+        gallery = Gallery(path)
+        stats = gallery.refresh(max_thumbs=0)
+        print(f"      → Indexed {sum(gallery.counts().values())} images "
+              f"(+{stats['added']} new, {stats['pending']} without thumbnail)")
+        gallery.close()
 
 print(f"\n3. Script location:")
 print(f"   __file__ = {__file__ if '__file__' in dir() else 'N/A (might be different in Streamlit)'}")
@@ -0,0 +1,305 @@
+"""
+Local Inspection Log
+Append-only columnar (Parquet) record of every inspection - OK and defect -
+written at the source so yield and defect rates can be computed offline.
+"""
+
+import os
+import time
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+# pyarrow is imported on first use so importing this module stays cheap
+pa = None
+pq = None
+
+# Time bucket used in file names; a new file is started whenever it changes
+ROTATE_FORMATS = {
+    'hour': '%Y%m%d_%H',
+    'day': '%Y%m%d',
+}
+
+FILE_PREFIX = "inspections"
+
+
+def _arrow():
+    """Import pyarrow on first use; False if it is not installed"""
+    global pa, pq
+    if pa is None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            return False
+        pa, pq = pyarrow, pyarrow.parquet
+    return True
+
+
+def log_schema():
+    """Arrow schema of one inspection row (one row per analysed frame)"""
+    return pa.schema([
+        ('timestamp', pa.timestamp('ms')),
+        ('camera', pa.string()),
+        ('image_path', pa.string()),
+        ('latency_ms', pa.float32()),
+        ('defect', pa.bool_()),
+        ('cls', pa.list_(pa.int16())),
+        ('conf', pa.list_(pa.float32())),
+        ('xyxy', pa.list_(pa.list_(pa.float32(), 4))),
+    ])
+
+
+class DetectionLog:
+    """
+    Buffers inspections in memory and writes them as Parquet part files.
+
+    Rows are flushed when `row_group_size` rows are pending or `flush_seconds`
+    have passed, whichever comes first. Every flush writes a complete, closed
+    file (temporary name, then rename), so a crash loses at most the rows
+    still in memory and the log can be read while it is being written. When
+    the hour/day bucket rotates or the log is closed, the session's parts
+    are merged into one file per bucket; compact() merges parts left behind
+    by a crashed process.
+    """
+
+    def __init__(self, log_dir="inspection_log", rotate='day', row_group_size=1000,
+                 flush_seconds=60):
+        if not _arrow():
+            raise ImportError("pyarrow is required for the inspection log (pip install pyarrow)")
+        if rotate not in ROTATE_FORMATS:
+            raise ValueError(f"rotate must be one of {list(ROTATE_FORMATS)}, got {rotate!r}")
+
+        self.log_dir = Path(log_dir)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.rotate = rotate
+        self.row_group_size = row_group_size
+        self.flush_seconds = flush_seconds
+        self.schema = log_schema()
+        self.session_id = f"{datetime.now().strftime('%H%M%S')}_{os.getpid()}"
+
+        self._parts = []
+        self._bucket = None
+        self._last_flush = time.monotonic()
+        self._reset_buffer()
+
+    def _reset_buffer(self):
+        self._columns = {name: [] for name in self.schema.names}
+
+    @property
+    def pending(self):
+        """Number of rows buffered but not yet written"""
+        return len(self._columns['timestamp'])
+
+    @property
+    def path(self):
+        """File the current bucket's parts are merged into"""
+        return self.log_dir / f"{FILE_PREFIX}_{self._bucket}_{self.session_id}.parquet"
+
+    def append(self, camera, cls, conf, xyxy, latency_ms, image_path=None, defect=False,
+               timestamp=None):
+        """Record one inspection. `cls`, `conf` and `xyxy` are per-box sequences."""
+        if timestamp is None:
+            timestamp = datetime.now()
+
+        bucket = timestamp.strftime(ROTATE_FORMATS[self.rotate])
+        if self._bucket is not None and bucket != self._bucket:
+            # Keep each file inside a single time bucket
+            self.flush()
+            self._merge_parts()
+        self._bucket = bucket
+
+        col = self._columns
+        col['timestamp'].append(timestamp)
+        col['camera'].append(str(camera))
+        col['image_path'].append(str(image_path) if image_path else None)
+        col['latency_ms'].append(float(latency_ms))
+        col['defect'].append(bool(defect))
+        # Whole-array conversion; accepts lists or the NumPy columns from postprocess.py
+        col['cls'].append(np.asarray(cls, dtype=np.int16).tolist())
+        col['conf'].append(np.asarray(conf, dtype=np.float32).tolist())
+        col['xyxy'].append(np.asarray(xyxy, dtype=np.float32).reshape(-1, 4).tolist())
+
+        if (self.pending >= self.row_group_size
+                or time.monotonic() - self._last_flush >= self.flush_seconds):
+            self.flush()
+
+    def flush(self):
+        """Write pending rows as a new complete part file"""
+        self._last_flush = time.monotonic()
+        if not self.pending:
+            return
+
+        table = pa.Table.from_pydict(self._columns, schema=self.schema)
+        part = self.path.with_name(f"{self.path.stem}_p{len(self._parts):05d}.parquet")
+        _write_table(table, part)
+        self._parts.append(part)
+        self._reset_buffer()
+
+    def _merge_parts(self):
+        if self._parts:
+            _merge(self._parts, self.path)
+            self._parts = []
+
+    def close(self):
+        """Flush remaining rows and merge this session's parts into one file"""
+        self.flush()
+        self._merge_parts()
+
+
+def _write_table(table, path):
+    """Write `table` as a complete file; readers never see it half-written"""
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.tmp")
+    pq.write_table(table, str(tmp), compression='zstd')
+    os.replace(tmp, path)
+
+
+def _merge(parts, target):
+    """Append the rows of `parts` to `target` (created if missing) and delete them; returns rows merged"""
+    tables, merged = [], []
+    for path in ([target] if target.exists() else []) + sorted(parts):
+        try:
+            tables.append(pq.read_table(path))
+        except Exception as e:
+            if path == target:
+                print(f"⚠ Not merging into unreadable log file {path.name}: {e}")
+                return 0
+            # Left in place; load_log() reports it
+            print(f"⚠ Not merging unreadable log file {path.name}: {e}")
+            continue
+        if path != target:
+            merged.append(path)
+    if not merged:
+        return 0
+    _write_table(pa.concat_tables(tables), target)
+    for path in merged:
+        path.unlink(missing_ok=True)
+    return sum(t.num_rows for t in tables)
+
+
+def _file_bucket(path):
+    """Parse the rotation bucket start from a log file name"""
+    parts = path.stem.split('_')
+    for fmt, n in (('%Y%m%d_%H', 3), ('%Y%m%d', 2)):
+        try:
+            return datetime.strptime('_'.join(parts[1:n]), fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def compact(log_dir="inspection_log", before=None):
+    """
+    Merge part files left by processes that did not close their log (crash,
+    kill, power loss) into one file per bucket and session. Only buckets that
+    started before `before` (default: today 00:00) are touched, so files of
+    running processes are left alone. Returns the number of files merged.
+    """
+    if not _arrow():
+        raise ImportError("pyarrow is required to compact the inspection log (pip install pyarrow)")
+    if before is None:
+        before = datetime.combine(datetime.now().date(), datetime.min.time())
+
+    groups = {}
+    for path in Path(log_dir).glob(f"{FILE_PREFIX}_*_p[0-9][0-9][0-9][0-9][0-9].parquet"):
+        groups.setdefault(path.stem.rsplit('_p', 1)[0], []).append(path)
+    merged = 0
+    for stem, parts in sorted(groups.items()):
+        target = Path(log_dir) / f"{stem}.parquet"
+        bucket = _file_bucket(target)
+        if bucket is None or bucket >= before:
+            continue
+        if _merge(parts, target):
+            merged += len(parts)
+    return merged
+
+
+def load_log(log_dir="inspection_log", start=None, end=None, columns=None):
+    """
+    Read the inspection log into one Arrow table.
+
+    `start`/`end` are datetimes (end exclusive). Files whose bucket lies
+    entirely before `start` or after `end` are skipped without being opened.
+    Part files of a running process are complete when they appear, so only
+    the rows it still buffers (at most flush_seconds old) are missing.
+    """
+    if not _arrow():
+        raise ImportError("pyarrow is required to read the inspection log (pip install pyarrow)")
+
+    filters = []
+    if start is not None:
+        filters.append(('timestamp', '>=', pa.scalar(start, type=pa.timestamp('ms'))))
+    if end is not None:
+        filters.append(('timestamp', '<', pa.scalar(end, type=pa.timestamp('ms'))))
+
+    tables = []
+    for path in sorted(Path(log_dir).glob(f"{FILE_PREFIX}_*.parquet")):
+        bucket = _file_bucket(path)
+        if bucket is not None:
+            if end is not None and bucket >= end:
+                continue
+            if start is not None and bucket.date() < start.date():
+                continue
+        try:
+            tables.append(pq.read_table(path, columns=columns, filters=filters or None))
+        except Exception as e:
+            print(f"⚠ Skipping unreadable log file {path.name}: {e}")
+
+    if not tables:
+        schema = log_schema()
+        if columns:
+            schema = pa.schema([schema.field(c) for c in columns])
+        return schema.empty_table()
+    return pa.concat_tables(tables)
+
+
+def defect_rates(table, freq='D'):
+    """
+    Yield and per-class defect counts per period (pandas offset alias).
+    Returns a DataFrame indexed by period start.
+    """
+    import pandas as pd
+
+    df = table.select(['timestamp', 'defect', 'cls']).to_pandas()
+    if df.empty:
+        return pd.DataFrame(columns=['inspections', 'defects', 'yield'])
+
+    df['period'] = df['timestamp'].dt.to_period(freq).dt.start_time
+    summary = df.groupby('period').agg(inspections=('defect', 'size'), defects=('defect', 'sum'))
+    summary['yield'] = 1.0 - summary['defects'] / summary['inspections']
+
+    boxes = df[df['defect']][['period', 'cls']].explode('cls').dropna()
+    if not boxes.empty:
+        per_class = boxes.groupby(['period', 'cls']).size().unstack(fill_value=0)
+        per_class.columns = [f"cls_{int(c)}" for c in per_class.columns]
+        summary = summary.join(per_class).fillna(0)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the local inspection log')
+    parser.add_argument('--log-dir', default='inspection_log', help='Inspection log directory')
+    parser.add_argument('--since', default=None, help='Start date (YYYY-MM-DD)')
+    parser.add_argument('--until', default=None, help='End date, exclusive (YYYY-MM-DD)')
+    parser.add_argument('--freq', default='D', help='Aggregation period: h, D, W or M')
+    parser.add_argument('--compact', action='store_true',
+                        help='First merge part files left by crashed runs (buckets before today)')
+    args = parser.parse_args()
+
+    if args.compact:
+        print(f"🗜 Merged {compact(args.log_dir)} part file(s)")
+
+    start = datetime.fromisoformat(args.since) if args.since else None
+    end = datetime.fromisoformat(args.until) if args.until else None
+
+    table = load_log(args.log_dir, start=start, end=end, columns=['timestamp', 'defect', 'cls'])
+    print(f"📊 {table.num_rows} inspections in {args.log_dir}")
+    if table.num_rows:
+        print(defect_rates(table, args.freq).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Knowledge Distillation
+Trains a small student (yolov8n or a custom nano config) on data.yaml while
+matching the class scores and box distributions of the trained best.pt teacher,
+then compares per-class mAP and CPU latency of both models.
+"""
+
+import time
+import json
+import argparse
+from pathlib import Path
+
+import torch
+import torch.nn.functional as F
+from ultralytics import YOLO
+
+
+def _head_outputs(preds, nc, reg_max):
+    """
+    Raw detection head output as (box distribution [B, 4*reg_max, A], class logits [B, nc, A]).
+    Handles both the per-level feature map list of older ultralytics releases and
+    the dict returned by newer ones.
+    """
+    if isinstance(preds, tuple):  # eval mode: (decoded, raw)
+        preds = preds[1]
+    if isinstance(preds, dict):
+        preds = preds.get('one2many', preds)
+        return preds['boxes'], preds['scores']
+    b = preds[0].shape[0]
+    flat = torch.cat([p.view(b, reg_max * 4 + nc, -1) for p in preds], 2)
+    return flat.split((reg_max * 4, nc), 1)
+
+
+class DistillationLoss:
+    """
+    Wraps the student's detection criterion and adds a response-based
+    distillation term: temperature-scaled BCE on class scores and KL divergence
+    on the DFL box distributions, weighted by the teacher's per-anchor confidence.
+    """
+
+    def __init__(self, base, teacher, nc, reg_max, alpha=1.0, temperature=2.0):
+        self.base = base
+        self.teacher = teacher
+        self.nc = nc
+        self.reg_max = reg_max
+        self.alpha = alpha
+        self.T = temperature
+
+    def __call__(self, preds, batch):
+        loss, loss_items = self.base(preds, batch)
+
+        with torch.no_grad():
+            t_box, t_cls = _head_outputs(self.teacher(batch['img']), self.nc, self.reg_max)
+        s_box, s_cls = _head_outputs(preds, self.nc, self.reg_max)
+
+        T = self.T
+        weight = t_cls.sigmoid().amax(1)  # [B, A] teacher confidence per anchor
+        norm = weight.sum().clamp(min=1.0)
+
+        cls_kd = F.binary_cross_entropy_with_logits(
+            s_cls / T, (t_cls / T).sigmoid(), reduction='none').mean(1)
+
+        b, _, a = s_box.shape
+        s_dist = F.log_softmax(s_box.view(b, 4, self.reg_max, a) / T, dim=2)
+        t_dist = F.softmax(t_box.view(b, 4, self.reg_max, a) / T, dim=2)
+        box_kd = F.kl_div(s_dist, t_dist, reduction='none').sum(2).mean(1)
+
+        kd = ((cls_kd + box_kd) * weight).sum() / norm * T * T
+        # Newer releases return per-component losses that the trainer sums
+        return loss + self.alpha * kd * b / loss.numel(), loss_items
+
+
+def add_distillation_callbacks(model, teacher_path, alpha=1.0, temperature=2.0):
+    """
+    Attach the distillation criterion for the training batches of each epoch.
+    It is detached again before validation and checkpointing so the saved
+    student is a plain, loadable detection model.
+    """
+    state = {}
+
+    def on_train_epoch_start(trainer):
+        net = getattr(trainer.model, 'module', trainer.model)
+        if 'loss' not in state:
+            device = next(net.parameters()).device
+            teacher = YOLO(teacher_path).model.float().to(device).eval()
+            for p in teacher.parameters():
+                p.requires_grad_(False)
+            head = net.model[-1]
+            state['loss'] = DistillationLoss(net.init_criterion(), teacher, head.nc, head.reg_max,
+                                             alpha, temperature)
+        net.criterion = state['loss']
+
+    def on_train_epoch_end(trainer):
+        net = getattr(trainer.model, 'module', trainer.model)
+        net.criterion = state['loss'].base
+
+    model.add_callback("on_train_epoch_start", on_train_epoch_start)
+    model.add_callback("on_train_epoch_end", on_train_epoch_end)
+
+
+def measure_latency(model_path, images, imgsz=640, runs=20):
+    """Median single-image CPU predict latency in ms"""
+    model = YOLO(model_path)
+    model.predict(images[0], imgsz=imgsz, device='cpu', verbose=False)  # warm-up
+    times = []
+    for i in range(runs):
+        t0 = time.perf_counter()
+        model.predict(images[i % len(images)], imgsz=imgsz, device='cpu', verbose=False)
+        times.append((time.perf_counter() - t0) * 1000)
+    return sorted(times)[len(times) // 2]
+
+
+def evaluate(model_path, data, imgsz=640):
+    """Per-class mAP50 / mAP50-95 on the validation split"""
+    metrics = YOLO(model_path).val(data=data, imgsz=imgsz, device='cpu', plots=False, verbose=False)
+    box = metrics.box
+    per_class = {}
+    for i, c in enumerate(box.ap_class_index):
+        per_class[metrics.names[int(c)]] = {'mAP50': float(box.ap50[i]), 'mAP50-95': float(box.ap[i])}
+    return {'mAP50': float(box.map50), 'mAP50-95': float(box.map), 'per_class': per_class}
+
+
+def compare_models(teacher_path, student_path, data="data.yaml", imgsz=640, output=None):
+    """Print and optionally save the teacher vs student report"""
+    images = sorted(str(p) for p in Path("valid/images").glob("*.jpg"))[:20]
+    report = {}
+    for role, path in (('teacher', teacher_path), ('student', student_path)):
+        print(f"\n📏 Evaluating {role}: {path}")
+        report[role] = evaluate(path, data, imgsz)
+        report[role]['path'] = str(path)
+        report[role]['cpu_latency_ms'] = measure_latency(path, images, imgsz) if images else None
+
+    t, s = report['teacher'], report['student']
+    print(f"\n{'='*60}\n🎓 Distillation Report\n{'='*60}")
+    print(f"{'class':<12} {'teacher mAP50-95':>17} {'student mAP50-95':>17}")
+    for name in t['per_class']:
+        sv = s['per_class'].get(name, {}).get('mAP50-95', 0.0)
+        print(f"{name:<12} {t['per_class'][name]['mAP50-95']:>17.3f} {sv:>17.3f}")
+    print(f"{'all':<12} {t['mAP50-95']:>17.3f} {s['mAP50-95']:>17.3f}")
+    if t['cpu_latency_ms'] and s['cpu_latency_ms']:
+        print(f"\n⏱ CPU latency: teacher {t['cpu_latency_ms']:.1f} ms, student {s['cpu_latency_ms']:.1f} ms "
+              f"({t['cpu_latency_ms'] / s['cpu_latency_ms']:.1f}x faster)")
+        print(f"🎯 Student keeps {s['mAP50-95'] / max(t['mAP50-95'], 1e-9):.0%} of teacher mAP50-95")
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Report saved to: {output}")
+    return report
+
+
+def train_student(teacher_path, student="yolov8n.pt", train_args=None, alpha=1.0, temperature=2.0):
+    """Train the student with distillation and return the path of its best weights"""
+    from train import TRAIN_ARGS
+
+    args = dict(TRAIN_ARGS, name='distill')
+    args.update(train_args or {})
+
+    print(f"\n🎓 Distilling {teacher_path} → {student} (alpha={alpha}, T={temperature})")
+    model = YOLO(student)
+    add_distillation_callbacks(model, teacher_path, alpha, temperature)
+    model.train(**args)
+    return Path(model.trainer.save_dir) / "weights" / "best.pt"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Distill best.pt into a nano-sized student')
+    parser.add_argument('--teacher', default='runs/detect/train/weights/best.pt', help='Trained teacher weights')
+    parser.add_argument('--student', default='yolov8n.pt', help='Student weights or model YAML')
+    parser.add_argument('--alpha', type=float, default=1.0, help='Distillation loss weight')
+    parser.add_argument('--temperature', type=float, default=2.0, help='Distillation temperature')
+    parser.add_argument('--epochs', type=int, default=None, help='Override training epochs')
+    parser.add_argument('--compare-only', default=None, metavar='STUDENT_PT',
+                        help='Skip training and only compare the teacher with this student')
+    parser.add_argument('--report', default='distillation_report.json', help='Report output file')
+    args = parser.parse_args()
+
+    if args.compare_only:
+        student_best = args.compare_only
+    else:
+        overrides = {'device': 'cpu'}
+        if args.epochs:
+            overrides['epochs'] = args.epochs
+        student_best = train_student(args.teacher, args.student, overrides, args.alpha, args.temperature)
+
+    compare_models(args.teacher, student_best, output=args.report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Cached-Prediction Threshold Evaluation
+Runs the model once per split at a low confidence, caches raw predictions and
+ground truth, then recomputes precision / recall / F1 / mAP per class for any
+grid of confidence, NMS IoU, match IoU and per-class thresholds with
+vectorized NumPy - no re-inference per setting.
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+from dataset_index import read_labels
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+CACHE_VERSION = 1
+
+
+def box_iou(a, b):
+    """Pairwise IoU of two xyxy box arrays, shape [len(a), len(b)]"""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(rb - lt, 0, None).prod(2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def load_labels(label_file, width, height):
+    """YOLO txt labels (boxes or polygons) as (cls [n], xyxy pixels [n, 4])"""
+    cls, xywhn = read_labels(label_file)
+    xc, yc = xywhn[:, 0] * width, xywhn[:, 1] * height
+    w, h = xywhn[:, 2] * width, xywhn[:, 3] * height
+    xyxy = np.stack([xc - w / 2, yc - h / 2, xc + w / 2, yc + h / 2], 1)
+    return cls, xyxy
+
+
+def build_cache(model_path, image_dir, cache_path, imgsz=640, conf=0.001, iou=0.7):
+    """Run the model once over a split and store predictions + ground truth as .npz"""
+    from ultralytics import YOLO
+
+    model = YOLO(model_path)
+    image_dir = Path(image_dir)
+    label_dir = image_dir.parent / "labels"
+    files = sorted(p for p in image_dir.glob("*") if p.suffix.lower() in ('.jpg', '.jpeg', '.png'))
+
+    pred_img, pred_cls, pred_conf, pred_box = [], [], [], []
+    gt_img, gt_cls, gt_box = [], [], []
+    print(f"🔮 Predicting {len(files)} images once at conf={conf}...")
+    for i, f in enumerate(files):
+        result = model.predict(str(f), imgsz=imgsz, conf=conf, iou=iou, max_det=300, verbose=False)[0]
+        boxes = result.boxes
+        n = len(boxes)
+        pred_img.append(np.full(n, i, dtype=np.int32))
+        pred_cls.append(boxes.cls.cpu().numpy().astype(np.int16))
+        pred_conf.append(boxes.conf.cpu().numpy().astype(np.float32))
+        pred_box.append(boxes.xyxy.cpu().numpy().astype(np.float32))
+
+        h, w = result.orig_shape
+        cls, xyxy = load_labels(label_dir / f"{f.stem}.txt", w, h)
+        gt_img.append(np.full(len(cls), i, dtype=np.int32))
+        gt_cls.append(cls)
+        gt_box.append(xyxy.astype(np.float32))
+
+    names = [model.names[i] for i in sorted(model.names)]
+    np.savez_compressed(
+        cache_path, version=CACHE_VERSION, names=np.array(names), files=np.array([str(f) for f in files]),
+        conf=conf, nms_iou=iou,
+        pred_img=np.concatenate(pred_img), pred_cls=np.concatenate(pred_cls),
+        pred_conf=np.concatenate(pred_conf), pred_box=np.concatenate(pred_box).reshape(-1, 4),
+        gt_img=np.concatenate(gt_img), gt_cls=np.concatenate(gt_cls),
+        gt_box=np.concatenate(gt_box).reshape(-1, 4),
+    )
+    print(f"💾 Cached predictions: {cache_path}")
+
+
+def load_cache(cache_path):
+    data = np.load(cache_path, allow_pickle=False)
+    return {k: data[k] for k in data.files}
+
+
+def nms_filter(pred_img, pred_cls, pred_conf, pred_box, iou_thr):
+    """
+    Per-image, per-class greedy NMS re-applied to cached boxes at a stricter IoU.
+    Returns a keep mask. (Cached boxes already passed NMS at the cache IoU, so
+    only values at or below it are meaningful.)
+    """
+    keep = np.ones(len(pred_conf), dtype=bool)
+    group = pred_img.astype(np.int64) * 1000 + pred_cls
+    for g in np.unique(group):
+        idx = np.nonzero(group == g)[0]
+        if len(idx) < 2:
+            continue
+        idx = idx[np.argsort(-pred_conf[idx])]
+        ious = box_iou(pred_box[idx], pred_box[idx])
+        suppressed = np.zeros(len(idx), dtype=bool)
+        for j in range(len(idx)):
+            if suppressed[j]:
+                continue
+            suppressed |= (ious[j] > iou_thr) & (np.arange(len(idx)) > j)
+        keep[idx[suppressed]] = False
+    return keep
+
+
+def match_predictions(cache, keep=None):
+    """
+    True-positive flags [n_pred, n_iou] for every IoU threshold in IOU_THRESHOLDS.
+
+    Matching is greedy by descending confidence within each image and class,
+    so a prediction's TP flag does not depend on any lower-confidence
+    prediction. That makes the flags valid for every confidence cutoff and
+    per-class threshold, which is what allows the grid to be swept without
+    re-matching.
+    """
+    n = len(cache['pred_conf'])
+    keep = np.ones(n, dtype=bool) if keep is None else keep
+    tp = np.zeros((n, len(IOU_THRESHOLDS)), dtype=bool)
+
+    pred_order = np.argsort(cache['pred_img'], kind='stable')
+    gt_order = np.argsort(cache['gt_img'], kind='stable')
+    n_images = len(cache['files'])
+    p_bounds = np.searchsorted(cache['pred_img'][pred_order], np.arange(n_images + 1))
+    g_bounds = np.searchsorted(cache['gt_img'][gt_order], np.arange(n_images + 1))
+
+    for i in range(n_images):
+        p_idx = pred_order[p_bounds[i]:p_bounds[i + 1]]
+        p_idx = p_idx[keep[p_idx]]
+        g_idx = gt_order[g_bounds[i]:g_bounds[i + 1]]
+        if len(p_idx) == 0 or len(g_idx) == 0:
+            continue
+
+        iou = box_iou(cache['gt_box'][g_idx], cache['pred_box'][p_idx])
+        iou *= cache['gt_cls'][g_idx][:, None] == cache['pred_cls'][p_idx][None, :]
+        for t, thr in enumerate(IOU_THRESHOLDS):
+            gi, pi = np.nonzero(iou >= thr)
+            if len(gi) == 0:
+                continue
+            # Highest confidence first, then highest IoU; each GT and prediction used once
+            order = np.lexsort((-iou[gi, pi], -cache['pred_conf'][p_idx][pi]))
+            gi, pi = gi[order], pi[order]
+            _, first = np.unique(pi, return_index=True)
+            gi, pi = gi[np.sort(first)], pi[np.sort(first)]
+            _, first = np.unique(gi, return_index=True)
+            tp[p_idx[pi[first]], t] = True
+    return tp
+
+
+def average_precision(tp, conf, n_gt):
+    """COCO-style 101-point interpolated AP for each IoU column"""
+    if n_gt == 0 or len(conf) == 0:
+        return np.zeros(tp.shape[1])
+    order = np.argsort(-conf, kind='stable')
+    tpc = np.cumsum(tp[order], 0)
+    fpc = np.cumsum(~tp[order], 0)
+    recall = tpc / n_gt
+    precision = tpc / (tpc + fpc)
+    x = np.linspace(0, 1, 101)
+    ap = np.zeros(tp.shape[1])
+    for t in range(tp.shape[1]):
+        mpre = np.flip(np.maximum.accumulate(np.flip(np.concatenate([[1.0], precision[:, t], [0.0]]))))
+        mrec = np.concatenate([[0.0], recall[:, t], [1.0]])
+        ap[t] = np.trapezoid(np.interp(x, mrec, mpre), x) if hasattr(np, 'trapezoid') \
+            else np.trapz(np.interp(x, mrec, mpre), x)
+    return ap
+
+
+def sweep(cache, tp, conf_grid, iou_index=0, keep=None):
+    """
+    P/R/F1 for every class and confidence threshold in one pass.
+    Returns arrays [n_classes, n_conf] for precision, recall and f1.
+    """
+    keep = np.ones(len(cache['pred_conf']), dtype=bool) if keep is None else keep
+    nc = len(cache['names'])
+    conf_grid = np.asarray(conf_grid, dtype=np.float32)
+    p = np.zeros((nc, len(conf_grid)))
+    r = np.zeros_like(p)
+
+    for c in range(nc):
+        sel = keep & (cache['pred_cls'] == c)
+        conf = np.sort(cache['pred_conf'][sel])
+        hits = tp[sel, iou_index][np.argsort(cache['pred_conf'][sel], kind='stable')]
+        # Suffix sums: predictions with conf >= threshold
+        tp_suffix = np.concatenate([np.cumsum(hits[::-1])[::-1], [0]])
+        start = np.searchsorted(conf, conf_grid, side='left')
+        n_pred = len(conf) - start
+        n_tp = tp_suffix[start]
+        n_gt = int((cache['gt_cls'] == c).sum())
+        p[c] = np.where(n_pred > 0, n_tp / np.maximum(n_pred, 1), 1.0)
+        r[c] = n_tp / n_gt if n_gt else 0.0
+
+    f1 = 2 * p * r / np.maximum(p + r, 1e-9)
+    return p, r, f1
+
+
+def evaluate_thresholds(cache, tp, thresholds, iou_index=0, keep=None):
+    """Metrics for one per-class threshold vector (array indexed by class id)"""
+    keep = np.ones(len(cache['pred_conf']), dtype=bool) if keep is None else keep
+    active = keep & (cache['pred_conf'] >= np.asarray(thresholds)[cache['pred_cls']])
+    rows = {}
+    for c, name in enumerate(cache['names']):
+        sel = active & (cache['pred_cls'] == c)
+        n_gt = int((cache['gt_cls'] == c).sum())
+        n_tp = int(tp[sel, iou_index].sum())
+        n_pred = int(sel.sum())
+        p = n_tp / n_pred if n_pred else 1.0
+        r = n_tp / n_gt if n_gt else 0.0
+        ap = average_precision(tp[keep & (cache['pred_cls'] == c)],
+                               cache['pred_conf'][keep & (cache['pred_cls'] == c)], n_gt)
+        rows[str(name)] = {'threshold': float(thresholds[c]), 'precision': p, 'recall': r,
+                           'f1': 2 * p * r / (p + r) if p + r else 0.0,
+                           'mAP50': float(ap[0]), 'mAP50-95': float(ap.mean()), 'gt': n_gt}
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Threshold sweeps from cached predictions')
+    parser.add_argument('--model', default='runs/detect/train/weights/best.pt', help='Model weights')
+    parser.add_argument('--split', default='valid/images', help='Image directory of the split')
+    parser.add_argument('--cache', default=None, help='Prediction cache (.npz); default: <split>_preds.npz')
+    parser.add_argument('--rebuild', action='store_true', help='Re-run the model even if a cache exists')
+    parser.add_argument('--imgsz', type=int, default=640, help='Inference size for the cache')
+    parser.add_argument('--conf-grid', type=float, nargs=3, default=[0.05, 0.95, 0.05],
+                        metavar=('START', 'STOP', 'STEP'), help='Confidence grid')
+    parser.add_argument('--nms-iou', type=float, nargs='+', default=None,
+                        help='NMS IoU values to re-apply (<= cache IoU 0.7)')
+    parser.add_argument('--match-iou', type=float, default=0.5, help='IoU for P/R/F1 matching')
+    parser.add_argument('--thresholds', default=None,
+                        help='YAML {class: conf} to evaluate, e.g. {breakage: 0.6, crack: 0.6, scratch: 0.5}')
+    parser.add_argument('--output', default=None, help='Write best-F1 per-class thresholds to this YAML')
+    args = parser.parse_args()
+
+    split = Path(args.split)
+    cache_path = Path(args.cache or f"{split.parent.name}_preds.npz")
+    if args.rebuild or not cache_path.exists():
+        build_cache(args.model, split, cache_path, args.imgsz)
+    cache = load_cache(cache_path)
+    names = [str(n) for n in cache['names']]
+    print(f"📦 {len(cache['pred_conf'])} cached predictions, {len(cache['gt_cls'])} labels, "
+          f"{len(cache['files'])} images")
+
+    start, stop, step = args.conf_grid
+    conf_grid = np.round(np.arange(start, stop + step / 2, step), 4)
+    iou_index = int(np.argmin(np.abs(IOU_THRESHOLDS - args.match_iou)))
+
+    for nms_iou in (args.nms_iou or [None]):
+        keep = None
+        if nms_iou is not None:
+            keep = nms_filter(cache['pred_img'], cache['pred_cls'], cache['pred_conf'],
+                              cache['pred_box'], nms_iou)
+        tp = match_predictions(cache, keep)
+        p, r, f1 = sweep(cache, tp, conf_grid, iou_index, keep)
+
+        label = f"NMS IoU {nms_iou}" if nms_iou is not None else f"cached NMS IoU {float(cache['nms_iou'])}"
+        print(f"\n{'='*60}\n📈 F1 vs confidence ({label}, match IoU {IOU_THRESHOLDS[iou_index]:.2f})\n{'='*60}")
+        print(f"{'conf':>6} " + " ".join(f"{n:>10}" for n in names))
+        for j, c in enumerate(conf_grid):
+            print(f"{c:>6.2f} " + " ".join(f"{f1[k, j]:>10.3f}" for k in range(len(names))))
+
+        best = conf_grid[np.argmax(f1, axis=1)]
+        print("\n🎯 Best-F1 threshold per class: "
+              + ", ".join(f"{n}={b:.2f}" for n, b in zip(names, best)))
+
+        candidates = {'best-F1': best}
+        if args.thresholds:
+            with open(args.thresholds) as f:
+                given = yaml.safe_load(f)
+            candidates['given'] = np.array([given.get(n, 1.0) for n in names], dtype=np.float32)
+        for title, thr in candidates.items():
+            rows = evaluate_thresholds(cache, tp, thr, iou_index, keep)
+            print(f"\n{title}: {'class':<10} {'thr':>5} {'P':>6} {'R':>6} {'F1':>6} {'mAP50':>7} {'mAP50-95':>9}")
+            for n, m in rows.items():
+                print(f"{'':>{len(title) + 1}} {n:<10} {m['threshold']:>5.2f} {m['precision']:>6.3f} "
+                      f"{m['recall']:>6.3f} {m['f1']:>6.3f} {m['mAP50']:>7.3f} {m['mAP50-95']:>9.3f}")
+
+    if args.output:
+        # Thresholds from the last NMS setting evaluated
+        with open(args.output, 'w') as f:
+            yaml.safe_dump({'class_thresholds': {n: float(b) for n, b in zip(names, best)}}, f,
+                           sort_keys=False)
+        print(f"\n💾 Thresholds written to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
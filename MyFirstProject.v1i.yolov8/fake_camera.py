@@ -0,0 +1,531 @@
+"""
+Fake IP Camera (record & replay)
+Records an MJPEG stream (e.g. the IP Webcam app), a video file or a directory
+of images into recordings/<name>/ (frames.mjpeg + timestamps.csv), and replays
+recordings as local IP Webcam look-alikes (/video, /shot.jpg) on one port per
+camera, in real time or faster. `bench` runs the capture/detection pipeline
+against 1..N fake cameras on this machine.
+
+Record:  python fake_camera.py record --source http://192.168.0.192:8080/video --duration 60
+         python fake_camera.py record --source test/images --fps 5 --name test_images
+Replay:  python fake_camera.py serve recordings/test_images --cameras 4 --port 8081 --speed 2
+Bench:   python fake_camera.py bench recordings/test_images --cameras 1 4 16 --model best.pt
+"""
+
+import os
+import sys
+import csv
+import time
+import bisect
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import yaml
+
+PROJECT_DIR = Path(__file__).parent.absolute()
+RECORDINGS_DIR = PROJECT_DIR / "recordings"
+BOUNDARY = "ringfaultframe"
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+
+
+# --- Recording format ---
+class RecordingWriter:
+    """Appends JPEG frames to frames.mjpeg and their offsets/timestamps to timestamps.csv"""
+
+    def __init__(self, out_dir):
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self._data = open(self.out_dir / "frames.mjpeg", 'wb')
+        self._index = open(self.out_dir / "timestamps.csv", 'w', newline='')
+        self._csv = csv.writer(self._index)
+        self._csv.writerow(['frame', 'offset', 'length', 'timestamp'])
+        self.frames = 0
+        self._t0 = None
+
+    def add(self, jpeg, timestamp=None):
+        """Store one encoded frame; timestamps are seconds (wall clock if None)"""
+        timestamp = time.time() if timestamp is None else timestamp
+        if self._t0 is None:
+            self._t0 = timestamp
+        offset = self._data.tell()
+        self._data.write(jpeg)
+        self._csv.writerow([self.frames, offset, len(jpeg), f"{timestamp - self._t0:.6f}"])
+        self.frames += 1
+
+    def close(self):
+        self._data.close()
+        self._index.close()
+
+
+class Recording:
+    """A recording loaded into memory: `frames` (JPEG bytes) and `timestamps` (seconds from start)"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / "frames.mjpeg", 'rb') as f:
+            data = f.read()
+        self.frames, self.timestamps = [], []
+        with open(self.path / "timestamps.csv", newline='') as f:
+            for row in csv.DictReader(f):
+                offset, length = int(row['offset']), int(row['length'])
+                self.frames.append(data[offset:offset + length])
+                self.timestamps.append(float(row['timestamp']))
+        if not self.frames:
+            raise ValueError(f"{self.path} has no frames")
+        # Loop length: last timestamp plus one typical frame gap
+        gap = (self.timestamps[-1] / (len(self.timestamps) - 1)) if len(self.timestamps) > 1 else 1.0
+        self.duration = self.timestamps[-1] + gap
+
+    @property
+    def fps(self):
+        return len(self.frames) / self.duration
+
+
+def iter_mjpeg(url, chunk_size=65536):
+    """JPEG frames from an HTTP MJPEG stream, split on the JPEG start/end markers"""
+    buffer = b''
+    with urllib.request.urlopen(url, timeout=10) as stream:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                return
+            buffer += chunk
+            while True:
+                start = buffer.find(b'\xff\xd8')
+                end = buffer.find(b'\xff\xd9', start + 2) if start >= 0 else -1
+                if end < 0:
+                    # Keep only from the last frame start
+                    buffer = buffer[start:] if start >= 0 else b''
+                    break
+                yield buffer[start:end + 2]
+                buffer = buffer[end + 2:]
+
+
+def record(source, out_dir, duration=None, max_frames=None, fps=5.0, quality=90):
+    """Record `source` (MJPEG URL, image directory or anything cv2.VideoCapture opens); returns frame count"""
+    import cv2
+
+    writer = RecordingWriter(out_dir)
+    start = time.time()
+
+    def done():
+        return ((max_frames and writer.frames >= max_frames)
+                or (duration and time.time() - start >= duration))
+
+    try:
+        if Path(source).is_dir():
+            # Still images get evenly spaced timestamps at --fps
+            files = sorted(p for p in Path(source).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+            for i, path in enumerate(files):
+                if max_frames and writer.frames >= max_frames:
+                    break
+                if path.suffix.lower() in ('.jpg', '.jpeg'):
+                    jpeg = path.read_bytes()
+                else:
+                    jpeg = cv2.imencode('.jpg', cv2.imread(str(path)), [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+                writer.add(jpeg, i / fps)
+        elif str(source).startswith(('http://', 'https://')):
+            # Keep the camera's own JPEGs (no re-encoding)
+            for jpeg in iter_mjpeg(source):
+                writer.add(jpeg)
+                if writer.frames % 100 == 0:
+                    print(f"  {writer.frames} frames ({time.time() - start:.0f}s)")
+                if done():
+                    break
+        else:
+            cap = cv2.VideoCapture(str(source))
+            if not cap.isOpened():
+                raise ConnectionError(f"Cannot open {source}")
+            is_file = Path(source).is_file()
+            while not done():
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                # Video files carry their own timing; live sources use the wall clock
+                ts = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000 if is_file else None
+                writer.add(cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes(), ts)
+            cap.release()
+    except KeyboardInterrupt:
+        print("\nRecording stopped by user.")
+    finally:
+        writer.close()
+    return writer.frames
+
+
+# --- Replay server ---
+class Replay:
+    """
+    Playback clock for one fake camera. All clients of a camera see the same
+    "live" frame, like a real camera; speed=0 sends frames back to back.
+    """
+
+    def __init__(self, recording, speed=1.0, loop=True):
+        self.recording = recording
+        self.speed = speed
+        self.loop = loop
+        self.start = time.monotonic()
+        self.frames_sent = 0
+        self._lock = threading.Lock()
+
+    def position(self, now=None):
+        """Frames played so far across loops (frame = position % len), or None once a non-looping replay has ended"""
+        rec = self.recording
+        elapsed = ((now or time.monotonic()) - self.start) * self.speed
+        cycle, offset = divmod(elapsed, rec.duration)
+        if cycle and not self.loop:
+            return None
+        return int(cycle) * len(rec.frames) + max(0, bisect.bisect_right(rec.timestamps, offset) - 1)
+
+    def wait_next(self, position):
+        """Seconds until the frame after `position` is due"""
+        rec = self.recording
+        cycle, index = divmod(position + 1, len(rec.frames))
+        due = cycle * rec.duration + rec.timestamps[index]
+        return max(0.0, (due - (time.monotonic() - self.start) * self.speed) / self.speed)
+
+    def sent(self):
+        with self._lock:
+            self.frames_sent += 1
+
+
+class FakeCameraHandler(BaseHTTPRequestHandler):
+    """IP Webcam look-alike: /video (multipart MJPEG) and /shot.jpg (current frame)"""
+    replay = None
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == '/video':
+            self._stream()
+        elif path in ('/shot.jpg', '/photo.jpg'):
+            position = self.replay.position()
+            frames = self.replay.recording.frames
+            frame = frames[position % len(frames) if position is not None else -1]
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(frame)))
+            self.end_headers()
+            self.wfile.write(frame)
+            self.replay.sent()
+        elif path == '/':
+            rec = self.replay.recording
+            body = (f"fake camera: {rec.path.name}, {len(rec.frames)} frames, {rec.fps:.1f} fps, "
+                    f"speed {self.replay.speed}x, {self.replay.frames_sent} frames sent\n").encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_error(404)
+
+    def _stream(self):
+        replay = self.replay
+        frames = replay.recording.frames
+        self.send_response(200)
+        self.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        last = -1
+        try:
+            while True:
+                if replay.speed <= 0:
+                    position = last + 1
+                    if position == len(frames) and not replay.loop:
+                        return
+                else:
+                    position = replay.position()
+                    if position is None:
+                        return
+                    if position == last:
+                        time.sleep(replay.wait_next(position))
+                        continue
+                frame = frames[position % len(frames)]
+                self.wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                 f"Content-Length: {len(frame)}\r\n\r\n".encode())
+                self.wfile.write(frame)
+                self.wfile.write(b"\r\n")
+                replay.sent()
+                last = position
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        # Every stream request would flood the console
+        pass
+
+
+def start_cameras(recordings, cameras, port, host='127.0.0.1', speed=1.0, loop=True):
+    """
+    Serve `cameras` fake cameras on consecutive ports from `port`, cycling
+    through `recordings`. Returns [(url, server, replay)]; call server.shutdown() to stop.
+    """
+    loaded = [r if isinstance(r, Recording) else Recording(r) for r in recordings]
+    started = []
+    for i in range(cameras):
+        replay = Replay(loaded[i % len(loaded)], speed, loop)
+        handler = type('FakeCamera', (FakeCameraHandler,), {'replay': replay})
+        server = ThreadingHTTPServer((host, port + i), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name=f'fake-camera-{port + i}', daemon=True).start()
+        started.append((f"http://{host}:{port + i}/video", server, replay))
+    return started
+
+
+def stop_cameras(started):
+    for _, server, _ in started:
+        server.shutdown()
+        server.server_close()
+
+
+# --- Pipeline benchmark ---
+def _camera_config(url, out_dir, base_config="ip_camera_config.yaml"):
+    """Per-camera copy of ip_camera_config.yaml pointing at a fake camera"""
+    with open(PROJECT_DIR / base_config) as f:
+        config = yaml.safe_load(f) or {}
+    config.update(ip_camera_url=url, output_directory=str(out_dir / "captured"),
+                  detection_output_dir=str(out_dir / "detections"), save_detections=False)
+    path = out_dir / "ip_camera_config.yaml"
+    with open(path, 'w') as f:
+        yaml.safe_dump(config, f)
+    return path
+
+
+def bench_capture(urls, model_path, duration, work_dir):
+    """IPCameraCapture per camera in threads, sharing one model; returns per-camera stats"""
+    from ip_camera_capture import IPCameraCapture
+    from model_registry import get_model, backend_name
+
+    model = get_model(model_path)
+    # A local YOLO object is not safe to call from several threads; a remote one is
+    infer_lock = threading.Lock() if backend_name(model_path) != 'remote' else None
+    stats = [{'frames': 0, 'capture_ms': [], 'inference_ms': []} for _ in urls]
+    stop = threading.Event()
+
+    def worker(i, url):
+        cam_dir = work_dir / f"cam{i}"
+        cam_dir.mkdir(exist_ok=True)
+        capture = IPCameraCapture(str(_camera_config(url, cam_dir)), model=model)
+        try:
+            capture.connect_camera()
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                frame = capture.capture_frame()
+                t1 = time.perf_counter()
+                # Same call as IPCameraCapture.run_detection(), minus the per-frame console line
+                if infer_lock:
+                    with infer_lock:
+                        model.predict(frame, verbose=False)
+                else:
+                    model.predict(frame, verbose=False)
+                t2 = time.perf_counter()
+                s = stats[i]
+                s['frames'] += 1
+                s['capture_ms'].append((t1 - t0) * 1000)
+                s['inference_ms'].append((t2 - t1) * 1000)
+        except Exception as e:
+            print(f"⚠ Camera {i}: {e}")
+        finally:
+            capture.cleanup()
+
+    threads = [threading.Thread(target=worker, args=(i, url), daemon=True) for i, url in enumerate(urls)]
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join(timeout=30)
+    for s in stats:
+        s['fps'] = s['frames'] / duration
+    return stats
+
+
+def _scrape(port):
+    """(frames inferred, {stage: (sum, count)}) from a test.py /metrics endpoint"""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=2) as r:
+            text = r.read().decode()
+    except OSError:
+        return None
+    frames, stages = 0, {}
+    for line in text.splitlines():
+        if line.startswith('ringfault_frames_inferred_total'):
+            frames += float(line.rsplit(' ', 1)[1])
+        elif line.startswith(('ringfault_stage_seconds_sum', 'ringfault_stage_seconds_count')):
+            name, value = line.rsplit(' ', 1)
+            stage = name.split('stage="', 1)[1].split('"', 1)[0]
+            total, count = stages.get(stage, (0.0, 0))
+            if '_sum' in name:
+                stages[stage] = (float(value), count)
+            else:
+                stages[stage] = (total, float(value))
+    return frames, stages
+
+
+def bench_detection(urls, model_path, duration, work_dir, metrics_port=9200, warmup=30):
+    """One offline test.py process per camera; frame rates and stage latencies from their /metrics"""
+    procs, ports = [], []
+    for i, url in enumerate(urls):
+        cam_dir = work_dir / f"cam{i}"
+        cam_dir.mkdir(exist_ok=True)
+        port = metrics_port + i
+        cmd = [sys.executable, str(PROJECT_DIR / "test.py"), '--model', str(model_path), '--source', 'ip_camera',
+               '--ip-config', str(_camera_config(url, cam_dir)), '--interval', '0', '--offline',
+               '--log-dir', '', '--metrics-port', str(port)]
+        log = open(cam_dir / "test.log", 'w')
+        # Annotated frames go to the run's own detected_faults/, not the dashboard gallery
+        env = {**os.environ, 'RINGFAULT_FAULTS_DIR': str(cam_dir / "detected_faults")}
+        procs.append(subprocess.Popen(cmd, cwd=cam_dir, env=env, stdout=log, stderr=subprocess.STDOUT))
+        ports.append(port)
+
+    try:
+        # Wait until every process has inferred at least one frame (model load, warm-up)
+        deadline = time.time() + warmup
+        first = [None] * len(ports)
+        while time.time() < deadline and None in first:
+            for i, port in enumerate(ports):
+                if first[i] is None:
+                    sample = _scrape(port)
+                    if sample and sample[0] > 0:
+                        first[i] = sample
+            time.sleep(0.5)
+        if None in first:
+            print(f"⚠ {first.count(None)} process(es) produced no frames in {warmup}s (see {work_dir}/cam*/test.log)")
+        t0 = time.time()
+        time.sleep(duration)
+        elapsed = time.time() - t0
+        stats = []
+        for i, port in enumerate(ports):
+            last = _scrape(port)
+            if first[i] is None or last is None:
+                stats.append({'frames': 0, 'fps': 0.0, 'stage_ms': {}})
+                continue
+            frames = last[0] - first[i][0]
+            stage_ms = {}
+            for stage, (total, count) in last[1].items():
+                t_prev, c_prev = first[i][1].get(stage, (0.0, 0))
+                if count > c_prev:
+                    stage_ms[stage] = (total - t_prev) / (count - c_prev) * 1000
+            stats.append({'frames': frames, 'fps': frames / elapsed, 'stage_ms': stage_ms})
+        return stats
+    finally:
+        for p in procs:
+            p.send_signal(2)  # SIGINT: lets test.py shut down cleanly
+        for p in procs:
+            try:
+                p.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                p.kill()
+
+
+def bench(recordings, camera_counts, model_path, duration=20.0, port=8081, speed=1.0, target='capture'):
+    """Run the pipeline against 1..N fake cameras and print throughput per camera count"""
+    print(f"\n{'='*60}")
+    print(f"📊 Fake camera benchmark: {target}, {duration:.0f}s per run, replay speed {speed}x")
+    print(f"{'='*60}")
+    loaded = [Recording(r) for r in recordings]
+    for rec in loaded:
+        print(f"  {rec.path.name}: {len(rec.frames)} frames, {rec.fps:.1f} fps")
+    rows = []
+    for n in camera_counts:
+        cameras = start_cameras(loaded, n, port, speed=speed)
+        try:
+            with tempfile.TemporaryDirectory(prefix='fake_camera_') as tmp:
+                urls = [url for url, _, _ in cameras]
+                if target == 'detection':
+                    stats = bench_detection(urls, model_path, duration, Path(tmp))
+                else:
+                    stats = bench_capture(urls, model_path, duration, Path(tmp))
+        finally:
+            stop_cameras(cameras)
+        fps = [s['fps'] for s in stats]
+        row = {'cameras': n, 'total_fps': sum(fps), 'min_fps': min(fps), 'mean_fps': float(np.mean(fps))}
+        if target == 'detection':
+            for stage in ('capture', 'inference', 'postprocess'):
+                values = [s['stage_ms'][stage] for s in stats if stage in s['stage_ms']]
+                row[f'{stage}_ms'] = float(np.mean(values)) if values else float('nan')
+        else:
+            for key in ('capture_ms', 'inference_ms'):
+                values = [v for s in stats for v in s[key]]
+                row[key] = float(np.percentile(values, 50)) if values else float('nan')
+                row[key.replace('_ms', '_p95_ms')] = float(np.percentile(values, 95)) if values else float('nan')
+        rows.append(row)
+        print(f"  {n:>2} camera(s): {row['total_fps']:.1f} frames/s total, "
+              f"{row['mean_fps']:.2f} mean / {row['min_fps']:.2f} min per camera")
+
+    keys = [k for k in rows[0] if k != 'cameras']
+    print(f"\n{'cameras':>8}" + ''.join(f"{k:>18}" for k in keys))
+    for row in rows:
+        print(f"{row['cameras']:>8}" + ''.join(f"{row[k]:>18.2f}" for k in keys))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record and replay fake IP cameras for load testing')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    r = sub.add_parser('record', help='Record a stream, video or image directory')
+    r.add_argument('--source', required=True, help='MJPEG URL (e.g. ip_camera_url), video file or image directory')
+    r.add_argument('--name', default=None, help='Recording name under recordings/ (default: timestamp)')
+    r.add_argument('--duration', type=float, default=None, help='Seconds to record (live sources)')
+    r.add_argument('--max-frames', type=int, default=None, help='Stop after this many frames')
+    r.add_argument('--fps', type=float, default=5.0, help='Frame rate assigned to image directories')
+
+    s = sub.add_parser('serve', help='Replay recordings as IP cameras')
+    s.add_argument('recordings', nargs='+', help='Recording directories (assigned to cameras round-robin)')
+    s.add_argument('--cameras', type=int, default=1, help='Number of fake cameras (one port each)')
+    s.add_argument('--port', type=int, default=8081, help='First port')
+    s.add_argument('--host', default='127.0.0.1', help='Bind address')
+    s.add_argument('--speed', type=float, default=1.0, help='Replay speed (2 = twice real time, 0 = as fast as possible)')
+    s.add_argument('--no-loop', action='store_true', help='End streams at the end of the recording')
+
+    b = sub.add_parser('bench', help='Benchmark the pipeline against 1..N fake cameras')
+    b.add_argument('recordings', nargs='+', help='Recording directories')
+    b.add_argument('--cameras', type=int, nargs='+', default=[1, 4, 16], help='Camera counts to test')
+    b.add_argument('--model', default='runs/detect/train/weights/best.pt',
+                   help='Model weights, or an inference_server.py URL')
+    b.add_argument('--target', choices=['capture', 'detection'], default='capture',
+                   help='capture: IPCameraCapture threads in this process; detection: one test.py per camera')
+    b.add_argument('--duration', type=float, default=20.0, help='Seconds measured per camera count')
+    b.add_argument('--port', type=int, default=8081, help='First fake camera port')
+    b.add_argument('--speed', type=float, default=1.0, help='Replay speed')
+
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        name = args.name or time.strftime("%Y%m%d_%H%M%S")
+        out_dir = RECORDINGS_DIR / name
+        print(f"⏺ Recording {args.source} → {out_dir}")
+        frames = record(args.source, out_dir, args.duration, args.max_frames, args.fps)
+        print(f"✓ {frames} frames saved to {out_dir}")
+        return 0 if frames else 1
+
+    if args.command == 'bench':
+        model = args.model
+        if not model.startswith(('http://', 'https://')) and not os.path.isabs(model):
+            model = str(PROJECT_DIR / model)
+        bench(args.recordings, args.cameras, model, args.duration, args.port, args.speed, args.target)
+        return 0
+
+    cameras = start_cameras(args.recordings, args.cameras, args.port, args.host, args.speed, not args.no_loop)
+    for url, _, replay in cameras:
+        rec = replay.recording
+        print(f"📷 {url}  ← {rec.path.name} ({len(rec.frames)} frames, {rec.fps:.1f} fps x{args.speed})")
+    print("Set ip_camera_url to one of these URLs (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\nStopping fake cameras.")
+        stop_cameras(cameras)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+Incremental Fine-tuning
+Refreshes the deployed best.pt with newly labeled captures in minutes instead
+of a full 200-epoch run: starts from best.pt, freezes the backbone, trains a
+short schedule on the new images mixed with a replay sample of train/ (so the
+model doesn't forget the original data), then promotes the result only if no
+class loses mAP50-95 on valid/. The previous best.pt is kept as a backup.
+
+python finetune.py labeled_captures/              # reviewed frames from labeling_queue/
+python finetune.py batch1/ batch2/ --epochs 10 --replay 3
+"""
+
+import os
+import json
+import random
+import shutil
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+import yaml
+
+from dataset_index import IMAGE_EXTENSIONS, split_dirs
+
+PROJECT_DIR = Path(__file__).parent.absolute()
+BEST_MODEL = "runs/detect/train/weights/best.pt"
+
+# Short schedule on top of TRAIN_ARGS; the first 10 modules are the YOLOv8 backbone
+FINETUNE_ARGS = dict(
+    epochs=15,
+    patience=15,
+    freeze=10,
+    lr0=0.0003,
+    warmup_epochs=1.0,
+    save_period=-1,
+    plots=False,
+    project="runs/finetune",
+    name="incremental",
+)
+
+
+def yolo_label_path(image):
+    """Label file ultralytics reads for `image`: the last /images/ in its path replaced by /labels/"""
+    images, labels = f"{os.sep}images{os.sep}", f"{os.sep}labels{os.sep}"
+    return Path(labels.join(str(image).rsplit(images, 1)).rsplit('.', 1)[0] + '.txt')
+
+
+def labeled_images(dirs):
+    """
+    Images under `dirs` (each an images/ + labels/ pair, or an images/ dir itself)
+    whose label file is where ultralytics will look for it. Raises ValueError
+    for labels ultralytics would not find (they would train as backgrounds).
+    """
+    found, unlabeled, misplaced = [], 0, []
+    for d in dirs:
+        d = Path(d)
+        image_dir = d / "images" if (d / "images").is_dir() else d
+        label_dir = image_dir.parent / "labels"
+        for p in sorted(image_dir.iterdir()):
+            if p.suffix.lower() not in IMAGE_EXTENSIONS:
+                continue
+            image = p.resolve()
+            if yolo_label_path(image).exists():
+                found.append(image)
+            elif (label_dir / f"{p.stem}.txt").exists():
+                misplaced.append(image)
+            else:
+                unlabeled += 1
+    if misplaced:
+        raise ValueError(f"{len(misplaced)} image(s) have labels ultralytics won't find, e.g. {misplaced[0]} "
+                         f"is read with {yolo_label_path(misplaced[0])}; "
+                         f"put them in an images/ + labels/ layout (batch/images, batch/labels)")
+    if unlabeled:
+        print(f"⚠ Skipped {unlabeled} image(s) without a label file")
+    return found
+
+
+def build_dataset(new_images, data="data.yaml", replay=2.0, min_replay=100, out_dir="runs/finetune", seed=0):
+    """
+    Write train.txt (new images + a random replay sample of the original train
+    split, `replay` x as many, at least `min_replay`) and a data YAML that
+    validates on the original val split. Returns the YAML path.
+    """
+    dirs, names, _ = split_dirs(data)
+    train_images = sorted(p for p in dirs['train'][0].iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    n_replay = min(len(train_images), max(min_replay, round(replay * len(new_images))))
+    replayed = random.Random(seed).sample(train_images, n_replay)
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    listing = out_dir / "train.txt"
+    listing.write_text("\n".join(str(p) for p in list(new_images) + replayed) + "\n")
+    config = {'train': str(listing.resolve()), 'val': str(dirs['val'][0]),
+              'names': dict(enumerate(names))}
+    data_path = out_dir / "data.yaml"
+    with open(data_path, 'w') as f:
+        yaml.safe_dump(config, f, sort_keys=False)
+    print(f"📚 Fine-tuning set: {len(new_images)} new + {n_replay} replayed train images → {listing}")
+    return data_path
+
+
+def regressions(baseline, candidate, tolerance=0.0):
+    """{class: (baseline, candidate)} for classes whose mAP50-95 dropped by more than `tolerance`"""
+    worse = {}
+    for name, values in baseline['per_class'].items():
+        new = candidate['per_class'].get(name, {}).get('mAP50-95', 0.0)
+        if new < values['mAP50-95'] - tolerance:
+            worse[name] = (values['mAP50-95'], new)
+    return worse
+
+
+def promote(candidate, target=BEST_MODEL):
+    """Back up `target` next to itself and atomically replace it with `candidate`; returns the backup path"""
+    target = Path(target)
+    backup = target.with_name(f"{target.stem}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{target.suffix}")
+    shutil.copy2(target, backup)
+    tmp = target.with_name(f".{target.name}.tmp")
+    shutil.copy2(candidate, tmp)
+    os.replace(tmp, target)
+    return backup
+
+
+def incremental_finetune(new_dirs, base=BEST_MODEL, data="data.yaml", train_args=None, replay=2.0,
+                         tolerance=0.0, promote_model=True):
+    """
+    Fine-tune `base` on the labeled images in `new_dirs` plus replayed train
+    images and promote it over `base` if no class regresses on valid/.
+    Returns the report dict (also saved as finetune_report.json in the run dir).
+    """
+    from ultralytics import YOLO
+    from train import TRAIN_ARGS
+    from distill import evaluate
+
+    try:
+        new_images = labeled_images(new_dirs)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return None
+    if not new_images:
+        print("❌ No labeled images found in: " + ", ".join(map(str, new_dirs)))
+        return None
+
+    args = dict(TRAIN_ARGS, **FINETUNE_ARGS)
+    args.update(train_args or {})
+    args['data'] = str(build_dataset(new_images, data, replay, out_dir=args['project']))
+
+    print(f"\n🔧 Fine-tuning {base} for {args['epochs']} epochs (first {args['freeze']} layers frozen)")
+    model = YOLO(base)
+    model.train(**args)
+    candidate = Path(model.trainer.save_dir) / "weights" / "best.pt"
+
+    # Gate on the original data.yaml validation split, same settings for both models
+    print(f"\n📏 Evaluating current model: {base}")
+    baseline = evaluate(base, data, args['imgsz'])
+    print(f"📏 Evaluating fine-tuned model: {candidate}")
+    tuned = evaluate(candidate, data, args['imgsz'])
+    worse = regressions(baseline, tuned, tolerance)
+
+    print(f"\n{'='*60}\n🔁 Incremental Fine-tune Report\n{'='*60}")
+    print(f"{'class':<12} {'current mAP50-95':>17} {'fine-tuned':>12}")
+    for name, values in baseline['per_class'].items():
+        new = tuned['per_class'].get(name, {}).get('mAP50-95', 0.0)
+        print(f"{name:<12} {values['mAP50-95']:>17.3f} {new:>12.3f}{'  ✗' if name in worse else ''}")
+    print(f"{'all':<12} {baseline['mAP50-95']:>17.3f} {tuned['mAP50-95']:>12.3f}")
+
+    report = {'base': str(base), 'candidate': str(candidate), 'new_images': len(new_images),
+              'epochs': args['epochs'], 'freeze': args['freeze'], 'tolerance': tolerance,
+              'baseline': baseline, 'fine_tuned': tuned,
+              'regressions': {k: list(v) for k, v in worse.items()}, 'promoted': False}
+    if worse:
+        print(f"\n❌ Not promoted: {', '.join(worse)} regressed by more than {tolerance:.3f} mAP50-95")
+    elif promote_model:
+        backup = promote(candidate, base)
+        report['promoted'] = True
+        report['backup'] = str(backup)
+        print(f"\n✅ Promoted to {base} (previous model backed up as {backup.name})")
+    else:
+        print(f"\n✅ No class regressed; not promoted (--no-promote). Candidate: {candidate}")
+
+    with open(Path(model.trainer.save_dir) / "finetune_report.json", 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fine-tune best.pt on newly labeled captures')
+    parser.add_argument('new', nargs='+', help='Directories of labeled images (images/ + labels/)')
+    parser.add_argument('--base', default=BEST_MODEL, help='Model to fine-tune and replace')
+    parser.add_argument('--data', default='data.yaml', help='Original dataset (replay source and val split)')
+    parser.add_argument('--epochs', type=int, default=None, help=f"Epochs (default {FINETUNE_ARGS['epochs']})")
+    parser.add_argument('--freeze', type=int, default=None, help=f"Frozen layers (default {FINETUNE_ARGS['freeze']})")
+    parser.add_argument('--replay', type=float, default=2.0, help='Replayed train images per new image')
+    parser.add_argument('--tolerance', type=float, default=0.0,
+                        help='Allowed per-class mAP50-95 drop before promotion is refused')
+    parser.add_argument('--no-promote', action='store_true', help='Only report, keep the current best.pt')
+    args = parser.parse_args()
+
+    import torch
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    print(f"Using device: {device}")
+    overrides = {'device': device}
+    if args.epochs:
+        overrides['epochs'] = args.epochs
+    if args.freeze is not None:
+        overrides['freeze'] = args.freeze
+    report = incremental_finetune(args.new, args.base, args.data, overrides, args.replay,
+                                  args.tolerance, not args.no_promote)
+    return 0 if report else 1
+
+
+if __name__ == "__main__":
+    exit(main())
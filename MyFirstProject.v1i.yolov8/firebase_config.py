@@ -3,14 +3,13 @@ Firebase Configuration
 Stores Firebase database URL and credentials
 """
 import os
+import sys
 import json
 
-# Check if running on Streamlit Cloud
-try:
-    import streamlit as st
-    IS_STREAMLIT_CLOUD = hasattr(st, 'secrets')
-except:
-    IS_STREAMLIT_CLOUD = False
+# Check if running on Streamlit Cloud. Only look at an already imported
+# streamlit (app.py) - importing it here would slow down every CLI script.
+st = sys.modules.get('streamlit')
+IS_STREAMLIT_CLOUD = st is not None and hasattr(st, 'secrets')
 
 # Your Firebase Realtime Database URL
 if IS_STREAMLIT_CLOUD:
@@ -0,0 +1,163 @@
+"""
+Uncertainty-Driven Frame Selection
+Decides which captured frames are worth labeling instead of saving all of
+them: frames with low-margin detections, overlapping boxes of different
+classes, scenes that look unlike anything seen before (dHash distance to the
+training set and to frames already queued) and a small random sample of OK
+frames. Selected frames go to a labeling queue with pre-filled YOLO labels.
+
+    labeling_queue/images/<name>.jpg
+    labeling_queue/labels/<name>.txt    # class xc yc w h (normalized), model boxes
+    labeling_queue/selections.csv       # name, time, reasons, boxes, confidences
+"""
+
+import csv
+import time
+import random
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from dataset_index import INDEX_PATH, DatasetIndex, gray_hashes, hamming
+from eval_thresholds import box_iou
+from metrics import FRAMES_SELECTED
+
+PROJECT_DIR = Path(__file__).parent.absolute()
+
+SAVE_MODES = ('all', 'select', 'none')
+
+
+def frame_dhash(frame):
+    """dHash of a BGR frame, comparable with dataset_index hashes"""
+    import cv2
+    from PIL import Image
+
+    small = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (64, 64), interpolation=cv2.INTER_AREA)
+    return gray_hashes(Image.fromarray(small))[0]
+
+
+def yolo_label_lines(records, width, height):
+    """DETECTION_DTYPE records as YOLO 'cls xc yc w h' lines (normalized)"""
+    lines = []
+    for cls, xyxy in zip(records['cls'], records['xyxy']):
+        x1, y1, x2, y2 = np.clip(xyxy, 0, [width, height, width, height])
+        lines.append(f"{int(cls)} {(x1 + x2) / 2 / width:.6f} {(y1 + y2) / 2 / height:.6f} "
+                     f"{(x2 - x1) / width:.6f} {(y2 - y1) / height:.6f}")
+    return lines
+
+
+class FrameSelector:
+    """
+    Picks frames for labeling. `records` passed in should come from a
+    prediction at conf <= low_conf, otherwise low-margin boxes are never seen.
+    """
+
+    def __init__(self, queue_dir="labeling_queue", low_conf=0.25, high_conf=0.6, disagreement_iou=0.5,
+                 novelty_distance=10, memory=5000, ok_sample=0.02, image_quality=95,
+                 reference_index=INDEX_PATH, seed=None):
+        self.queue_dir = Path(queue_dir)
+        if not self.queue_dir.is_absolute():
+            self.queue_dir = PROJECT_DIR / self.queue_dir
+        self.low_conf = low_conf
+        self.high_conf = high_conf
+        self.disagreement_iou = disagreement_iou
+        self.novelty_distance = novelty_distance
+        self.ok_sample = ok_sample
+        self.image_quality = image_quality
+        self.rng = random.Random(seed)
+        self.counts = {}
+
+        # Hashes the next frame is compared with: training images plus queued frames
+        self._memory = np.zeros(memory, dtype=np.uint64)
+        self._memory_used = 0
+        self._memory_next = 0
+        self.reference = np.zeros(0, dtype=np.uint64)
+        if reference_index and Path(reference_index).exists():
+            try:
+                index = DatasetIndex.load(reference_index)
+                self.reference = index.dhash[index.split == 'train']
+            except (ValueError, KeyError, OSError) as e:
+                print(f"⚠ Dataset index not used for novelty: {e}")
+
+        (self.queue_dir / "images").mkdir(parents=True, exist_ok=True)
+        (self.queue_dir / "labels").mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config):
+        """Selector from the select_* keys of ip_camera_config.yaml"""
+        return cls(queue_dir=config.get('labeling_queue_dir', 'labeling_queue'),
+                   low_conf=config.get('select_low_conf', 0.25),
+                   high_conf=config.get('select_high_conf', 0.6),
+                   disagreement_iou=config.get('select_disagreement_iou', 0.5),
+                   novelty_distance=config.get('select_novelty_distance', 10),
+                   ok_sample=config.get('select_ok_sample', 0.02),
+                   image_quality=config.get('image_quality', 95))
+
+    def _remember(self, dhash):
+        self._memory[self._memory_next] = dhash
+        self._memory_next = (self._memory_next + 1) % len(self._memory)
+        self._memory_used = min(self._memory_used + 1, len(self._memory))
+
+    def novelty(self, dhash):
+        """Bit distance to the nearest training image or queued frame (64 if there are none)"""
+        seen = np.concatenate([self.reference, self._memory[:self._memory_used]])
+        if len(seen) == 0:
+            return 64
+        return int(hamming(np.array([dhash], dtype=np.uint64), seen).min())
+
+    def reasons(self, records, frame):
+        """Why `frame` should be labeled: a list of reason names, empty to skip it"""
+        found = []
+        conf = records['conf']
+        candidates = records[conf >= self.low_conf]
+        if np.any(candidates['conf'] < self.high_conf):
+            found.append('low_margin')
+
+        # Overlapping boxes the model gave different classes
+        if len(candidates) > 1:
+            iou = box_iou(candidates['xyxy'], candidates['xyxy'])
+            differ = candidates['cls'][:, None] != candidates['cls'][None, :]
+            if np.any(np.triu((iou >= self.disagreement_iou) & differ, 1)):
+                found.append('class_disagreement')
+
+        dhash = frame_dhash(frame)
+        if self.novelty(dhash) > self.novelty_distance:
+            found.append('novel')
+
+        if not found and len(candidates) == 0 and self.rng.random() < self.ok_sample:
+            found.append('ok_sample')
+
+        if found:
+            self._remember(dhash)
+        return found
+
+    def save(self, frame, records, reasons, prefix="capture"):
+        """Write the frame, its pre-filled label file and a selections.csv row; returns the image path"""
+        import cv2
+
+        candidates = records[records['conf'] >= self.low_conf]
+        name = f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]}"
+        image_path = self.queue_dir / "images" / f"{name}.jpg"
+        cv2.imwrite(str(image_path), frame, [cv2.IMWRITE_JPEG_QUALITY, self.image_quality])
+
+        height, width = frame.shape[:2]
+        lines = yolo_label_lines(candidates, width, height)
+        (self.queue_dir / "labels" / f"{name}.txt").write_text("\n".join(lines) + ("\n" if lines else ""))
+
+        log_path = self.queue_dir / "selections.csv"
+        new_log = not log_path.exists()
+        with open(log_path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if new_log:
+                writer.writerow(['image', 'unix_time', 'reasons', 'boxes', 'confidences'])
+            writer.writerow([image_path.name, round(time.time(), 3), '+'.join(reasons), len(candidates),
+                             ' '.join(f"{c:.2f}" for c in candidates['conf'])])
+
+        for reason in reasons:
+            self.counts[reason] = self.counts.get(reason, 0) + 1
+            FRAMES_SELECTED.inc(reason=reason)
+        return image_path
+
+    def summary(self):
+        return ', '.join(f"{k} {v}" for k, v in sorted(self.counts.items())) or 'none'
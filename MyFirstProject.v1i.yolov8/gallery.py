@@ -0,0 +1,284 @@
+"""
+Local Defect Gallery
+Incremental SQLite index of the annotated defect images test.py writes to
+detected_faults/, with small pre-generated thumbnails, so the dashboard can
+page through tens of thousands of images without listing the directory.
+
+Defect type and time come from the file name (detected_<type>_<YYYYmmdd_HHMMSS_fff>.jpg),
+confidence, camera and boxes from the optional <name>.json sidecar. A refresh
+only scans the directory when its mtime changed and only reads new or changed
+files; the index and thumbnails live in a hidden subdirectory (so writing
+them doesn't change the image directory's mtime):
+
+    detected_faults/.gallery/index.sqlite
+    detected_faults/.gallery/thumbs/<name>.jpg
+
+python gallery.py                     # refresh, print counts per defect type
+python gallery.py --list 20 --type crack --min-conf 0.7
+"""
+
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent.absolute()
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+THUMB_SIZE = 256
+THUMB_QUALITY = 80
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    name TEXT PRIMARY KEY,
+    mtime REAL,
+    size INTEGER,
+    sidecar_mtime REAL,
+    captured REAL,
+    defect_type TEXT,
+    confidence REAL,
+    camera TEXT,
+    boxes INTEGER,
+    thumb INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS images_captured ON images (captured DESC);
+CREATE INDEX IF NOT EXISTS images_type ON images (defect_type, captured DESC);
+CREATE INDEX IF NOT EXISTS images_pending ON images (captured DESC) WHERE thumb = 0;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+"""
+
+
+def faults_dir():
+    """Directory test.py saves defect images to: $RINGFAULT_FAULTS_DIR or <project>/detected_faults"""
+    return Path(os.environ.get('RINGFAULT_FAULTS_DIR') or PROJECT_DIR / "detected_faults")
+
+
+def parse_name(name):
+    """(defect_type, unix time) from detected_<type>_<YYYYmmdd_HHMMSS_fff>.jpg; (None, None) otherwise"""
+    stem = Path(name).stem
+    if not stem.startswith('detected_'):
+        return None, None
+    parts = stem[len('detected_'):].rsplit('_', 3)
+    if len(parts) != 4:
+        return None, None
+    defect, day, clock, millis = parts
+    try:
+        captured = datetime.strptime(f"{day}_{clock}", "%Y%m%d_%H%M%S").timestamp() + int(millis) / 1000
+    except ValueError:
+        return defect, None
+    return defect, captured
+
+
+def write_sidecar(image_path, **fields):
+    """Write <image>.json next to a saved defect image (confidence, camera, boxes, ...); False on failure"""
+    try:
+        with open(Path(image_path).with_suffix('.json'), 'w') as f:
+            json.dump(fields, f, default=float)
+        return True
+    except OSError as e:
+        print(f"   ⚠ Could not write {Path(image_path).with_suffix('.json').name}: {e}")
+        return False
+
+
+class Gallery:
+    """Index of one detected_faults directory; safe to share between threads (e.g. Streamlit reruns)"""
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory or faults_dir())
+        self.thumb_dir = self.directory / ".gallery" / "thumbs"
+        self.thumb_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(str(self.directory / ".gallery" / "index.sqlite"), check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def _meta(self, key, value=None):
+        if value is None:
+            row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    def refresh(self, max_thumbs=200, force=False):
+        """
+        Bring the index up to date; returns {'added', 'updated', 'removed', 'thumbs', 'pending'}.
+        At most `max_thumbs` thumbnails are made per call so a backlog can't
+        stall the dashboard; the rest follow on later calls.
+        """
+        stats = {'added': 0, 'updated': 0, 'removed': 0, 'thumbs': 0}
+        with self._lock:
+            dir_mtime = self.directory.stat().st_mtime_ns
+            if force or self._meta('dir_mtime') != dir_mtime:
+                self._scan(stats, full=force)
+                self._meta('dir_mtime', dir_mtime)
+            stats['thumbs'] = self._make_thumbs(max_thumbs)
+            stats['pending'] = self.db.execute("SELECT COUNT(*) FROM images WHERE thumb = 0").fetchone()[0]
+            self.db.commit()
+        return stats
+
+    def _scan(self, stats, full=False):
+        """
+        List the directory (no per-file stat) and index new images, images
+        whose sidecar appeared and removed ones. `full` also stats every known
+        file to catch in-place rewrites, which test.py never does.
+        """
+        images, sidecars = [], set()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') or not entry.is_file():
+                    continue
+                stem, suffix = os.path.splitext(entry.name)
+                suffix = suffix.lower()
+                if suffix in IMAGE_EXTENSIONS:
+                    images.append(entry.name)
+                elif suffix == '.json':
+                    sidecars.add(stem)
+
+        known = {row['name']: (row['mtime'], row['size'], row['sidecar_mtime'])
+                 for row in self.db.execute("SELECT name, mtime, size, sidecar_mtime FROM images")}
+        for name in images:
+            stem = os.path.splitext(name)[0]
+            old = known.get(name)
+            if old is not None and not full and (old[2] is not None or stem not in sidecars):
+                continue
+            try:
+                st = (self.directory / name).stat()
+                sidecar_mtime = (self.directory / f"{stem}.json").stat().st_mtime if stem in sidecars else None
+            except OSError:
+                continue  # deleted meanwhile
+            state = (st.st_mtime, st.st_size, sidecar_mtime)
+            if old == state:
+                continue
+            self._upsert(name, state, rethumb=old is None or old[:2] != state[:2])
+            stats['updated' if old is not None else 'added'] += 1
+
+        present = set(images)
+        gone = [name for name in known if name not in present]
+        for name in gone:
+            self.db.execute("DELETE FROM images WHERE name = ?", (name,))
+            self.thumb_path(name).unlink(missing_ok=True)
+        stats['removed'] = len(gone)
+
+    def _upsert(self, name, state, rethumb):
+        mtime, size, sidecar_mtime = state
+        defect, captured = parse_name(name)
+        fields = {}
+        if sidecar_mtime is not None:
+            try:
+                with open((self.directory / name).with_suffix('.json')) as f:
+                    fields = json.load(f)
+            except (OSError, ValueError):
+                fields = {}
+        self.db.execute(
+            "INSERT INTO images (name, mtime, size, sidecar_mtime, captured, defect_type, confidence, camera, boxes, thumb) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0) "
+            "ON CONFLICT (name) DO UPDATE SET mtime = excluded.mtime, size = excluded.size, "
+            "sidecar_mtime = excluded.sidecar_mtime, captured = excluded.captured, "
+            "defect_type = excluded.defect_type, confidence = excluded.confidence, camera = excluded.camera, "
+            "boxes = excluded.boxes" + (", thumb = 0" if rethumb else ""),
+            (name, mtime, size, sidecar_mtime, fields.get('unix_timestamp', captured if captured else mtime),
+             fields.get('defect_type', defect), fields.get('confidence'), fields.get('camera'),
+             len(fields['boxes']) if isinstance(fields.get('boxes'), list) else None))
+
+    def _make_thumbs(self, limit):
+        from PIL import Image
+
+        todo = [row[0] for row in self.db.execute(
+            "SELECT name FROM images WHERE thumb = 0 ORDER BY captured DESC LIMIT ?", (limit,))]
+        for name in todo:
+            try:
+                with Image.open(self.directory / name) as im:
+                    # JPEG: decode at reduced size straight away
+                    im.draft('RGB', (THUMB_SIZE, THUMB_SIZE))
+                    im = im.convert('RGB')
+                    im.thumbnail((THUMB_SIZE, THUMB_SIZE))
+                    im.save(self.thumb_path(name), quality=THUMB_QUALITY)
+                status = 1
+            except OSError:
+                status = -1  # unreadable (e.g. still being written); retried after its mtime changes
+            self.db.execute("UPDATE images SET thumb = ? WHERE name = ?", (status, name))
+        return len(todo)
+
+    def thumb_path(self, name):
+        return (self.thumb_dir / name).with_suffix('.jpg')
+
+    def _where(self, defect_type=None, min_conf=None, since=None):
+        clauses, params = [], []
+        if defect_type:
+            clauses.append("defect_type = ?")
+            params.append(defect_type)
+        if min_conf is not None:
+            clauses.append("confidence >= ?")
+            params.append(min_conf)
+        if since is not None:
+            clauses.append("captured >= ?")
+            params.append(since)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def page(self, page=0, per_page=24, defect_type=None, min_conf=None, since=None):
+        """(rows newest first, total matching) for one page; rows are dicts with image and thumb paths"""
+        total = self.count(defect_type, min_conf, since)
+        where, params = self._where(defect_type, min_conf, since)
+        with self._lock:
+            rows = self.db.execute(
+                f"SELECT * FROM images{where} ORDER BY captured DESC LIMIT ? OFFSET ?",
+                params + [per_page, page * per_page]).fetchall()
+        out = []
+        for row in rows:
+            item = dict(row)
+            item['path'] = str(self.directory / row['name'])
+            item['thumb_path'] = str(self.thumb_path(row['name'])) if row['thumb'] == 1 else item['path']
+            out.append(item)
+        return out, total
+
+    def count(self, defect_type=None, min_conf=None, since=None):
+        """Number of images matching the page() filters"""
+        where, params = self._where(defect_type, min_conf, since)
+        with self._lock:
+            return self.db.execute(f"SELECT COUNT(*) FROM images{where}", params).fetchone()[0]
+
+    def counts(self):
+        """{defect_type: images}"""
+        with self._lock:
+            return {row[0]: row[1] for row in self.db.execute(
+                "SELECT defect_type, COUNT(*) FROM images GROUP BY defect_type ORDER BY 2 DESC")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Index detected_faults/ and make thumbnails')
+    parser.add_argument('--dir', default=None, help='Defect image directory (default: detected_faults/)')
+    parser.add_argument('--rebuild', action='store_true', help='Rescan every file')
+    parser.add_argument('--max-thumbs', type=int, default=100000, help='Thumbnails to make in this run')
+    parser.add_argument('--list', type=int, default=0, metavar='N', help='Print the newest N matching images')
+    parser.add_argument('--page', type=int, default=0, help='Page of --list results')
+    parser.add_argument('--type', default=None, help='Only this defect type')
+    parser.add_argument('--min-conf', type=float, default=None, help='Only images at or above this confidence')
+    args = parser.parse_args()
+
+    gallery = Gallery(args.dir)
+    t0 = time.perf_counter()
+    stats = gallery.refresh(args.max_thumbs, force=args.rebuild)
+    print(f"🖼 {gallery.directory}: +{stats['added']} new, {stats['updated']} changed, "
+          f"{stats['removed']} removed, {stats['thumbs']} thumbnails "
+          f"({stats['pending']} pending) in {time.perf_counter() - t0:.2f}s")
+    counts = gallery.counts()
+    print(f"   {sum(counts.values())} images: " + (", ".join(f"{k} {v}" for k, v in counts.items()) or "none"))
+
+    if args.list:
+        rows, total = gallery.page(args.page, args.list, args.type, args.min_conf)
+        print(f"\nPage {args.page} ({len(rows)} of {total}):")
+        for row in rows:
+            conf = f"{row['confidence']:.0%}" if row['confidence'] is not None else "  ?"
+            when = datetime.fromtimestamp(row['captured']).strftime('%Y-%m-%d %H:%M:%S')
+            print(f"  {when}  {str(row['defect_type']):<10} {conf:>4}  {row['name']}")
+    gallery.close()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
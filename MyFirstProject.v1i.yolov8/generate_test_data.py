@@ -1,92 +1,60 @@
 """
 Test Data Generator for Dashboard Demo
 Generates sample detection data in Firebase for testing the dashboard
+(for larger volumes see load_generator.py)
 """
 
 import time
 import random
+import argparse
 from datetime import datetime, timedelta
 from cloud_client import CloudClient
 from firebase_config import FIREBASE_DATABASE_URL, SERVICE_ACCOUNT_KEY_PATH
+from load_generator import EventGenerator, write_batch
 
-def generate_test_data():
+def generate_test_data(count=50, sessions=5):
     """Generate sample detection data"""
     print("🔧 Generating test data for dashboard demo...")
-    
+
     # Initialize client
     client = CloudClient(SERVICE_ACCOUNT_KEY_PATH, FIREBASE_DATABASE_URL)
-    if not client.connect():
+    if not client.connected:
         print("❌ Failed to connect to Firebase")
         return
-    
-    # Generate detections from last 24 hours
-    defect_types = ['breakage', 'crack', 'scratch']
-    
-    print("\n📊 Generating 50 sample detections...")
-    
-    for i in range(50):
-        # Random timestamp in last 24 hours
-        hours_ago = random.randint(0, 24)
-        minutes_ago = random.randint(0, 59)
-        timestamp = datetime.now() - timedelta(hours=hours_ago, minutes=minutes_ago)
-        
-        # Random defect data
-        defect = random.choice(defect_types)
-        confidence = round(random.uniform(0.5, 0.99), 3)
-        
-        # Send detection
-        client.send_detection(
-            confidence=confidence,
-            ring_count=random.randint(1, 3),
-            defect_type=defect
-        )
-        
-        if (i + 1) % 10 == 0:
-            print(f"  ✓ Generated {i + 1} detections...")
-    
+
+    print(f"\n📊 Generating {count} sample detections...")
+
+    # Detections from the last 24 hours, written in one multi-path update
+    generator = EventGenerator(sessions=sessions)
+    events = generator.events(count, time.time() - 24 * 3600, time.time())
+
     print("\n📈 Generating session statistics...")
-    
-    # Generate stats for multiple sessions
-    for i in range(5):
+
+    # Stats for multiple sessions
+    stats = {}
+    for i, session_id in enumerate(generator.sessions):
         timestamp = datetime.now() - timedelta(hours=i*6)
-        stats = {
+        stats[session_id] = {
             'timestamp': timestamp.isoformat(),
             'total_captures': random.randint(100, 500),
-            'total_defects': random.randint(5, 50),
+            'total_defects': sum(1 for _, e in events if e['session_id'] == session_id),
             'clean_images': random.randint(50, 450),
         }
-        
-        # Write to database
-        import firebase_admin
-        from firebase_admin import db
-        
-        session_id = timestamp.strftime("%Y%m%d_%H%M%S")
-        ref = db.reference(f"statistics/{session_id}")
-        ref.set(stats)
-        
-        print(f"  ✓ Session {i+1}/5 created")
-    
+
+    if not write_batch(client.db, events, stats):
+        return
+    print(f"  ✓ {len(events)} detections and {len(stats)} sessions written")
+
     # Update system status
     client.update_system_status(is_active=True)
-    
-    # Update camera status
-    client.update_camera_status(
-        status="running",
-        capture_count=sum([stats.get('total_captures', 0) for stats in [
-            {
-                'timestamp': (datetime.now() - timedelta(hours=i*6)).isoformat(),
-                'total_captures': random.randint(100, 500),
-            }
-            for i in range(5)
-        ]]),
-        defects_found=50
-    )
-    
+
     print("\n✅ Test data generated successfully!")
     print("\nNow run the dashboard:")
     print("  streamlit run app.py")
-    
-    client.disconnect()
 
 if __name__ == "__main__":
-    generate_test_data()
+    parser = argparse.ArgumentParser(description='Write demo detections to Firebase')
+    parser.add_argument('--count', type=int, default=50, help='Number of detections')
+    parser.add_argument('--sessions', type=int, default=5, help='Number of sessions')
+    args = parser.parse_args()
+    generate_test_data(args.count, args.sessions)
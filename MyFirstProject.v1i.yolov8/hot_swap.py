@@ -0,0 +1,301 @@
+"""
+Model Hot-Swap
+Replaces the model of a running detector without restarting it. A background
+thread watches the weights file (mtime/size, e.g. after finetune.py promotes a
+new best.pt) or waits for SIGHUP, loads the new weights, and runs them in
+shadow on copies of live frames while the current model keeps serving. After
+the shadow window the new model is swapped in between frames if its latency
+and alert rate stay within bounds of the current model's, and it is rolled
+back if they leave those bounds during a probation period after the swap.
+Every step is appended to a JSON-lines log.
+
+    swapper = ModelSwapper.from_config(model_path, model, config, conf=0.5, thresholds=table)
+    swapper.start()
+    while True:
+        model = swapper.active()                 # applies a pending swap/rollback
+        ... predict, postprocess ...
+        swapper.observe(frame, records, latency_ms, defects_found)
+"""
+
+import json
+import time
+import queue
+import signal
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from model_registry import backend_name, load_model, register, report_model
+from postprocess import alert_mask, extract_detections
+from eval_thresholds import box_iou
+from metrics import MODEL_SWAPS
+
+
+def _file_state(path):
+    try:
+        st = Path(path).stat()
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+
+def compare_boxes(current, candidate, iou=0.5):
+    """(agree, class_changed, lost, new) box counts between two DETECTION_DTYPE arrays"""
+    if len(current) == 0 or len(candidate) == 0:
+        return 0, 0, len(current), len(candidate)
+    overlap = box_iou(current['xyxy'], candidate['xyxy'])
+    agree = changed = 0
+    used = np.zeros(len(candidate), dtype=bool)
+    # Greedy matching, most confident current boxes first
+    for i in np.argsort(-current['conf']):
+        row = np.where(used, 0, overlap[i])
+        j = int(row.argmax())
+        if row[j] < iou:
+            continue
+        used[j] = True
+        if current['cls'][i] == candidate['cls'][j]:
+            agree += 1
+        else:
+            changed += 1
+    matched = agree + changed
+    return agree, changed, len(current) - matched, len(candidate) - matched
+
+
+class ModelSwapper:
+    """
+    Watches `model_path` and manages shadow evaluation, swap and rollback of
+    the detector's model. Only `active()` and `observe()` are called from the
+    detection loop; loading and shadow inference run in a background thread.
+    """
+
+    def __init__(self, model_path, model, conf=0.5, thresholds=None, shadow_frames=30,
+                 max_latency_ratio=1.5, max_rate_change=0.2, probation_frames=100,
+                 poll_seconds=2.0, log_path=None):
+        self.model_path = str(model_path)
+        self.model = model
+        self.previous = None
+        self.conf = conf
+        self.thresholds = thresholds
+        self.shadow_frames = shadow_frames
+        self.max_latency_ratio = max_latency_ratio
+        self.max_rate_change = max_rate_change
+        self.probation_frames = probation_frames
+        self.poll_seconds = poll_seconds
+        self.log_path = Path(log_path) if log_path else None
+        self.state = 'serving'
+
+        self._seen = _file_state(model_path)
+        self._reload = threading.Event()
+        self._stop = threading.Event()
+        self._frames = queue.Queue(maxsize=2)
+        self._pending = None          # (model, result) installed by active()
+        self._lock = threading.Lock()
+        self._baseline = None         # current model's latency/alert rate from the shadow window
+        self._probation = None
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, model_path, model, config, conf=0.5, thresholds=None, log_path=None):
+        """Swapper from the hot_swap_* keys of ip_camera_config.yaml"""
+        return cls(model_path, model, conf, thresholds,
+                   shadow_frames=config.get('hot_swap_shadow_frames', 30),
+                   max_latency_ratio=config.get('hot_swap_max_latency_ratio', 1.5),
+                   max_rate_change=config.get('hot_swap_max_rate_change', 0.2),
+                   probation_frames=config.get('hot_swap_probation_frames', 100),
+                   poll_seconds=config.get('hot_swap_poll_seconds', 2.0),
+                   log_path=log_path)
+
+    # --- control ---
+    def start(self):
+        """Start the watcher thread; also reload on SIGHUP where the platform has it"""
+        if backend_name(self.model_path) == 'remote':
+            print("⚠ Hot-swap disabled: the model lives in the inference server")
+            return False
+        if hasattr(signal, 'SIGHUP') and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGHUP, lambda *_: self.request_reload())
+        self._thread = threading.Thread(target=self._run, name='model-hot-swap', daemon=True)
+        self._thread.start()
+        print(f"♻️ Hot-swap: watching {self.model_path} (or send SIGHUP), "
+              f"{self.shadow_frames}-frame shadow window")
+        return True
+
+    def request_reload(self):
+        self._reload.set()
+
+    def stop(self):
+        self._stop.set()
+        self._reload.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _log(self, event, **fields):
+        record = {'time': round(time.time(), 3), 'event': event, 'model_path': self.model_path, **fields}
+        if self.log_path:
+            try:
+                self.log_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.log_path, 'a') as f:
+                    f.write(json.dumps(record) + "\n")
+            except OSError as e:
+                print(f"⚠ Could not write {self.log_path}: {e}")
+        return record
+
+    # --- detection loop side ---
+    def active(self):
+        """The model to use for the next frame, applying a pending swap or rollback between frames"""
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is not None:
+            model, result = pending
+            self.previous, self.model = self.model, model
+            register(self.model_path, model)
+            report_model(self.model_path)
+            MODEL_SWAPS.inc(result=result)
+            if result == 'swapped':
+                self._probation = {'latency': [], 'alerts': []}
+                self.state = 'probation'
+                print(f"♻️ Swapped to the new model ({self.probation_frames}-frame probation)")
+            else:
+                self.previous = None
+                self._probation = None
+                self.state = 'serving'
+                print("↩️ Rolled back to the previous model")
+        return self.model
+
+    def observe(self, frame, records, latency_ms, defects_found):
+        """Feed one served frame: shadow input while evaluating, live stats during probation"""
+        if self.state == 'shadow':
+            try:
+                # Copy: camera/ring frames are reused after this call; drop frames if shadow lags
+                self._frames.put_nowait((frame.copy(), records, latency_ms, defects_found > 0))
+            except queue.Full:
+                pass
+        elif self.state == 'probation':
+            self._probation['latency'].append(latency_ms)
+            self._probation['alerts'].append(defects_found > 0)
+            if len(self._probation['latency']) >= self.probation_frames:
+                self._end_probation()
+
+    def _out_of_bounds(self, latency_ms, alert_rate):
+        """Reasons the measured stats are outside the bounds set by the baseline (empty if fine)"""
+        base = self._baseline
+        reasons = []
+        if latency_ms > base['latency_ms'] * self.max_latency_ratio:
+            reasons.append(f"latency {latency_ms:.0f} ms > {self.max_latency_ratio:g}x {base['latency_ms']:.0f} ms")
+        if abs(alert_rate - base['alert_rate']) > self.max_rate_change:
+            reasons.append(f"alert rate {alert_rate:.0%} vs {base['alert_rate']:.0%}")
+        return reasons
+
+    def _end_probation(self):
+        stats = self._probation
+        latency = float(np.median(stats['latency']))
+        rate = float(np.mean(stats['alerts']))
+        reasons = self._out_of_bounds(latency, rate)
+        self._log('probation', latency_ms=round(latency, 1), alert_rate=round(rate, 3),
+                  frames=len(stats['latency']), rolled_back=bool(reasons), reasons=reasons)
+        if reasons:
+            print(f"⚠ New model out of bounds after swap ({'; '.join(reasons)})")
+            with self._lock:
+                self._pending = (self.previous, 'rolled_back')
+        else:
+            print(f"✅ New model kept (p50 {latency:.0f} ms, alert rate {rate:.0%})")
+            self.previous = None
+            self._probation = None
+            self.state = 'serving'
+
+    # --- background side ---
+    def _run(self):
+        deferred = False
+        while not self._stop.is_set():
+            # Cleared at once: a set event would make wait() return immediately (busy loop)
+            if self._reload.wait(self.poll_seconds):
+                self._reload.clear()
+                deferred = True
+            if self._stop.is_set():
+                break
+            if self.state != 'serving':
+                # SIGHUP during loading/shadow/probation is handled once serving again
+                continue
+            triggered, deferred = deferred, False
+            state = _file_state(self.model_path)
+            changed = state is not None and state != self._seen
+            if not (triggered or changed):
+                continue
+            if changed:
+                # Wait for the writer to finish (finetune.py replaces atomically; a plain copy may not)
+                time.sleep(self.poll_seconds)
+                if _file_state(self.model_path) != state:
+                    deferred = triggered
+                    continue
+            self._seen = state
+            self._evaluate_candidate('sighup' if triggered and not changed else 'file_changed')
+
+    def _evaluate_candidate(self, trigger):
+        self.state = 'loading'
+        print(f"♻️ Loading new model in the background ({trigger}): {self.model_path}")
+        try:
+            candidate = load_model(self.model_path)
+        except Exception as e:
+            print(f"⚠ Could not load the new model, keeping the current one: {e}")
+            self._log('load_failed', trigger=trigger, error=str(e))
+            MODEL_SWAPS.inc(result='load_failed')
+            self.state = 'serving'
+            return
+        if dict(candidate.names) != dict(self.model.names):
+            print("⚠ New model has different classes, not swapping")
+            self._log('rejected', trigger=trigger, reasons=['class names differ'])
+            MODEL_SWAPS.inc(result='rejected')
+            self.state = 'serving'
+            return
+
+        self._drain()
+        self.state = 'shadow'
+        current_ms, shadow_ms, current_alerts, shadow_alerts, boxes = [], [], [], [], np.zeros(4, dtype=int)
+        while len(shadow_ms) < self.shadow_frames and not self._stop.is_set():
+            try:
+                frame, records, latency_ms, alerted = self._frames.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            t0 = time.perf_counter()
+            results = candidate.predict(source=frame, conf=self.conf, save=False, verbose=False)
+            shadow_ms.append((time.perf_counter() - t0) * 1000)
+            shadow = extract_detections(results[0]) if results else records[:0]
+            current = records[records['conf'] >= self.conf]
+            boxes += compare_boxes(current, shadow)
+            current_ms.append(latency_ms)
+            current_alerts.append(alerted)
+            shadow_alerts.append(bool(self.thresholds is not None and alert_mask(shadow, self.thresholds).any()))
+        if self._stop.is_set():
+            return
+        self._drain()
+
+        self._baseline = {'latency_ms': float(np.median(current_ms)), 'alert_rate': float(np.mean(current_alerts))}
+        latency, rate = float(np.median(shadow_ms)), float(np.mean(shadow_alerts))
+        frame_agreement = float(np.mean(np.equal(current_alerts, shadow_alerts)))
+        reasons = self._out_of_bounds(latency, rate)
+        record = self._log('shadow', trigger=trigger, frames=len(shadow_ms),
+                           current_latency_ms=round(self._baseline['latency_ms'], 1),
+                           shadow_latency_ms=round(latency, 1),
+                           current_alert_rate=round(self._baseline['alert_rate'], 3),
+                           shadow_alert_rate=round(rate, 3), alert_agreement=round(frame_agreement, 3),
+                           boxes_agree=int(boxes[0]), boxes_class_changed=int(boxes[1]),
+                           boxes_lost=int(boxes[2]), boxes_new=int(boxes[3]),
+                           swapped=not reasons, reasons=reasons)
+        print(f"🔍 Shadow ({record['frames']} frames): alerts agree on {frame_agreement:.0%}, "
+              f"boxes agree {boxes[0]} / class changed {boxes[1]} / lost {boxes[2]} / new {boxes[3]}, "
+              f"p50 {latency:.0f} ms vs {self._baseline['latency_ms']:.0f} ms")
+        if reasons:
+            print(f"⚠ New model not swapped in ({'; '.join(reasons)})")
+            MODEL_SWAPS.inc(result='rejected')
+            self.state = 'serving'
+            return
+        self.state = 'swapping'
+        with self._lock:
+            self._pending = (candidate, 'swapped')
+
+    def _drain(self):
+        while True:
+            try:
+                self._frames.get_nowait()
+            except queue.Empty:
+                return
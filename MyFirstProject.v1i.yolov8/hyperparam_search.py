@@ -0,0 +1,227 @@
+"""
+Parallel Hyperparameter Search
+Runs short training trials in worker processes across the CPU cores, prunes
+losing trials early from their results.csv and writes the best config as a
+YAML that train.py can consume (python train.py --hyp best_hyperparameters.yaml).
+"""
+
+import os
+import csv
+import math
+import time
+import random
+import argparse
+import multiprocessing as mp
+from pathlib import Path
+
+import yaml
+
+from train import TRAIN_ARGS
+from train_profile import CPU_WORKERS
+
+# name: (distribution, low, high) - ranges around the hand-tuned values in train.py
+SEARCH_SPACE = {
+    'lr0': ('log', 2e-4, 5e-3),
+    'lrf': ('uniform', 0.005, 0.1),
+    'weight_decay': ('log', 1e-5, 1e-3),
+    'mosaic': ('uniform', 0.5, 1.0),
+    'mixup': ('uniform', 0.0, 0.3),
+    'copy_paste': ('uniform', 0.0, 0.3),
+    'degrees': ('uniform', 0.0, 30.0),
+    'translate': ('uniform', 0.05, 0.25),
+    'scale': ('uniform', 0.3, 0.8),
+    'hsv_h': ('uniform', 0.0, 0.04),
+    'hsv_s': ('uniform', 0.3, 0.9),
+    'hsv_v': ('uniform', 0.2, 0.6),
+    'box': ('uniform', 5.0, 10.0),
+    'cls': ('uniform', 0.3, 1.0),
+}
+
+METRIC = 'metrics/mAP50-95(B)'
+
+
+def sample_params(rng):
+    """Draw one configuration from SEARCH_SPACE"""
+    params = {}
+    for name, (dist, low, high) in SEARCH_SPACE.items():
+        if dist == 'log':
+            value = math.exp(rng.uniform(math.log(low), math.log(high)))
+        else:
+            value = rng.uniform(low, high)
+        params[name] = float(f"{value:.4g}")
+    return params
+
+
+def read_metric(results_csv, column=METRIC):
+    """Per-epoch values of `column` from a (possibly still growing) results.csv"""
+    try:
+        with open(results_csv, newline='') as f:
+            rows = list(csv.DictReader(f))
+    except FileNotFoundError:
+        return []
+
+    values = []
+    for row in rows:
+        row = {k.strip(): v for k, v in row.items() if k}
+        try:
+            values.append(float(row[column]))
+        except (KeyError, TypeError, ValueError):
+            break  # partially written last line
+    return values
+
+
+def should_prune(curve, others, milestones, min_peers=3, quantile=0.5):
+    """
+    Median-style pruning: at every milestone epoch the trial has reached, its
+    best metric so far must not fall below `quantile` of the best-so-far values
+    other trials had at the same epoch.
+    """
+    for m in milestones:
+        if len(curve) < m:
+            break
+        peers = sorted(max(c[:m]) for c in others if len(c) >= m)
+        if len(peers) < min_peers:
+            continue
+        cutoff = peers[min(len(peers) - 1, int(quantile * len(peers)))]
+        if max(curve[:m]) < cutoff:
+            return True
+    return False
+
+
+def run_trial(model_path, train_args, project, name, threads):
+    """Worker process entry point: train one configuration"""
+    import torch
+    from ultralytics import YOLO
+
+    torch.set_num_threads(threads)
+    YOLO(model_path).train(**train_args, project=str(project), name=name, exist_ok=True,
+                           plots=False, verbose=False)
+
+
+def search(model_path, n_trials, epochs, parallel, threads, budget_hours, project,
+           milestones, seed=0):
+    """Run the search and return a list of trial records"""
+    rng = random.Random(seed)
+    ctx = mp.get_context('spawn')
+    project = Path(project).absolute()
+
+    # Trial 0 is the current hand-tuned configuration for reference
+    base = {k: TRAIN_ARGS[k] for k in SEARCH_SPACE}
+    configs = [base] + [sample_params(rng) for _ in range(n_trials - 1)]
+    trials = [{'trial': i, 'params': p, 'status': 'pending', 'curve': []}
+              for i, p in enumerate(configs)]
+
+    deadline = time.time() + budget_hours * 3600 if budget_hours else None
+    running = {}
+    pending = list(trials)
+
+    while pending or running:
+        out_of_time = deadline and time.time() >= deadline
+
+        # Launch new trials while there are free slots and budget left
+        while pending and len(running) < parallel and not out_of_time:
+            trial = pending.pop(0)
+            name = f"trial_{trial['trial']:03d}"
+            train_args = dict(TRAIN_ARGS, **trial['params'], epochs=epochs, device='cpu',
+                              patience=epochs, save_period=-1, seed=seed,
+                              workers=CPU_WORKERS)
+            proc = ctx.Process(target=run_trial,
+                               args=(model_path, train_args, project, name, threads))
+            proc.start()
+            trial.update(status='running', dir=str(project / name), started=time.time())
+            running[trial['trial']] = (trial, proc)
+            print(f"🚀 Trial {trial['trial']} started: {trial['params']}")
+
+        if out_of_time and pending:
+            for trial in pending:
+                trial['status'] = 'skipped'
+            pending = []
+
+        time.sleep(5)
+
+        for tid, (trial, proc) in list(running.items()):
+            trial['curve'] = read_metric(Path(trial['dir']) / 'results.csv')
+            others = [t['curve'] for t in trials if t is not trial and t['curve']]
+
+            if not proc.is_alive():
+                trial['status'] = 'complete' if proc.exitcode == 0 else 'failed'
+            elif should_prune(trial['curve'], others, milestones):
+                proc.terminate()
+                trial['status'] = 'pruned'
+            elif out_of_time:
+                proc.terminate()
+                trial['status'] = 'stopped'
+            else:
+                continue
+
+            proc.join()
+            trial['elapsed'] = time.time() - trial['started']
+            best = max(trial['curve']) if trial['curve'] else 0.0
+            print(f"{'✅' if trial['status'] == 'complete' else '✂️'} Trial {tid} {trial['status']} "
+                  f"after {len(trial['curve'])} epochs (best mAP50-95 {best:.4f})")
+            del running[tid]
+
+    return trials
+
+
+def write_report(trials, project, best_yaml):
+    """Print the ranked table, save it as CSV and write the best config"""
+    ranked = sorted(trials, key=lambda t: max(t['curve']) if t['curve'] else -1, reverse=True)
+    keys = list(SEARCH_SPACE)
+
+    print(f"\n{'='*60}\n🏆 Hyperparameter search results\n{'='*60}")
+    print(f"{'rank':>4} {'trial':>5} {'status':>9} {'epochs':>6} {'mAP50-95':>9}")
+    for rank, t in enumerate(ranked, 1):
+        best = max(t['curve']) if t['curve'] else float('nan')
+        print(f"{rank:>4} {t['trial']:>5} {t['status']:>9} {len(t['curve']):>6} {best:>9.4f}")
+
+    table = Path(project) / 'search_results.csv'
+    table.parent.mkdir(parents=True, exist_ok=True)
+    with open(table, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['rank', 'trial', 'status', 'epochs', 'best_map50_95'] + keys)
+        for rank, t in enumerate(ranked, 1):
+            best = max(t['curve']) if t['curve'] else ''
+            writer.writerow([rank, t['trial'], t['status'], len(t['curve']), best]
+                            + [t['params'][k] for k in keys])
+    print(f"\n📄 Table saved to: {table}")
+
+    if ranked and ranked[0]['curve']:
+        with open(best_yaml, 'w') as f:
+            f.write(f"# Best of {len(trials)} trials, mAP50-95 {max(ranked[0]['curve']):.4f} "
+                    f"(trial {ranked[0]['trial']})\n")
+            yaml.safe_dump(ranked[0]['params'], f, sort_keys=False)
+        print(f"🎯 Best config written to: {best_yaml}")
+        print(f"   Train with: python train.py --hyp {best_yaml}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel hyperparameter search with early pruning')
+    parser.add_argument('--model', default='yolov8s.pt', help='Starting weights for every trial')
+    parser.add_argument('--trials', type=int, default=16, help='Number of configurations to try')
+    parser.add_argument('--epochs', type=int, default=30, help='Epochs per trial')
+    parser.add_argument('--threads', type=int, default=2, help='Torch threads per trial')
+    parser.add_argument('--parallel', type=int, default=None,
+                        help='Concurrent trials (default: cores // threads)')
+    parser.add_argument('--budget-hours', type=float, default=None, help='Total wall-clock budget')
+    parser.add_argument('--milestones', type=int, nargs='+', default=None,
+                        help='Epochs at which to prune (default: 1/4 and 1/2 of --epochs)')
+    parser.add_argument('--project', default='runs/hyp_search', help='Output directory for trials')
+    parser.add_argument('--output', default='best_hyperparameters.yaml', help='Best config YAML')
+    parser.add_argument('--seed', type=int, default=0, help='Sampling and training seed')
+    args = parser.parse_args()
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    parallel = args.parallel or max(1, cores // args.threads)
+    milestones = args.milestones or sorted({max(1, args.epochs // 4), max(1, args.epochs // 2)})
+
+    print(f"🔍 {args.trials} trials x {args.epochs} epochs, {parallel} in parallel "
+          f"({args.threads} threads each), pruning at epochs {milestones}")
+
+    trials = search(args.model, args.trials, args.epochs, parallel, args.threads,
+                    args.budget_hours, args.project, milestones, args.seed)
+    write_report(trials, args.project, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+"""
+Local Inference Server
+Holds one warm model and serves it over localhost HTTP. Concurrent requests
+from capture processes are collected into dynamic batches (up to --max-batch
+frames or --max-wait-ms, whichever comes first). RemoteModel is the client:
+it mimics YOLO.predict() closely enough for test.py and IPCameraCapture, so
+either can use a server by setting the model to its URL.
+
+Start:   python inference_server.py serve --model runs/detect/train/weights/best.pt
+Use:     python test.py --model http://127.0.0.1:8765 --source ip_camera
+Measure: python inference_server.py bench --url http://127.0.0.1:8765 --clients 4
+Check:   python inference_server.py check --url http://127.0.0.1:8765   # IPCameraCapture loop via the server
+"""
+
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import http.client
+from collections import deque
+from urllib.parse import urlparse, parse_qs, urlencode
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from metrics import STAGE_SECONDS, QUEUE_DEPTH, INFERENCE_BATCH_SIZE, start_http_server
+
+DEFAULT_URL = "http://127.0.0.1:8765"
+
+
+class _Request:
+    __slots__ = ('frame', 'conf', 'imgsz', 'done', 'boxes', 'speed', 'error')
+
+    def __init__(self, frame, conf, imgsz):
+        self.frame = frame
+        self.conf = conf
+        self.imgsz = imgsz
+        self.done = threading.Event()
+        self.boxes = None
+        self.speed = None
+        self.error = None
+
+
+class DynamicBatcher:
+    """
+    Single inference thread fed by a request queue. The first waiting request
+    opens a batch; requests with the same image size join it until the batch
+    is full or `max_wait_ms` has passed since it was opened.
+    """
+
+    def __init__(self, model, max_batch=8, max_wait_ms=10.0):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self.batches = 0
+        self.frames = 0
+        self._thread = threading.Thread(target=self._run, name='batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, frame, conf=0.25, imgsz=640, timeout=30.0):
+        """Blocking: (boxes [n, 6] float32 as xyxy, conf, cls; ultralytics speed dict)"""
+        request = _Request(frame, conf, imgsz)
+        with self._cond:
+            self._queue.append(request)
+            QUEUE_DEPTH.set(len(self._queue), queue='inference_requests')
+            self._cond.notify()
+        if not request.done.wait(timeout):
+            raise TimeoutError("inference request timed out")
+        if request.error is not None:
+            raise request.error
+        return request.boxes, request.speed
+
+    def _take_batch(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._queue)
+            first = self._queue.popleft()
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                # Pull queued requests that can share this batch
+                for r in [r for r in self._queue if r.imgsz == first.imgsz][:self.max_batch - len(batch)]:
+                    self._queue.remove(r)
+                    batch.append(r)
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.max_batch or remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            QUEUE_DEPTH.set(len(self._queue), queue='inference_requests')
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            try:
+                # One pass at the lowest requested confidence; each request is filtered below
+                with STAGE_SECONDS.time(stage='batch_inference'):
+                    results = self.model.predict(source=[r.frame for r in batch], imgsz=batch[0].imgsz,
+                                                 conf=min(r.conf for r in batch), save=False, verbose=False)
+                for r, result in zip(batch, results):
+                    data = result.boxes.data.cpu().numpy().astype(np.float32)
+                    r.boxes = np.ascontiguousarray(data[data[:, -2] >= r.conf][:, [0, 1, 2, 3, -2, -1]])
+                    r.speed = dict(result.speed)
+            except Exception as e:
+                for r in batch:
+                    r.error = e
+            self.batches += 1
+            self.frames += len(batch)
+            INFERENCE_BATCH_SIZE.observe(len(batch))
+            for r in batch:
+                r.done.set()
+
+
+def _decode(body, headers):
+    """Frame from a request body: raw BGR bytes (X-Shape: h,w,c) or an encoded image"""
+    shape = headers.get('X-Shape')
+    if shape:
+        return np.frombuffer(body, dtype=np.uint8).reshape([int(v) for v in shape.split(',')])
+    import cv2
+    frame = cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError("could not decode image")
+    return frame
+
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; don't let Nagle hold the body back
+    disable_nagle_algorithm = True
+    batcher = None
+    info = {}
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/health':
+            self._send_json(404, {'error': 'not found'})
+            return
+        stats = {'batches': self.batcher.batches, 'frames': self.batcher.frames,
+                 'mean_batch': round(self.batcher.frames / max(self.batcher.batches, 1), 2)}
+        self._send_json(200, dict(self.info, **stats))
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/predict':
+            self._send_json(404, {'error': 'not found'})
+            return
+        query = parse_qs(url.query)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            frame = _decode(body, self.headers)
+            boxes, speed = self.batcher.submit(frame, conf=float(query.get('conf', [0.25])[0]),
+                                               imgsz=int(query.get('imgsz', [self.info['imgsz']])[0]))
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+        self._send_json(200, {'boxes': boxes.tolist(), 'speed': speed, 'shape': list(frame.shape)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(model_path, host='127.0.0.1', port=8765, max_batch=8, max_wait_ms=10.0, imgsz=640,
+          device=None):
+    """Load the model once and serve /predict and /health until interrupted"""
+    from model_registry import get_model, backend_name
+
+    model = get_model(model_path, device=device, imgsz=imgsz)
+    batcher = DynamicBatcher(model, max_batch, max_wait_ms)
+    info = {'model': str(model_path), 'backend': backend_name(model_path), 'imgsz': imgsz,
+            'names': {int(k): v for k, v in model.names.items()},
+            'max_batch': max_batch, 'max_wait_ms': max_wait_ms}
+    handler = type('Handler', (InferenceHandler,), {'batcher': batcher, 'info': info})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    print(f"🚀 Inference server on http://{host}:{port} "
+          f"(max batch {max_batch}, max wait {max_wait_ms} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Stopping inference server...")
+    finally:
+        server.server_close()
+
+
+# --- Client ---
+class RemoteBoxes:
+    """Boxes of one remote result; same field names as ultralytics Boxes (NumPy arrays)"""
+
+    def __init__(self, data):
+        self.data = data
+
+    @property
+    def xyxy(self):
+        return self.data[:, :4]
+
+    @property
+    def conf(self):
+        return self.data[:, 4]
+
+    @property
+    def cls(self):
+        return self.data[:, 5]
+
+    def __len__(self):
+        return len(self.data)
+
+
+class RemoteResult:
+    """Stand-in for ultralytics Results with the attributes this project uses"""
+
+    def __init__(self, orig_img, boxes, names, speed):
+        self.orig_img = orig_img
+        self.boxes = RemoteBoxes(boxes)
+        self.names = names
+        self.speed = speed
+
+    def __getitem__(self, index):
+        """Result with a subset of the boxes, like ultralytics Results[mask]"""
+        return RemoteResult(self.orig_img, self.boxes.data[index], self.names, self.speed)
+
+    def plot(self):
+        """Annotated copy of the frame (boxes and 'class conf' labels)"""
+        import cv2
+        img = self.orig_img.copy()
+        for x1, y1, x2, y2, conf, cls in self.boxes.data:
+            p1, p2 = (int(x1), int(y1)), (int(x2), int(y2))
+            cv2.rectangle(img, p1, p2, (0, 0, 255), 2)
+            cv2.putText(img, f"{self.names[int(cls)]} {conf:.2f}", (p1[0], max(p1[1] - 5, 12)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+        return img
+
+
+class RemoteModel:
+    """Client for inference_server.py with a YOLO-like predict() / __call__ interface"""
+
+    def __init__(self, url=DEFAULT_URL, timeout=30.0):
+        parsed = urlparse(url)
+        self.url = url
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+        self.info = self._request('GET', '/health')
+        self.names = {int(k): v for k, v in self.info['names'].items()}
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            conn.connect()
+            conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn
+
+    def _request(self, method, path, body=None, headers=None):
+        # One persistent connection per thread; retry once if the server closed it
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                payload = json.loads(response.read())
+                if response.status != 200:
+                    raise RuntimeError(f"inference server: {payload.get('error', response.status)}")
+                return payload
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+
+    def predict(self, source, conf=0.25, imgsz=None, **kwargs):
+        """List of RemoteResult for a frame, a path, or a list of either"""
+        sources = source if isinstance(source, (list, tuple)) else [source]
+        results = []
+        for src in sources:
+            if not isinstance(src, np.ndarray):
+                import cv2
+                src = cv2.imread(str(src))
+            frame = np.ascontiguousarray(src)
+            query = {'conf': conf}
+            if imgsz:
+                query['imgsz'] = imgsz
+            payload = self._request('POST', f"/predict?{urlencode(query)}", body=frame.tobytes(),
+                                    headers={'Content-Type': 'application/octet-stream',
+                                             'X-Shape': ','.join(map(str, frame.shape))})
+            boxes = np.asarray(payload['boxes'], dtype=np.float32).reshape(-1, 6)
+            results.append(RemoteResult(src, boxes, self.names, payload['speed']))
+        return results
+
+    __call__ = predict
+
+
+def bench(url, image_dir, clients=4, requests=50, conf=0.25):
+    """Throughput with `clients` concurrent senders (each its own connection)"""
+    from pathlib import Path
+    import cv2
+
+    frames = [cv2.imread(str(p)) for p in sorted(Path(image_dir).glob('*.jpg'))[:20]]
+    if not frames:
+        print(f"❌ No .jpg images in {image_dir}")
+        return 1
+    model = RemoteModel(url)
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(k):
+        for i in range(requests):
+            t0 = time.perf_counter()
+            model.predict(frames[(k + i) % len(frames)], conf=conf)
+            with lock:
+                latencies.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    health = model._request('GET', '/health')
+    print(f"📊 {clients} clients x {requests} requests: {len(latencies) / elapsed:.1f} frames/s, "
+          f"p50 {np.percentile(latencies, 50):.1f} ms, p95 {np.percentile(latencies, 95):.1f} ms, "
+          f"mean batch {health['mean_batch']}")
+    return 0
+
+
+def check(url, source=None, captures=3, timeout=60.0, camera_port=8091, base_config="ip_camera_config.yaml"):
+    """
+    Run IPCameraCapture.capture_loop with `inference_server: url` against
+    `source` (default: a fake camera replaying valid/images) and check that
+    every capture got a detection saved. Returns 0 on success.
+    """
+    import tempfile
+    from pathlib import Path
+    import yaml
+    from ip_camera_capture import IPCameraCapture, PROJECT_DIR
+
+    with tempfile.TemporaryDirectory(prefix='server_check_') as tmp:
+        tmp = Path(tmp)
+        cameras = []
+        if source is None:
+            from fake_camera import Recording, record, start_cameras
+            record(PROJECT_DIR / "valid" / "images", tmp / "recording", max_frames=20)
+            cameras = start_cameras([Recording(tmp / "recording")], 1, camera_port, speed=5.0)
+            source = cameras[0][0]
+        try:
+            with open(PROJECT_DIR / base_config) as f:
+                config = yaml.safe_load(f) or {}
+            config.update(inference_server=url, enable_detection=True, save_detections=True,
+                          ip_camera_url=source, capture_interval_seconds=0, save_mode='none',
+                          capture_process=False, cascade=False,
+                          output_directory=str(tmp / "captured"), detection_output_dir=str(tmp / "detections"))
+            config_path = tmp / "ip_camera_config.yaml"
+            with open(config_path, 'w') as f:
+                yaml.safe_dump(config, f)
+
+            capture = IPCameraCapture(str(config_path))
+            # Count the detection passes that reached save_detection (file names only have 1 s resolution)
+            detected = []
+            save_detection = capture.save_detection
+            capture.save_detection = lambda frame, results, filename=None: (
+                detected.append(len(results[0].boxes)), save_detection(frame, results, filename))
+            capture.connect_camera()
+            # The loop retries failed captures forever; the duration limit ends it
+            capture.capture_loop(duration_minutes=timeout / 60, max_captures=captures)
+        finally:
+            from fake_camera import stop_cameras
+            stop_cameras(cameras)
+        saved = len(detected)
+
+    if saved < captures:
+        print(f"❌ Inference server check: {saved}/{captures} captures got a detection pass via {url}")
+        return 1
+    print(f"✅ Inference server check: {saved}/{captures} captures detected via {url}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Shared inference server with dynamic batching')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('serve', help='Run the server')
+    p.add_argument('--model', default='runs/detect/train/weights/best.pt', help='Model weights')
+    p.add_argument('--host', default='127.0.0.1', help='Bind address (keep it local)')
+    p.add_argument('--port', type=int, default=8765, help='Port')
+    p.add_argument('--max-batch', type=int, default=8, help='Largest batch per forward pass')
+    p.add_argument('--max-wait-ms', type=float, default=10.0, help='How long a batch waits to fill up')
+    p.add_argument('--imgsz', type=int, default=640, help='Default inference size')
+    p.add_argument('--device', default=None, help='Device (e.g. cpu, 0)')
+    p.add_argument('--metrics-port', type=int, default=None, help='Serve Prometheus metrics on this port')
+    p.add_argument('--metrics-addr', default='127.0.0.1', help='Metrics bind address (0.0.0.0 to expose it)')
+
+    b = sub.add_parser('bench', help='Measure throughput against a running server')
+    b.add_argument('--url', default=DEFAULT_URL, help='Server URL')
+    b.add_argument('--images', default='valid/images', help='Directory of .jpg frames to send')
+    b.add_argument('--clients', type=int, default=4, help='Concurrent clients')
+    b.add_argument('--requests', type=int, default=50, help='Requests per client')
+
+    c = sub.add_parser('check', help='Run the IPCameraCapture loop through a running server')
+    c.add_argument('--url', default=DEFAULT_URL, help='Server URL')
+    c.add_argument('--source', default=None, help='Camera URL or video file (default: fake camera on valid/images)')
+    c.add_argument('--captures', type=int, default=3, help='Captures to run')
+    c.add_argument('--timeout', type=float, default=60.0, help='Seconds before the check gives up')
+
+    args = parser.parse_args()
+    if args.command == 'bench':
+        return bench(args.url, args.images, args.clients, args.requests)
+    if args.command == 'check':
+        return check(args.url, args.source, args.captures, args.timeout)
+
+    if args.metrics_port:
+        start_http_server(args.metrics_port, args.metrics_addr)
+    serve(args.model, args.host, args.port, args.max_batch, args.max_wait_ms, args.imgsz, args.device)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
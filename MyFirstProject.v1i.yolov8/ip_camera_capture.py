@@ -5,61 +5,87 @@ Captures images from mobile IP webcam at periodic intervals
 
 import cv2
 import time
+import numpy as np
 import os
 import yaml
 from datetime import datetime
 from pathlib import Path
-from ultralytics import YOLO
 import argparse
+from model_registry import get_model
+from metrics import CAMERA_RECONNECTS, FRAMES_SKIPPED
+from profiling import TRACER, stage
+from camera_health import CameraHealth, Backoff
+from shm_ring import start_capture_process, stop_capture_process
+from postprocess import DETECTION_DTYPE, extract_detections, class_summary
+from frame_selection import SAVE_MODES, FrameSelector
+from cascade import DEFAULT_SCREEN_CONF, Cascade
 
 # Get the project directory (where this script is located)
 PROJECT_DIR = Path(__file__).parent.absolute()
 
 
 class IPCameraCapture:
-    def __init__(self, config_path="ip_camera_config.yaml"):
-        """Initialize IP Camera Capture with configuration"""
+    def __init__(self, config_path="ip_camera_config.yaml", model=None):
+        """Initialize IP Camera Capture with configuration (reuses `model` if given)"""
         # Resolve config path relative to project directory
         if not Path(config_path).is_absolute():
             config_path = PROJECT_DIR / config_path
         
         self.config = self.load_config(str(config_path))
         self.cap = None
+        self.health = None
+        self.ring = None
+        self.last_frame = None
+        self._capture_proc = None
         self.model = None
+        self.selector = None
+        self.cascade = None
+        self._connect_attempts = 0
         
         # Create output directories (project-relative)
         self.output_dir = PROJECT_DIR / self.config['output_directory']
         self.output_dir.mkdir(exist_ok=True)
         
+        self.set_save_mode(self.config['save_mode'])
+        
         # Initialize YOLOv8 model if detection is enabled
         if self.config['enable_detection']:
-            model_path = self.config['model_path']
-            # Resolve model path relative to project directory if not absolute
-            if not Path(model_path).is_absolute():
-                model_path = PROJECT_DIR / model_path
-            
-            if os.path.exists(model_path):
-                print(f"Loading YOLOv8 model from {model_path}")
-                self.model = YOLO(str(model_path))
+            if model is not None:
+                self.model = model
+            elif self.config.get('inference_server'):
+                # Shared model in inference_server.py instead of a copy in this process
+                self.model = get_model(self.config['inference_server'])
             else:
-                print(f"Warning: Model not found at {model_path}. Using default yolov8n.pt")
-                # Try project directory first, then current directory
-                default_model = PROJECT_DIR / "yolov8n.pt"
-                if default_model.exists():
-                    self.model = YOLO(str(default_model))
+                model_path = self.config['model_path']
+                # Resolve model path relative to project directory if not absolute
+                if not Path(model_path).is_absolute():
+                    model_path = PROJECT_DIR / model_path
+                
+                if os.path.exists(model_path):
+                    print(f"Loading YOLOv8 model from {model_path}")
+                    self.model = get_model(model_path)
                 else:
-                    self.model = YOLO("yolov8n.pt")
+                    print(f"Warning: Model not found at {model_path}. Using default yolov8n.pt")
+                    # Try project directory first, then current directory
+                    default_model = PROJECT_DIR / "yolov8n.pt"
+                    if default_model.exists():
+                        self.model = get_model(default_model)
+                    else:
+                        self.model = get_model("yolov8n.pt")
             
             if self.config['save_detections']:
                 self.detection_dir = PROJECT_DIR / self.config['detection_output_dir']
                 self.detection_dir.mkdir(exist_ok=True)
+        
+        self.set_cascade(self.config['cascade'])
     
     def load_config(self, config_path):
         """Load configuration from YAML file"""
         try:
             with open(config_path, 'r') as f:
                 config = yaml.safe_load(f)
-            return config
+            # Keys missing from older config files fall back to the defaults
+            return {**self.get_default_config(), **(config or {})}
         except FileNotFoundError:
             print(f"Config file {config_path} not found. Using default settings.")
             return self.get_default_config()
@@ -79,17 +105,57 @@ class IPCameraCapture:
             'save_detections': True,
             'detection_output_dir': 'detections',
             'image_quality': 95,
-            'save_format': 'jpg'
+            'save_format': 'jpg',
+            'save_mode': 'all',
+            'labeling_queue_dir': 'labeling_queue',
+            'select_low_conf': 0.25,
+            'select_high_conf': 0.6,
+            'select_disagreement_iou': 0.5,
+            'select_novelty_distance': 10,
+            'select_ok_sample': 0.02,
+            'cascade': False,
+            'cascade_screen_model': '',
+            'cascade_screen_imgsz': 320,
+            'cascade_screen_conf': DEFAULT_SCREEN_CONF,
+            'cascade_confirm_imgsz': 640,
+            'cascade_confirm': 'frame',
+            'cascade_max_crops': 4,
+            'cascade_crop_margin': 0.5,
+            'read_timeout_seconds': 5,
+            'reconnect_after_failures': 3,
+            'failed_after_attempts': 10,
+            'backoff_initial_seconds': 1,
+            'backoff_max_seconds': 60,
+            'capture_process': False,
+            'ring_slots': 8,
+            'ring_max_shape': [1080, 1920, 3]
         }
     
-    def connect_camera(self):
-        """Connect to IP camera"""
+    def set_save_mode(self, mode):
+        """'all' keeps every capture, 'select' only frames worth labeling (frame_selection.py), 'none' nothing"""
+        if mode not in SAVE_MODES:
+            print(f"Unknown save_mode '{mode}', saving all captures")
+            mode = 'all'
+        self.config['save_mode'] = mode
+        self.selector = FrameSelector.from_config(self.config) if mode == 'select' else None
+    
+    def set_cascade(self, enabled):
+        """Screen frames with a cheap pass and run the full model only on flagged ones (cascade.py)"""
+        self.config['cascade'] = enabled
+        self.cascade = Cascade.from_config(self.model, self.config) if enabled and self.model is not None else None
+        if self.cascade is not None:
+            print(f"🪜 Cascade: {self.cascade.screen_imgsz}px screen at conf {self.cascade.screen_conf}, "
+                  f"{self.cascade.confirm} confirm at {self.cascade.confirm_imgsz}px")
+    
+    def open_capture(self):
+        """Open the camera stream with the configured open/read timeouts"""
         url = self.config['ip_camera_url']
-        print(f"Connecting to IP camera at {url}...")
+        timeout_ms = int(self.config['read_timeout_seconds'] * 1000)
+        cap = cv2.VideoCapture(url, cv2.CAP_ANY, [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, timeout_ms,
+                                                  cv2.CAP_PROP_READ_TIMEOUT_MSEC, timeout_ms])
         
-        self.cap = cv2.VideoCapture(url)
-        
-        if not self.cap.isOpened():
+        if not cap.isOpened():
+            cap.release()
             raise ConnectionError(f"Failed to connect to IP camera at {url}. "
                                 f"Please check:\n"
                                 f"1. IP Webcam app is running on your phone\n"
@@ -97,12 +163,89 @@ class IPCameraCapture:
                                 f"3. URL is correct: {url}")
         
         # Set buffer size to get latest frame
-        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cap
+    
+    def connect_camera(self):
+        """Connect to IP camera (blocking, raises ConnectionError on failure)"""
+        url = self.config['ip_camera_url']
+        print(f"Connecting to IP camera at {url}...")
+        
+        # Every attempt after the first one is a reconnect
+        reconnect = self._connect_attempts > 0
+        self._connect_attempts += 1
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+        
+        try:
+            self.cap = self.open_capture()
+        except ConnectionError:
+            if reconnect:
+                CAMERA_RECONNECTS.inc(camera=url, result='failure')
+            raise
+        
+        if reconnect:
+            CAMERA_RECONNECTS.inc(camera=url, result='success')
         print("✓ Successfully connected to IP camera!")
         return True
     
+    def start_monitor(self, wait=None):
+        """
+        Hand the camera to a background CameraHealth worker that reads frames
+        with a timeout and reconnects with jittered exponential backoff.
+        Reuses the capture opened by connect_camera() if there is one.
+        """
+        if self.health is not None:
+            return self.health
+        cfg = self.config
+        self.health = CameraHealth(
+            self.open_capture, cfg['ip_camera_url'],
+            read_timeout=cfg['read_timeout_seconds'],
+            reconnect_after=cfg['reconnect_after_failures'],
+            fail_after=cfg['failed_after_attempts'],
+            backoff=Backoff(cfg['backoff_initial_seconds'], cfg['backoff_max_seconds']),
+            cap=self.cap,
+        )
+        # The worker owns the capture from now on
+        self.cap = None
+        return self.health.start(wait)
+    
+    def start_capture_process(self):
+        """
+        Decode the camera in a separate process that writes into a shared-memory
+        frame ring; capture_frame() then returns zero-copy views of the newest
+        frame, pinned (never overwritten) until the next capture_frame().
+        """
+        if self.ring is not None:
+            return self.ring
+        if self.cap is not None:
+            # The capture process opens its own connection
+            self.cap.release()
+            self.cap = None
+        cfg = self.config
+        self.ring, self._capture_proc, self._capture_stop = start_capture_process(
+            cfg, slots=cfg['ring_slots'], max_shape=tuple(cfg['ring_max_shape']))
+        print(f"📷 Capture process started (pid {self._capture_proc.pid}, {cfg['ring_slots']} shared-memory slots)")
+        return self.ring
+    
     def capture_frame(self):
         """Capture a single frame from the camera"""
+        if self.ring is not None:
+            after = self.last_frame.frame_id if self.last_frame is not None else 0
+            frame = self.ring.latest(after=after, timeout=self.config['read_timeout_seconds'])
+            if frame is None:
+                state = 'running' if self._capture_proc.is_alive() else 'exited'
+                raise RuntimeError(f"No new frame from the capture process ({state})")
+            self.last_frame = frame
+            return frame.image
+        
+        if self.health is not None:
+            ok, frame = self.health.read()
+            if not ok:
+                raise RuntimeError(f"Failed to capture frame from camera ({self.health.state})")
+            return frame
+        
         if self.cap is None:
             raise RuntimeError("Camera not connected. Call connect_camera() first.")
         
@@ -136,7 +279,11 @@ class IPCameraCapture:
         if self.model is None:
             return None
         
-        results = self.model(frame)
+        predictor = self.cascade or self.model
+        if self.selector is not None:
+            # Low-confidence boxes are what frame selection looks for
+            return predictor(frame, conf=min(self.selector.low_conf, 0.25))
+        results = predictor(frame)
         return results
     
     def save_detection(self, frame, results, filename=None):
@@ -154,14 +301,12 @@ class IPCameraCapture:
         
         print(f"✓ Detection saved: {filepath}")
         
-        # Print detection summary
-        if len(results[0].boxes) > 0:
-            print(f"  Detected {len(results[0].boxes)} object(s):")
-            for box in results[0].boxes:
-                cls = int(box.cls[0])
-                conf = float(box.conf[0])
-                class_name = self.model.names[cls] if hasattr(self.model, 'names') else f"class_{cls}"
-                print(f"    - {class_name}: {conf:.2f}")
+        # Print detection summary (one line per class, whatever the box count)
+        records = extract_detections(results[0])
+        if len(records) > 0:
+            print(f"  Detected {len(records)} object(s):")
+            for class_name, (count, conf) in class_summary(records, results[0].names).items():
+                print(f"    - {class_name}: {count}x, max {conf:.2f}")
         else:
             print("  No objects detected")
         
@@ -177,11 +322,21 @@ class IPCameraCapture:
         print(f"Starting IP Camera Capture")
         print(f"  Interval: {interval} seconds")
         print(f"  Output directory: {self.output_dir}")
+        print(f"  Save mode: {self.config['save_mode']}")
+        if self.selector is not None:
+            print(f"  Labeling queue: {self.selector.queue_dir}")
         if self.config['enable_detection']:
             print(f"  Detection: Enabled")
-            print(f"  Detection output: {self.detection_dir}")
+            if self.config['save_detections']:
+                print(f"  Detection output: {self.detection_dir}")
         print(f"{'='*60}\n")
         
+        if self.config['capture_process']:
+            self.start_capture_process()
+        else:
+            # Reads and reconnects go through the health worker from here on
+            self.start_monitor(wait=self.config['read_timeout_seconds'])
+        
         try:
             while True:
                 # Check duration limit
@@ -197,33 +352,64 @@ class IPCameraCapture:
                     break
                 
                 print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Capture #{capture_count + 1}")
+                TRACER.begin_frame(capture_count + 1)
                 
                 # Capture frame
                 try:
-                    frame = self.capture_frame()
-                    
-                    # Save original image
-                    image_path = self.save_image(frame)
+                    with stage('capture'):
+                        frame = self.capture_frame()
                     
                     # Run detection if enabled
+                    results = None
+                    if self.config['enable_detection']:
+                        with stage('inference'):
+                            results = self.run_detection(frame)
+                    
+                    if self.ring is not None:
+                        # Ring frames are borrowed: save/plot a private copy, and only
+                        # if the capture process did not reuse the slot meanwhile
+                        frame = frame.copy()
+                        if not self.ring.is_valid(self.last_frame):
+                            print("⚠ Frame overwritten by the capture process, skipping")
+                            FRAMES_SKIPPED.inc(source=self.config['ip_camera_url'], reason='overwritten')
+                            TRACER.end_frame()
+                            continue
+                        if results:
+                            results[0].orig_img = frame
+                    
+                    # Save original image (every capture, or only the ones worth labeling)
+                    if self.config['save_mode'] == 'all':
+                        with stage('save_image'):
+                            self.save_image(frame)
+                    elif self.selector is not None:
+                        with stage('select'):
+                            records = (extract_detections(results[0]) if results
+                                       else np.empty(0, dtype=DETECTION_DTYPE))
+                            reasons = self.selector.reasons(records, frame)
+                            if reasons:
+                                path = self.selector.save(frame, records, reasons, self.config['image_prefix'])
+                                print(f"✓ Queued for labeling ({', '.join(reasons)}): {path.name}")
+                    
                     if self.config['enable_detection']:
-                        results = self.run_detection(frame)
                         if results and self.config['save_detections']:
-                            self.save_detection(frame, results)
+                            with stage('save_detection'):
+                                self.save_detection(frame, results)
                     
                     capture_count += 1
                     
                 except Exception as e:
                     print(f"✗ Error during capture: {e}")
-                    print("  Retrying connection...")
-                    time.sleep(5)
-                    try:
-                        self.connect_camera()
-                    except Exception as reconnect_error:
-                        print(f"✗ Reconnection failed: {reconnect_error}")
-                        break
+                    TRACER.end_frame()
+                    # Reconnects happen in the health worker / capture process; just wait for it
+                    if self.health is not None and not self.health.usable:
+                        print(f"  Camera {self.health.state}, waiting for reconnect...")
+                        self.health.wait_connected(timeout=interval)
+                    else:
+                        time.sleep(1)
+                    continue
                 
                 # Wait for next capture
+                TRACER.end_frame()
                 if duration_minutes or (max_captures and capture_count < max_captures):
                     print(f"Waiting {interval} seconds until next capture...")
                     time.sleep(interval)
@@ -236,13 +422,26 @@ class IPCameraCapture:
             print(f"\n{'='*60}")
             print(f"Capture session completed!")
             print(f"  Total captures: {capture_count}")
-            print(f"  Images saved to: {self.output_dir}")
+            if self.selector is not None:
+                print(f"  Queued for labeling: {self.selector.summary()} -> {self.selector.queue_dir}")
+            elif self.config['save_mode'] == 'all':
+                print(f"  Images saved to: {self.output_dir}")
             if self.config['enable_detection'] and self.config['save_detections']:
                 print(f"  Detections saved to: {self.detection_dir}")
+            if self.cascade is not None:
+                print(f"  Cascade: {self.cascade.summary()}")
             print(f"{'='*60}\n")
     
     def cleanup(self):
         """Release camera resources"""
+        if self.ring is not None:
+            stop_capture_process(self.ring, self._capture_proc, self._capture_stop)
+            self.ring = self.last_frame = self._capture_proc = None
+            print("Capture process stopped.")
+        if self.health is not None:
+            self.health.close()
+            self.health = None
+            print("Camera connection closed.")
         if self.cap is not None:
             self.cap.release()
             print("Camera connection closed.")
@@ -258,15 +457,36 @@ def main():
                        help='Maximum number of captures (None for infinite)')
     parser.add_argument('--test', action='store_true',
                        help='Test camera connection and capture one image')
+    parser.add_argument('--profile', default=None, metavar='TRACE.json',
+                       help='Record per-stage spans and save a Chrome/Perfetto trace on exit')
+    parser.add_argument('--profile-sample', type=int, default=1, metavar='N',
+                       help='Trace 1 in N frames (default: every frame)')
+    parser.add_argument('--capture-process', action='store_true',
+                       help='Decode the camera in a separate process (shared-memory frame ring)')
+    parser.add_argument('--cascade', action='store_true',
+                       help='Low-res screening pass first, full-res detection only on flagged frames')
+    parser.add_argument('--save-mode', choices=SAVE_MODES, default=None,
+                       help='all: every capture, select: only frames worth labeling, none (default: config)')
     
     args = parser.parse_args()
+    if args.profile:
+        TRACER.configure(enabled=True, sample_every=args.profile_sample)
     
     # Initialize capture system
     capture = IPCameraCapture(args.config)
+    if args.capture_process:
+        capture.config['capture_process'] = True
+    if args.save_mode:
+        capture.set_save_mode(args.save_mode)
+    if args.cascade:
+        capture.set_cascade(True)
     
     try:
-        # Connect to camera
-        capture.connect_camera()
+        # Connect to camera (the capture process connects on its own)
+        if not capture.config['capture_process']:
+            capture.connect_camera()
+        elif args.test:
+            capture.start_capture_process()
         
         if args.test:
             # Test mode: capture one image
@@ -289,6 +509,11 @@ def main():
         print(f"\n✗ Error: {e}")
         return 1
     
+    finally:
+        if args.profile:
+            TRACER.end_frame()
+            print(f"Trace saved: {args.profile} ({TRACER.save(args.profile)} events)")
+    
     return 0
 
 
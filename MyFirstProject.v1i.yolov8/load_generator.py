@@ -0,0 +1,288 @@
+"""
+Synthetic Detection Load Generator
+Produces realistic detections/<ms key> records (same fields as
+CloudClient.send_detection) for several concurrent sessions and writes them in
+batched multi-path updates, either as a live stream at a target rate or as a
+historical backfill. The backend is anything with the firebase_admin.db
+reference API: Firebase itself or local_db.LocalDatabase.
+
+Stream:    python load_generator.py stream --rate 300 --duration 60 --sessions 8
+Backfill:  python load_generator.py backfill --events 100000 --days 7 --backend firebase
+Dashboard: python load_generator.py bench-dashboard --sizes 1000 10000 100000 1000000
+"""
+
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+from local_db import LocalDatabase
+from metrics import UPLOADS
+
+DEFECT_MIX = {'crack': 0.5, 'scratch': 0.3, 'breakage': 0.2}
+# Beta(a, b) shape of each class' confidence above the 0.5 upload threshold
+CONFIDENCE_SHAPE = {'crack': (4, 2), 'scratch': (2, 3), 'breakage': (5, 1.5)}
+
+
+def parse_mix(text):
+    """'crack=0.5,scratch=0.3,breakage=0.2' -> normalized {class: probability}"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    total = sum(mix.values())
+    return {k: v / total for k, v in mix.items()}
+
+
+class EventGenerator:
+    """
+    Detection records for `sessions` detection processes. Keys are millisecond
+    timestamps, bumped on collision like CloudClient, so they stay unique and
+    in time order across calls.
+    """
+
+    def __init__(self, sessions=4, defect_mix=None, image_ratio=0.8, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.mix = defect_mix or DEFECT_MIX
+        self.image_ratio = image_ratio
+        start = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.sessions = [f"{start}_{i:02d}" for i in range(sessions)]
+        self._last_key = 0
+
+    def events(self, n, start, end):
+        """`n` records with unix timestamps spread over [start, end); returns [(key, record)]"""
+        rng = self.rng
+        names = list(self.mix)
+        ts = np.sort(rng.uniform(start, end, n))
+        keys = (ts * 1000).astype(np.int64)
+        # Strictly increasing keys, also after the previous batch
+        keys = np.maximum(keys, self._last_key + 1)
+        steps = np.arange(n)
+        keys = np.maximum.accumulate(keys - steps) + steps
+        if n:
+            self._last_key = int(keys[-1])
+
+        types = rng.choice(len(names), size=n, p=[self.mix[k] for k in names])
+        conf = np.empty(n)
+        for i, name in enumerate(names):
+            sel = types == i
+            a, b = CONFIDENCE_SHAPE.get(name, (3, 2))
+            conf[sel] = 0.5 + 0.49 * rng.beta(a, b, sel.sum())
+        ring_count = 1 + rng.poisson(0.3, n)
+        session = rng.integers(0, len(self.sessions), n)
+        has_image = rng.random(n) < self.image_ratio
+
+        out = []
+        for i in range(n):
+            t = float(ts[i])
+            defect = names[types[i]]
+            stamp = datetime.fromtimestamp(t)
+            out.append((str(keys[i]), {
+                "timestamp": stamp.strftime("%Y-%m-%d %H:%M:%S"),
+                "unix_timestamp": t,
+                "confidence": round(float(conf[i]), 3),
+                "ring_count": int(ring_count[i]),
+                "defect_type": defect,
+                "image_filename": (f"detected_{defect}_{stamp.strftime('%Y%m%d_%H%M%S_%f')[:-3]}.jpg"
+                                   if has_image[i] else None),
+                "session_id": self.sessions[session[i]],
+            }))
+        return out
+
+
+def write_batch(database, events, session_stats=None):
+    """One multi-path update for a batch of (key, record) plus optional statistics/<session> fields"""
+    update = {f"detections/{key}": record for key, record in events}
+    for session_id, fields in (session_stats or {}).items():
+        for name, value in fields.items():
+            update[f"statistics/{session_id}/{name}"] = value
+    try:
+        database.reference('/').update(update)
+        UPLOADS.inc(kind='detection_batch', result='success')
+        return True
+    except Exception as e:
+        print(f"   ⚠ Batch write failed ({len(events)} events): {e}")
+        UPLOADS.inc(kind='detection_batch', result='failure')
+        return False
+
+
+def _session_stats(generator, events, totals):
+    for _, record in events:
+        totals[record['session_id']] = totals.get(record['session_id'], 0) + 1
+    now = time.time()
+    return {sid: {'total_defects': totals.get(sid, 0), 'last_active': now} for sid in generator.sessions}
+
+
+def stream(database, generator, rate, duration, batch_interval=0.1, max_batch=2000):
+    """Write `rate` events/s for `duration` s in batches every `batch_interval` s; returns a report dict"""
+    sent, totals, latencies, failures = 0, {}, [], 0
+    start = time.time()
+    last = start
+    print(f"📤 Streaming {rate:g} events/s for {duration:g}s across {len(generator.sessions)} sessions...")
+    while True:
+        now = time.time()
+        elapsed = min(now - start, duration)
+        # Catch up on everything due since the last batch (bounded so a slow backend can't snowball)
+        due = min(int(rate * elapsed) - sent, max_batch)
+        if due > 0:
+            events = generator.events(due, last, now)
+            t0 = time.perf_counter()
+            if write_batch(database, events, _session_stats(generator, events, totals)):
+                sent += due
+            else:
+                failures += 1
+            latencies.append((time.perf_counter() - t0) * 1000)
+            last = now
+        if now - start >= duration:
+            break
+        time.sleep(max(0.0, batch_interval - (time.time() - now)))
+
+    elapsed = time.time() - start
+    report = {
+        'events': sent,
+        'seconds': round(elapsed, 2),
+        'events_per_second': round(sent / elapsed, 1),
+        'batches': len(latencies),
+        'failed_batches': failures,
+        'batch_ms_p50': round(float(np.percentile(latencies, 50)), 2) if latencies else None,
+        'batch_ms_p95': round(float(np.percentile(latencies, 95)), 2) if latencies else None,
+    }
+    print(f"✅ {report['events']} events in {report['seconds']}s ({report['events_per_second']}/s), "
+          f"{report['batches']} batches, p50 {report['batch_ms_p50']} ms, p95 {report['batch_ms_p95']} ms, "
+          f"{failures} failed")
+    return report
+
+
+def backfill(database, generator, count, days=7.0, batch_size=5000, end=None):
+    """Write `count` historical events spread over the last `days`; returns events written"""
+    end = end or time.time()
+    start = end - days * 86400
+    edges = np.linspace(start, end, -(-count // batch_size) + 1)
+    written, totals = 0, {}
+    t0 = time.perf_counter()
+    for i in range(len(edges) - 1):
+        n = min(batch_size, count - written)
+        events = generator.events(n, edges[i], edges[i + 1])
+        if write_batch(database, events, _session_stats(generator, events, totals)):
+            written += n
+        if (i + 1) % 20 == 0:
+            print(f"  ✓ {written}/{count} events")
+    elapsed = time.perf_counter() - t0
+    print(f"✅ Backfilled {written} events over {days:g} days in {elapsed:.1f}s ({written / elapsed:.0f}/s)")
+    return written
+
+
+def _median_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return float(np.median(times))
+
+
+def bench_dashboard(sizes, limit=50, repeat=5, seed=0):
+    """
+    Time the dashboard's fetch (dashboard_data.fetch_detections) and chart
+    build on a LocalDatabase holding 1k..1M events, without Streamlit.
+    limit=None measures fetching the whole history.
+    """
+    from dashboard_data import fetch_detections, summary_metrics, build_charts
+
+    try:
+        import plotly  # noqa: F401
+        render = True
+    except ImportError:
+        print("⚠ plotly not installed: chart build times skipped")
+        render = False
+
+    print(f"\n📊 Dashboard load test (limit={limit or 'all'}, median of {repeat})")
+    print(f"{'events':>10}{'fill s':>10}{'fetch ms':>12}{'rows':>8}{'summary ms':>12}{'charts ms':>12}{'json KB':>10}")
+    rows = []
+    generator = EventGenerator(seed=seed)
+    for size in sizes:
+        t0 = time.perf_counter()
+        # Build the tree directly; going through update() would time the stand-in, not the dashboard
+        database = LocalDatabase({'detections': dict(generator.events(size, time.time() - 30 * 86400, time.time()))})
+        fill = time.perf_counter() - t0
+
+        fetch_ms = _median_ms(lambda: fetch_detections(database, limit), repeat)
+        df = fetch_detections(database, limit)
+        summary_ms = _median_ms(lambda: summary_metrics(df), repeat)
+        charts_ms, json_kb = float('nan'), float('nan')
+        if render:
+            charts_ms = _median_ms(lambda: build_charts(df), repeat)
+            # Serialized figures approximate what Streamlit ships to the browser
+            json_kb = sum(len(f.to_json()) for f in build_charts(df) if f is not None) / 1024
+        row = {'events': size, 'fill_s': fill, 'fetch_ms': fetch_ms, 'rows': len(df),
+               'summary_ms': summary_ms, 'charts_ms': charts_ms, 'json_kb': json_kb}
+        rows.append(row)
+        print(f"{size:>10}{fill:>10.1f}{fetch_ms:>12.2f}{len(df):>8}{summary_ms:>12.2f}{charts_ms:>12.2f}{json_kb:>10.1f}")
+        del database
+    return rows
+
+
+def connect(backend):
+    """firebase_admin.db (through CloudClient's credentials) or a fresh LocalDatabase"""
+    if backend == 'local':
+        return LocalDatabase()
+    from cloud_client import CloudClient
+    from firebase_config import FIREBASE_DATABASE_URL, SERVICE_ACCOUNT_KEY_PATH
+    client = CloudClient(SERVICE_ACCOUNT_KEY_PATH, FIREBASE_DATABASE_URL)
+    if not client.connected:
+        raise ConnectionError("Firebase connection failed")
+    return client.db
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Synthetic detection load generator and dashboard load test')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--backend', choices=['local', 'firebase'], default='local',
+                        help='Write target (firebase writes to the configured database!)')
+    common.add_argument('--sessions', type=int, default=4, help='Concurrent detection sessions')
+    common.add_argument('--mix', type=parse_mix, default=None,
+                        help='Defect mix, e.g. crack=0.5,scratch=0.3,breakage=0.2')
+    common.add_argument('--seed', type=int, default=None, help='Random seed')
+    common.add_argument('--save', default=None, metavar='FILE.json', help='Dump the local database afterwards')
+
+    s = sub.add_parser('stream', parents=[common], help='Live stream at a target rate')
+    s.add_argument('--rate', type=float, default=100, help='Events per second')
+    s.add_argument('--duration', type=float, default=30, help='Seconds')
+    s.add_argument('--batch-interval', type=float, default=0.1, help='Seconds between batched writes')
+
+    b = sub.add_parser('backfill', parents=[common], help='Historical events as fast as possible')
+    b.add_argument('--events', type=int, default=10000, help='Number of events')
+    b.add_argument('--days', type=float, default=7, help='History length')
+    b.add_argument('--batch-size', type=int, default=5000, help='Events per multi-path update')
+
+    d = sub.add_parser('bench-dashboard', help='Dashboard fetch/render time vs. dataset size (local, headless)')
+    d.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000], help='Event counts')
+    d.add_argument('--limit', type=int, default=50, help='Records fetched (app.py uses 50; 0 = all)')
+    d.add_argument('--repeat', type=int, default=5, help='Timed runs per size')
+
+    args = parser.parse_args()
+    if args.command == 'bench-dashboard':
+        bench_dashboard(args.sizes, args.limit or None, args.repeat)
+        return 0
+
+    database = connect(args.backend)
+    generator = EventGenerator(args.sessions, args.mix, seed=args.seed)
+    if args.command == 'stream':
+        stream(database, generator, args.rate, args.duration, args.batch_interval)
+    else:
+        backfill(database, generator, args.events, args.days, args.batch_size)
+
+    if args.save and args.backend == 'local':
+        with open(args.save, 'w') as f:
+            json.dump(database.reference('/').get(), f)
+        print(f"💾 Saved local database to {args.save}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
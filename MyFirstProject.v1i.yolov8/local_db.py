@@ -0,0 +1,144 @@
+"""
+Local Database Backend
+In-memory stand-in for firebase_admin.db with the subset of the reference/query
+API this project uses. Lets CloudClient, the dashboard fetch code and the
+benchmarks run without network access or credentials.
+"""
+
+import copy
+import heapq
+import threading
+
+
+def _split(path):
+    return [p for p in str(path).strip('/').split('/') if p]
+
+
+class LocalDatabase:
+    """Thread-safe JSON-like tree, addressed by '/'-separated paths"""
+
+    def __init__(self, data=None):
+        self._root = data if data is not None else {}
+        self._lock = threading.RLock()
+
+    def reference(self, path='/'):
+        return LocalReference(self, _split(path))
+
+    # --- internal helpers (callers hold the lock) ---
+    def _node(self, parts):
+        node = self._root
+        for p in parts:
+            if not isinstance(node, dict) or p not in node:
+                return None
+            node = node[p]
+        return node
+
+    def _set(self, parts, value):
+        if not parts:
+            self._root = value if isinstance(value, dict) else {}
+            return
+        node = self._root
+        for p in parts[:-1]:
+            child = node.get(p)
+            if not isinstance(child, dict):
+                child = node[p] = {}
+            node = child
+        if value is None:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = value
+
+
+class LocalReference:
+    """Mirrors firebase_admin.db.Reference for get/set/update/delete and key queries"""
+
+    def __init__(self, database, parts):
+        self._db = database
+        self._parts = parts
+
+    @property
+    def key(self):
+        return self._parts[-1] if self._parts else None
+
+    @property
+    def path(self):
+        return '/' + '/'.join(self._parts)
+
+    def child(self, path):
+        return LocalReference(self._db, self._parts + _split(path))
+
+    def get(self, shallow=False):
+        with self._db._lock:
+            node = self._db._node(self._parts)
+            if shallow and isinstance(node, dict):
+                return {k: True for k in node}
+            return copy.deepcopy(node)
+
+    def set(self, value):
+        with self._db._lock:
+            self._db._set(self._parts, copy.deepcopy(value))
+
+    def update(self, value):
+        """Multi-path update: keys may contain '/' like in Firebase"""
+        with self._db._lock:
+            for key, v in value.items():
+                self._db._set(self._parts + _split(key), copy.deepcopy(v))
+
+    def delete(self):
+        with self._db._lock:
+            self._db._set(self._parts, None)
+
+    def order_by_key(self):
+        return LocalQuery(self)
+
+
+class LocalQuery:
+    """Key-ordered query with start/end bounds and first/last limits"""
+
+    def __init__(self, ref):
+        self._ref = ref
+        self._start = None
+        self._end = None
+        self._first = None
+        self._last = None
+
+    def start_at(self, key):
+        self._start = str(key)
+        return self
+
+    def end_at(self, key):
+        self._end = str(key)
+        return self
+
+    def limit_to_first(self, n):
+        self._first = n
+        return self
+
+    def limit_to_last(self, n):
+        self._last = n
+        return self
+
+    def get(self):
+        db = self._ref._db
+        with db._lock:
+            node = db._node(self._ref._parts)
+            if not isinstance(node, dict):
+                return {}
+            bounded = self._start is not None or self._end is not None
+            if not bounded and (self._first is None) != (self._last is None):
+                # Limit-only query (e.g. the dashboard's last 50): partial selection, no full sort
+                if self._first is not None:
+                    keys = heapq.nsmallest(self._first, node)
+                else:
+                    keys = sorted(heapq.nlargest(self._last, node)) if self._last else []
+                return {k: copy.deepcopy(node[k]) for k in keys}
+            keys = sorted(node)
+            if self._start is not None:
+                keys = [k for k in keys if k >= self._start]
+            if self._end is not None:
+                keys = [k for k in keys if k <= self._end]
+            if self._first is not None:
+                keys = keys[:self._first]
+            if self._last is not None:
+                keys = keys[-self._last:] if self._last else []
+            return {k: copy.deepcopy(node[k]) for k in keys}
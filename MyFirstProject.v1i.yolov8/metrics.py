@@ -0,0 +1,219 @@
+"""
+Detection Process Metrics
+Minimal thread-safe counters, gauges and histograms with an optional HTTP
+endpoint in the Prometheus text format (GET /metrics). Recording is always
+on and cheap; the server only starts when a port is given (--metrics-port).
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+
+# Seconds; covers a fast camera read up to a slow Firebase upload
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observed values (cumulative buckets, sum and count)"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block in seconds"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = [(k, [list(s[0]), s[1], s[2]]) for k, s in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float('inf'),), counts):
+                cumulative += c
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# --- Detection pipeline metrics ---
+FRAMES_CAPTURED = Counter('ringfault_frames_captured_total', 'Frames read from the camera or disk',
+                          ['source'])
+FRAMES_INFERRED = Counter('ringfault_frames_inferred_total', 'Frames run through the model', ['source'])
+FRAMES_SKIPPED = Counter('ringfault_frames_skipped_total', 'Frames dropped before inference',
+                         ['source', 'reason'])
+DEFECTS = Counter('ringfault_defects_total', 'Frames with at least one defect above the alert threshold',
+                  ['source'])
+STAGE_SECONDS = Histogram('ringfault_stage_seconds', 'Per-frame latency of each pipeline stage', ['stage'])
+QUEUE_DEPTH = Gauge('ringfault_queue_depth', 'Items waiting in internal buffers', ['queue'])
+UPLOADS = Counter('ringfault_uploads_total', 'Cloud database writes', ['kind', 'result'])
+CAMERA_RECONNECTS = Counter('ringfault_camera_reconnects_total', 'Camera reconnect attempts',
+                            ['camera', 'result'])
+CAMERA_STATE = Gauge('ringfault_camera_state', 'Camera health state (1 for the current state)',
+                    ['camera', 'state'])
+CAMERA_RECOVERY_SECONDS = Histogram('ringfault_camera_recovery_seconds', 'Time from losing a camera to reconnecting',
+                                    ['camera'], buckets=(1, 2, 5, 10, 30, 60, 120, 300, 600, 1800))
+INFERENCE_BATCH_SIZE = Histogram('ringfault_inference_batch_size', 'Frames per forward pass (inference server)',
+                                 buckets=(1, 2, 4, 8, 16, 32))
+FRAMES_SELECTED = Counter('ringfault_frames_selected_total', 'Frames kept for labeling, by selection reason',
+                          ['reason'])
+MODEL_INFO = Gauge('ringfault_model_info', 'Loaded model (value is always 1)', ['path', 'backend'])
+MODEL_SWAPS = Counter('ringfault_model_swaps_total', 'Model hot-swap outcomes (hot_swap.py)', ['result'])
+CASCADE_FRAMES = Counter('ringfault_cascade_frames_total', 'Frames per cascade stage outcome (screen: flagged/clear, '
+                         'confirm: confirmed/rejected)', ['stage', 'result'])
+LAST_FRAME = Gauge('ringfault_last_frame_timestamp_seconds', 'Unix time of the last inferred frame',
+                   ['source'])
+
+
+def _handler(registry):
+    """Request handler class serving `registry`; http.server is only imported when an endpoint starts"""
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/metrics', '/'):
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Scrapes every few seconds would flood the console
+            pass
+
+    return MetricsHandler
+
+
+def start_http_server(port, addr='127.0.0.1', registry=REGISTRY):
+    """
+    Serve /metrics from a daemon thread; returns the server (call shutdown() to stop).
+    Local only by default; pass addr='0.0.0.0' to let another machine scrape it.
+    """
+    from http.server import ThreadingHTTPServer
+
+    server = ThreadingHTTPServer((addr, port), _handler(registry))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True)
+    thread.start()
+    return server
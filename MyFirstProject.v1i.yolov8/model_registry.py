@@ -0,0 +1,116 @@
+"""
+Model Registry
+Process-wide cache of loaded YOLO models keyed by weights path, backend and
+device, so test.py and IPCameraCapture share one instance. Models are fused
+and warmed up on a dummy frame when first loaded. An http:// URL selects the
+remote backend (a client for inference_server.py).
+"""
+
+import time
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from metrics import MODEL_INFO
+
+_models = {}
+_lock = threading.Lock()
+# Labels of the model last reported in MODEL_INFO
+_reported = None
+_reported_lock = threading.Lock()
+
+
+def backend_name(model_path):
+    """Inference backend implied by the exported model file (or 'remote' for a server URL)"""
+    if str(model_path).startswith(('http://', 'https://')):
+        return 'remote'
+    path = Path(model_path)
+    if path.is_dir() and path.name.endswith('_openvino_model'):
+        return 'openvino'
+    return {'.pt': 'torch', '.onnx': 'onnx', '.torchscript': 'torchscript',
+            '.engine': 'tensorrt'}.get(path.suffix, path.suffix.lstrip('.') or 'unknown')
+
+
+def _key(model_path, device):
+    path = Path(model_path)
+    resolved = str(path.resolve()) if path.exists() else str(model_path)
+    return resolved, backend_name(model_path), str(device or 'auto')
+
+
+def report_model(model_path, backend=None):
+    """Publish `model_path` as the serving model in MODEL_INFO, zeroing the previous one"""
+    global _reported
+    labels = {'path': str(model_path), 'backend': backend or backend_name(model_path)}
+    with _reported_lock:
+        if _reported is not None and _reported != labels:
+            MODEL_INFO.set(0, **_reported)
+        MODEL_INFO.set(1, **labels)
+        _reported = labels
+
+
+def warmup(model, imgsz=640, device=None, runs=2):
+    """Run inference on a blank frame so lazy initialisation happens before the first real one"""
+    frame = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        model.predict(source=frame, imgsz=imgsz, device=device, save=False, verbose=False)
+    return (time.perf_counter() - t0) * 1000
+
+
+def load_model(model_path, device=None, imgsz=640, fuse=True, warm=True):
+    """Load, fuse and warm up a fresh YOLO instance, bypassing the cache (see hot_swap.py)"""
+    from ultralytics import YOLO
+
+    backend = backend_name(model_path)
+    t0 = time.perf_counter()
+    model = YOLO(str(model_path))
+    if fuse and backend == 'torch':
+        # Folds BatchNorm into the convolutions
+        model.fuse()
+    load_ms = (time.perf_counter() - t0) * 1000
+
+    if warm:
+        warm_ms = warmup(model, imgsz, device)
+        print(f"🔥 Model ready: {Path(model_path).name} ({backend}) loaded in {load_ms:.0f} ms, "
+              f"warm-up {warm_ms:.0f} ms")
+    return model
+
+
+def get_model(model_path, device=None, imgsz=640, fuse=True, warm=True):
+    """Shared YOLO instance for `model_path`, loading (and warming up) it on first use"""
+    key = _key(model_path, device)
+    with _lock:
+        model = _models.get(key)
+        if model is not None:
+            return model
+
+        if key[1] == 'remote':
+            # Model lives in inference_server.py; nothing to fuse or warm up here
+            from inference_server import RemoteModel
+            model = _models[key] = RemoteModel(str(model_path))
+            print(f"🔗 Using inference server: {model_path} ({model.info['model']})")
+            report_model(model_path, 'remote')
+            return model
+
+        model = _models[key] = load_model(model_path, device, imgsz, fuse, warm)
+        report_model(model_path, key[1])
+        return model
+
+
+def register(model_path, model, device=None):
+    """Make `model` the shared instance for `model_path` (after a hot swap or rollback)"""
+    with _lock:
+        _models[_key(model_path, device)] = model
+
+
+def loaded_models():
+    """Keys of the models currently held by the registry"""
+    with _lock:
+        return list(_models)
+
+
+def clear():
+    """Drop all cached models (e.g. after replacing weights on disk)"""
+    with _lock:
+        _models.clear()
@@ -3,11 +3,22 @@ import json
 # Your Database URL
 DATABASE_URL = "https://ring-detection-c6326-default-rtdb.firebaseio.com/"
 
-# Load the fresh JSON file
-try:
-    with open("serviceAccountKey.json", "r") as f:
-        FIREBASE_CREDENTIALS = json.load(f)
-    print("✅ Credentials loaded from serviceAccountKey.json")
-except Exception as e:
-    print(f"❌ Error loading JSON: {e}")
-    FIREBASE_CREDENTIALS = None
\ No newline at end of file
+
+def _load_credentials():
+    """Load the fresh JSON file"""
+    try:
+        with open("serviceAccountKey.json", "r") as f:
+            credentials = json.load(f)
+        print("✅ Credentials loaded from serviceAccountKey.json")
+        return credentials
+    except Exception as e:
+        print(f"❌ Error loading JSON: {e}")
+        return None
+
+
+def __getattr__(name):
+    # FIREBASE_CREDENTIALS is read on first access, not on import
+    if name == "FIREBASE_CREDENTIALS":
+        globals()[name] = _load_credentials()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
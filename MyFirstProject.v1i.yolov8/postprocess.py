@@ -0,0 +1,92 @@
+"""
+Vectorized Detection Post-processing
+Turns a YOLO result into a compact NumPy record array in one device transfer
+and applies per-class alert thresholds through a lookup table, so the cost
+does not grow with Python work per box.
+"""
+
+import numpy as np
+
+# One row per detected box
+DETECTION_DTYPE = np.dtype([
+    ('cls', np.int16),
+    ('conf', np.float32),
+    ('xyxy', np.float32, (4,)),
+])
+
+DEFAULT_VALID_CLASSES = ('breakage', 'crack', 'scratch')
+
+
+def build_threshold_table(names, class_thresholds=None, default=0.6,
+                          valid_classes=DEFAULT_VALID_CLASSES):
+    """
+    Alert threshold per class id. Classes outside `valid_classes` get +inf so
+    they can never raise an alert; `class_thresholds` ({name: conf}) overrides
+    `default` for individual classes.
+    """
+    class_thresholds = {k.lower(): float(v) for k, v in (class_thresholds or {}).items()}
+    valid = {c.lower() for c in valid_classes}
+    ids = names.keys() if isinstance(names, dict) else range(len(names))
+    table = np.full(max(ids) + 1, np.inf, dtype=np.float32)
+    for i in ids:
+        name = str(names[i]).lower()
+        if name in valid:
+            table[i] = class_thresholds.get(name, default)
+    return table
+
+
+def extract_detections(result):
+    """All boxes of one result as a DETECTION_DTYPE array"""
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return np.empty(0, dtype=DETECTION_DTYPE)
+
+    # boxes.data is [n, 6] (xyxy, conf, cls) or [n, 7] with a track id before conf;
+    # a tensor for local models, already NumPy for inference_server results
+    data = boxes.data
+    if not isinstance(data, np.ndarray):
+        data = data.cpu().numpy()
+    records = np.empty(len(data), dtype=DETECTION_DTYPE)
+    records['xyxy'] = data[:, :4]
+    records['conf'] = data[:, -2]
+    records['cls'] = data[:, -1]
+    return records
+
+
+def alert_mask(records, thresholds):
+    """Boolean mask of boxes at or above their class threshold"""
+    return records['conf'] >= thresholds[records['cls']]
+
+
+def summarize_alerts(records, alert, names):
+    """(defects_found, max_conf, detected_types) for the alerting boxes, most confident first"""
+    hits = records[alert]
+    if len(hits) == 0:
+        return 0, 0.0, []
+    order = np.argsort(-hits['conf'], kind='stable')
+    detected_types = [names[int(c)] for c in hits['cls'][order]]
+    return len(hits), float(hits['conf'][order[0]]), detected_types
+
+
+def class_summary(records, names):
+    """Per-class (count, max conf) for printing, computed without a per-box loop"""
+    if len(records) == 0:
+        return {}
+    n = len(names)
+    counts = np.bincount(records['cls'], minlength=n)
+    max_conf = np.zeros(n, dtype=np.float32)
+    np.maximum.at(max_conf, records['cls'], records['conf'])
+    return {names[i]: (int(counts[i]), float(max_conf[i])) for i in np.nonzero(counts)[0]}
+
+
+def process_results(results, names, thresholds=None):
+    """
+    Count defects above their class alert threshold.
+    Returns (records, defects_found, max_conf, detected_types) for the first result,
+    where records is the structured array of all boxes.
+    """
+    if thresholds is None:
+        thresholds = build_threshold_table(names)
+    records = extract_detections(results[0]) if results else np.empty(0, dtype=DETECTION_DTYPE)
+    defects_found, max_conf, detected_types = summarize_alerts(records, alert_mask(records, thresholds), names)
+    return records, defects_found, max_conf, detected_types
@@ -0,0 +1,146 @@
+"""
+Per-frame Trace Profiling
+Records a span for every pipeline stage of a frame (with process and thread
+ids) and exports them as Chrome trace-event JSON, viewable in
+chrome://tracing or https://ui.perfetto.dev. Sampling 1 in N frames keeps the
+overhead low enough to leave on in production.
+"""
+
+import os
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+from metrics import STAGE_SECONDS
+
+
+def _now_us():
+    return time.perf_counter_ns() / 1000
+
+
+class Tracer:
+    """
+    Collects trace events in a bounded buffer. Spans are only recorded while a
+    sampled frame is open (see frame()); everything else costs one flag check.
+    """
+
+    def __init__(self, enabled=False, sample_every=1, max_events=200_000):
+        self.enabled = enabled
+        self.sample_every = max(1, int(sample_every))
+        self.pid = os.getpid()
+        self._events = deque(maxlen=max_events)
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._active = False
+        self._frame = None
+        self._frames = 0
+
+    def configure(self, enabled=True, sample_every=1):
+        self.enabled = enabled
+        self.sample_every = max(1, int(sample_every))
+
+    @property
+    def active(self):
+        return self._active
+
+    def _record(self, event):
+        tid = threading.get_ident()
+        event['pid'] = self.pid
+        event['tid'] = tid
+        with self._lock:
+            if tid not in self._threads:
+                self._threads[tid] = threading.current_thread().name
+            self._events.append(event)
+
+    def begin_frame(self, index=None, **args):
+        """
+        Start an inspection cycle (closing the previous one if still open).
+        Returns True if this frame is sampled and its stages will be traced.
+        """
+        self.end_frame()
+        self._frames += 1
+        if not self.enabled or (self._frames - 1) % self.sample_every:
+            return False
+        args['frame'] = self._frames if index is None else index
+        self._frame = (_now_us(), args)
+        self._active = True
+        return True
+
+    def end_frame(self):
+        """Close the current frame span (no-op if none is open)"""
+        if not self._active:
+            return
+        self._active = False
+        start, args = self._frame
+        self._record({'name': 'frame', 'ph': 'X', 'ts': start, 'dur': _now_us() - start,
+                      'cat': 'frame', 'args': args})
+
+    @contextmanager
+    def frame(self, index=None, **args):
+        """begin_frame()/end_frame() around the with-block"""
+        try:
+            yield self.begin_frame(index, **args)
+        finally:
+            self.end_frame()
+
+    @contextmanager
+    def span(self, name, **args):
+        """Complete ('X') event around the with-block"""
+        if not self._active:
+            yield
+            return
+        start = _now_us()
+        try:
+            yield
+        finally:
+            self._record({'name': name, 'ph': 'X', 'ts': start, 'dur': _now_us() - start,
+                          'cat': 'pipeline', 'args': args})
+
+    def add_span(self, name, start_us, dur_us, **args):
+        """Span measured elsewhere (e.g. ultralytics' own per-stage timings)"""
+        if self._active:
+            self._record({'name': name, 'ph': 'X', 'ts': start_us, 'dur': dur_us,
+                          'cat': 'pipeline', 'args': args})
+
+    def instant(self, name, **args):
+        if self._active:
+            self._record({'name': name, 'ph': 'i', 's': 't', 'ts': _now_us(), 'args': args})
+
+    def save(self, path):
+        """Write the trace as Chrome trace-event JSON; returns the number of events"""
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+        meta = [{'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': name}}
+                for tid, name in threads.items()]
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': meta + events, 'displayTimeUnit': 'ms'}, f)
+        return len(events)
+
+
+# Process-wide tracer; disabled until configure() is called (--profile)
+TRACER = Tracer()
+
+
+@contextmanager
+def stage(name, **args):
+    """Time one pipeline stage into the metrics histogram and, for sampled frames, the trace"""
+    with STAGE_SECONDS.time(stage=name), TRACER.span(name, **args):
+        yield
+
+
+def trace_predict(result, start_us):
+    """Child spans for ultralytics' preprocess / inference / postprocess timings of one result"""
+    if not TRACER.active or result is None:
+        return
+    t = start_us
+    for key, name in (('preprocess', 'model.preprocess'), ('inference', 'model.forward'),
+                      ('postprocess', 'model.nms')):
+        dur = (result.speed.get(key) or 0.0) * 1000
+        TRACER.add_span(name, t, dur)
+        t += dur
@@ -0,0 +1,211 @@
+"""
+Structured Channel Pruning
+Removes low-importance channels from best.pt until a MAC or CPU latency
+budget is met, fine-tunes on the project dataset to recover accuracy and
+saves a checkpoint that loads with YOLO(). A sweep over several sparsity
+levels gives the latency/accuracy curve measured on this machine.
+
+Requires torch-pruning (pip install torch-pruning).
+"""
+
+import csv
+import time
+import argparse
+from copy import deepcopy
+from pathlib import Path
+
+import torch
+from ultralytics import YOLO
+from ultralytics.nn.modules import C2f, Detect
+
+try:
+    import torch_pruning as tp
+except ImportError:
+    tp = None
+
+
+def ignored_layers(net):
+    """
+    Layers whose output channels must stay intact: the Detect head (fixed
+    box/class layout) and the C2f input convs, whose output is chunked into two
+    equal halves. Everything else - C2f bottlenecks and outputs, SPPF and the
+    plain strided convs - is pruned together with its dependents.
+    """
+    layers = [m for m in net.modules() if isinstance(m, Detect)]
+    layers += [m.cv1 for m in net.modules() if isinstance(m, C2f)]
+    return layers
+
+
+def model_cost(net, imgsz):
+    """(MACs, parameters) for one image"""
+    example = torch.zeros(1, 3, imgsz, imgsz)
+    macs, params = tp.utils.count_ops_and_params(net, example)
+    return macs, params
+
+
+@torch.inference_mode()
+def measure_latency(net, imgsz, runs=30):
+    """Median CPU forward latency (ms) of a single image"""
+    net = deepcopy(net).float().eval()
+    x = torch.zeros(1, 3, imgsz, imgsz)
+    for _ in range(3):
+        net(x)
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        net(x)
+        times.append((time.perf_counter() - t0) * 1000)
+    return sorted(times)[len(times) // 2]
+
+
+def prune_model(net, ratio, imgsz, target_macs=None, target_latency=None, steps=10):
+    """
+    Prune `net` in place in `steps` increments up to `ratio` of each layer's
+    channels, stopping early once the MAC fraction or latency budget is met.
+    Returns the achieved MAC fraction.
+    """
+    net.float().train()
+    for p in net.parameters():
+        p.requires_grad_(True)
+
+    example = torch.zeros(1, 3, imgsz, imgsz)
+    base_macs, _ = model_cost(net, imgsz)
+    pruner = tp.pruner.MagnitudePruner(
+        net, example,
+        importance=tp.importance.GroupMagnitudeImportance(p=2),
+        pruning_ratio=ratio,
+        iterative_steps=steps,
+        ignored_layers=ignored_layers(net),
+        round_to=8,
+    )
+
+    macs = base_macs
+    for step in range(steps):
+        pruner.step()
+        macs, params = model_cost(net, imgsz)
+        fraction = macs / base_macs
+        latency = measure_latency(net, imgsz, runs=10) if target_latency else None
+        print(f"   step {step + 1}/{steps}: {fraction:.0%} MACs, {params / 1e6:.2f}M params"
+              + (f", {latency:.1f} ms" if latency else ""))
+        if target_macs and fraction <= target_macs:
+            break
+        if target_latency and latency <= target_latency:
+            break
+    return macs / base_macs
+
+
+def finetune(weights, net, data, epochs, project, name, train_args=None):
+    """Fine-tune a pruned network and return the path of its best checkpoint"""
+    from ultralytics.models.yolo.detect import DetectionTrainer
+    from train import TRAIN_ARGS
+
+    class PrunedTrainer(DetectionTrainer):
+        # The default trainer rebuilds the model from its YAML, which would
+        # restore the original channel counts; train the pruned graph instead.
+        def get_model(self, cfg=None, weights=None, verbose=True):
+            for p in net.parameters():
+                p.requires_grad_(True)
+            return net
+
+    args = dict(TRAIN_ARGS, data=data, epochs=epochs, warmup_epochs=1.0, device='cpu',
+                project=str(project), name=name, exist_ok=True, plots=False)
+    args.update(train_args or {})
+
+    model = YOLO(weights)
+    model.model = net
+    model.train(trainer=PrunedTrainer, **args)
+    return Path(model.trainer.save_dir) / "weights" / "best.pt"
+
+
+def prune_and_finetune(weights, ratio, data, imgsz, epochs, project, target_macs=None,
+                       target_latency=None):
+    """One operating point: prune a fresh copy of `weights`, fine-tune, evaluate"""
+    from distill import evaluate
+
+    print(f"\n✂️ Pruning {weights} (ratio up to {ratio:.0%})")
+    net = YOLO(weights).model
+    fraction = prune_model(net, ratio, imgsz, target_macs, target_latency)
+    macs, params = model_cost(net, imgsz)
+    latency = measure_latency(net, imgsz)
+
+    name = f"ratio_{ratio:.2f}"
+    if epochs:
+        print(f"🔁 Fine-tuning for {epochs} epochs...")
+        best = finetune(weights, net, data, epochs, project, name, train_args={'imgsz': imgsz})
+    else:
+        best = Path(project) / name / "weights" / "pruned.pt"
+        best.parent.mkdir(parents=True, exist_ok=True)
+        torch.save({'model': deepcopy(net).half(), 'train_args': {'data': data, 'imgsz': imgsz}}, best)
+    metrics = evaluate(str(best), data, imgsz)
+
+    return {
+        'ratio': ratio,
+        'macs_fraction': round(fraction, 3),
+        'gmacs': round(macs / 1e9, 3),
+        'params_m': round(params / 1e6, 3),
+        'latency_ms': round(latency, 2),
+        'mAP50': round(metrics['mAP50'], 4),
+        'mAP50-95': round(metrics['mAP50-95'], 4),
+        'checkpoint': str(best),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Structured channel pruning with fine-tune recovery')
+    parser.add_argument('--weights', default='runs/detect/train/weights/best.pt', help='Model to prune')
+    parser.add_argument('--data', default='data.yaml', help='Dataset config for fine-tuning')
+    parser.add_argument('--imgsz', type=int, default=640, help='Image size for cost/latency')
+    parser.add_argument('--ratios', type=float, nargs='+', default=[0.1, 0.2, 0.3, 0.4, 0.5],
+                        help='Sparsity levels for the latency/accuracy curve')
+    parser.add_argument('--target-macs', type=float, default=None,
+                        help='Prune until MACs drop to this fraction of the original (e.g. 0.5)')
+    parser.add_argument('--target-latency', type=float, default=None,
+                        help='Prune until CPU latency drops to this many ms')
+    parser.add_argument('--max-ratio', type=float, default=0.7, help='Upper bound for budget pruning')
+    parser.add_argument('--epochs', type=int, default=20, help='Fine-tuning epochs per level (0 to skip)')
+    parser.add_argument('--project', default='runs/prune', help='Output directory')
+    args = parser.parse_args()
+
+    if tp is None:
+        print("❌ torch-pruning is not installed. Run: pip install torch-pruning")
+        return 1
+
+    from distill import evaluate
+    base_net = YOLO(args.weights).model
+    base_metrics = evaluate(args.weights, args.data, args.imgsz)
+    base = {
+        'ratio': 0.0, 'macs_fraction': 1.0,
+        'gmacs': round(model_cost(deepcopy(base_net).float(), args.imgsz)[0] / 1e9, 3),
+        'params_m': round(sum(p.numel() for p in base_net.parameters()) / 1e6, 3),
+        'latency_ms': round(measure_latency(base_net, args.imgsz), 2),
+        'mAP50': round(base_metrics['mAP50'], 4),
+        'mAP50-95': round(base_metrics['mAP50-95'], 4),
+        'checkpoint': args.weights,
+    }
+
+    if args.target_macs or args.target_latency:
+        rows = [base, prune_and_finetune(args.weights, args.max_ratio, args.data, args.imgsz,
+                                         args.epochs, args.project, args.target_macs,
+                                         args.target_latency)]
+    else:
+        rows = [base] + [prune_and_finetune(args.weights, r, args.data, args.imgsz, args.epochs,
+                                            args.project) for r in args.ratios]
+
+    print(f"\n{'='*72}\n📉 Latency / accuracy curve (CPU, imgsz={args.imgsz})\n{'='*72}")
+    print(f"{'ratio':>6} {'MACs':>6} {'GMACs':>7} {'params':>7} {'latency':>9} {'mAP50':>7} {'mAP50-95':>9}")
+    for r in rows:
+        print(f"{r['ratio']:>6.2f} {r['macs_fraction']:>6.0%} {r['gmacs']:>7.2f} {r['params_m']:>6.2f}M "
+              f"{r['latency_ms']:>7.1f}ms {r['mAP50']:>7.3f} {r['mAP50-95']:>9.3f}")
+
+    out = Path(args.project) / "prune_curve.csv"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"\n📄 Curve saved to: {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,291 @@
+"""
+Shared-memory Frame Ring
+Preallocated frame slots in multiprocessing.shared_memory so a capture process
+can hand frames to the inference process without pickling or copying. One
+writer, any number of readers; every slot carries a sequence counter
+(seqlock: odd while being written) so readers detect a frame that was
+overwritten while they used it, and the writer never waits for readers.
+A reader with a pin word (reader=k) also pins the slot of the frame it last
+got from latest(); the writer skips pinned slots, so that frame stays intact
+however long inference takes.
+"""
+
+import os
+import time
+import signal
+import multiprocessing as mp
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# meta: head frame id, slot count, bytes per slot, closed flag, writer pid, head slot,
+# then one pin word per reader (pinned slot + 1, 0 = none)
+META_WORDS = 16
+PIN_WORD = 8
+MAX_READERS = META_WORDS - PIN_WORD
+SLOT_DTYPE = np.dtype([
+    ('seq', '<u8'),
+    ('frame_id', '<u8'),
+    ('timestamp', '<f8'),
+    ('shape', '<u4', (3,)),
+    ('pad', '<u4'),
+])
+HEADER_BYTES = META_WORDS * 8
+
+Frame = namedtuple('Frame', ['image', 'frame_id', 'timestamp', 'slot', 'seq'])
+
+
+def _align(n, to=64):
+    return (n + to - 1) // to * to
+
+
+class FrameRing:
+    """
+    Ring of `slots` frames of at most `max_shape` (uint8). create=True allocates
+    the segment (the creator should unlink() it at the end); otherwise attaches
+    to an existing segment by name. `reader` (0..MAX_READERS-1, one per reading
+    process) enables pinning of the frame returned by latest().
+    """
+
+    def __init__(self, name=None, slots=8, max_shape=(1080, 1920, 3), create=False, reader=None):
+        if create:
+            slot_bytes = _align(int(np.prod(max_shape)))
+            size = self._layout(slots, slot_bytes)[-1]
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self._map(slots, slot_bytes)
+            self._meta[:] = 0
+            self._meta[1:3] = (slots, slot_bytes)
+            self._slots[:] = np.zeros(slots, dtype=SLOT_DTYPE)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            meta = np.ndarray((META_WORDS,), dtype='<u8', buffer=self.shm.buf)
+            self._map(int(meta[1]), int(meta[2]))
+        self.name = self.shm.name
+        self._write_slot = None
+        self._write_next = 0
+        if reader is not None and not 0 <= reader < min(MAX_READERS, self.n_slots - 1):
+            raise ValueError(f"reader must be in 0..{min(MAX_READERS, self.n_slots - 1) - 1} for {self.n_slots} slots")
+        self.reader = reader
+
+    @staticmethod
+    def _layout(slots, slot_bytes):
+        slots_off = HEADER_BYTES
+        data_off = _align(slots_off + slots * SLOT_DTYPE.itemsize)
+        return slots_off, data_off, data_off + slots * slot_bytes
+
+    def _map(self, slots, slot_bytes):
+        slots_off, data_off, _ = self._layout(slots, slot_bytes)
+        self.n_slots = slots
+        self.slot_bytes = slot_bytes
+        self._meta = np.ndarray((META_WORDS,), dtype='<u8', buffer=self.shm.buf)
+        self._slots = np.ndarray((slots,), dtype=SLOT_DTYPE, buffer=self.shm.buf, offset=slots_off)
+        self._data = np.ndarray((slots, slot_bytes), dtype=np.uint8, buffer=self.shm.buf, offset=data_off)
+
+    @property
+    def head(self):
+        """Id of the newest published frame (0 = none yet)"""
+        return int(self._meta[0])
+
+    @property
+    def closed(self):
+        return bool(self._meta[3])
+
+    def _pinned(self, slot):
+        return bool(np.any(self._meta[PIN_WORD:] == slot + 1))
+
+    # --- writer (capture process) ---
+    def begin_write(self, shape):
+        """Claim the next slot and return a writable view of `shape`; call publish() or abort()"""
+        if int(np.prod(shape)) > self.slot_bytes:
+            raise ValueError(f"frame {shape} does not fit a {self.slot_bytes}-byte slot")
+        # Next slot no reader has pinned. Claim it (odd seq) before re-checking the
+        # pins: a reader pins before re-checking seq, so one of the two sees the other
+        for _ in range(2 * self.n_slots):
+            slot = self._write_next
+            self._write_next = (slot + 1) % self.n_slots
+            if self._pinned(slot):
+                continue
+            header = self._slots[slot]
+            header['seq'] += 1                      # odd: being written
+            if not self._pinned(slot):
+                break
+            header['seq'] -= 1                      # pinned meanwhile; its data is untouched
+        else:
+            raise RuntimeError("every ring slot is pinned by a reader")
+        header['shape'] = shape
+        self._write_slot = slot
+        return self._data[slot, :int(np.prod(shape))].reshape(shape)
+
+    def publish(self, timestamp=None):
+        """Make the frame written since begin_write() visible; returns its id"""
+        slot = self._write_slot
+        header = self._slots[slot]
+        frame_id = self.head + 1
+        header['frame_id'] = frame_id
+        header['timestamp'] = time.time() if timestamp is None else timestamp
+        header['seq'] += 1                          # even: stable
+        self._meta[5] = slot
+        self._meta[0] = frame_id
+        self._write_slot = None
+        return frame_id
+
+    def abort(self):
+        """Give up on the claimed slot (its old frame is invalidated)"""
+        if self._write_slot is not None:
+            self._slots[self._write_slot]['seq'] += 1
+            self._write_slot = None
+
+    def write(self, frame, timestamp=None):
+        """Copy an existing array into the ring (for sources that can't decode in place)"""
+        np.copyto(self.begin_write(frame.shape), frame)
+        return self.publish(timestamp)
+
+    # --- readers ---
+    def latest(self, after=0, timeout=None, poll=0.001):
+        """
+        Newest frame with id > `after` as a zero-copy Frame, or None on timeout /
+        close. With a reader pin the frame stays valid until the next latest()
+        or unpin(); without one, check is_valid() after using it.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            head = self.head
+            if head > after:
+                slot = int(self._meta[5])
+                header = self._slots[slot]
+                seq = int(header['seq'])
+                if seq % 2 == 0 and int(header['frame_id']) == head:
+                    if self.reader is not None:
+                        self._meta[PIN_WORD + self.reader] = slot + 1
+                    shape = tuple(int(v) for v in header['shape'])
+                    image = self._data[slot, :int(np.prod(shape))].reshape(shape)
+                    frame = Frame(image, head, float(header['timestamp']), slot, seq)
+                    if int(self._slots[slot]['seq']) == seq:
+                        return frame
+                # Caught the writer mid-publish; try again shortly
+                time.sleep(poll)
+                continue
+            if self.closed or (deadline is not None and time.monotonic() >= deadline):
+                return None
+            time.sleep(poll)
+
+    def unpin(self):
+        """Release the pinned frame so the writer can reuse its slot"""
+        if self.reader is not None:
+            self._meta[PIN_WORD + self.reader] = 0
+
+    def is_valid(self, frame):
+        """True if the writer has not started reusing the frame's slot"""
+        return int(self._slots[frame.slot]['seq']) == frame.seq
+
+    def lag(self, frame):
+        """Frames published since `frame`; the writer laps a reader at n_slots"""
+        return self.head - frame.frame_id
+
+    def mark_closed(self):
+        self._meta[3] = 1
+
+    def close(self):
+        self.unpin()
+        # Drop our views before closing the mapping
+        self._meta = self._slots = self._data = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+def _open_camera(config):
+    import cv2
+    timeout_ms = int(config.get('read_timeout_seconds', 5) * 1000)
+    cap = cv2.VideoCapture(config['ip_camera_url'], cv2.CAP_ANY,
+                           [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, timeout_ms,
+                            cv2.CAP_PROP_READ_TIMEOUT_MSEC, timeout_ms])
+    if not cap.isOpened():
+        cap.release()
+        return None
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap
+
+
+def capture_process(config, ring_name, stop):
+    """
+    Capture process body: decode camera frames straight into ring slots.
+    OpenCV's read(image=...) fills the slot view in place while the frame
+    size is unchanged; a size change costs one copy and the next frames are
+    in place again.
+    """
+    from camera_health import Backoff
+
+    # Ctrl+C is handled by the parent, which stops us through `stop`
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ring = FrameRing(ring_name)
+    backoff = Backoff(config.get('backoff_initial_seconds', 1), config.get('backoff_max_seconds', 60))
+    ring._meta[4] = os.getpid()
+    url = config['ip_camera_url']
+    cap, shape = None, None
+    try:
+        while not stop.is_set():
+            if cap is None:
+                cap = _open_camera(config)
+                if cap is None:
+                    print(f"⚠ Capture process: cannot open {url}, retrying")
+                    stop.wait(backoff.next())
+                    continue
+                backoff.reset()
+                print(f"📷 Capture process: streaming {url} into shared memory")
+
+            if shape is None:
+                ok, first = cap.read()
+                if ok:
+                    shape = first.shape
+                    ring.write(first)
+                else:
+                    cap.release()
+                    cap = None
+                continue
+
+            view = ring.begin_write(shape)
+            ok, out = cap.read(image=view)
+            if not ok:
+                ring.abort()
+                cap.release()
+                cap = None
+                continue
+            if out.shape != shape or out.ctypes.data != view.ctypes.data:
+                # Frame size changed: OpenCV allocated a new buffer
+                ring.abort()
+                shape = out.shape
+                ring.write(out)
+                continue
+            ring.publish()
+    finally:
+        if cap is not None:
+            cap.release()
+        ring.mark_closed()
+        ring.close()
+
+
+def start_capture_process(config, slots=8, max_shape=(1080, 1920, 3)):
+    """
+    Create a ring and start capture_process() for it; returns (ring, process, stop_event).
+    The returned ring is reader 0: the frame from its latest() is pinned.
+    """
+    ring = FrameRing(slots=slots, max_shape=max_shape, create=True, reader=0)
+    ctx = mp.get_context('spawn')
+    stop = ctx.Event()
+    proc = ctx.Process(target=capture_process, args=(dict(config), ring.name, stop),
+                       name='capture', daemon=True)
+    proc.start()
+    return ring, proc, stop
+
+
+def stop_capture_process(ring, proc, stop, timeout=5):
+    """Stop the capture process and free the shared memory"""
+    stop.set()
+    proc.join(timeout)
+    if proc.is_alive():
+        proc.terminate()
+    ring.close()
+    ring.unlink()
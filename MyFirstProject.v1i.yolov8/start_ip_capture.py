@@ -4,7 +4,6 @@ Simplified version for easy usage
 """
 
 import sys
-from ip_camera_capture import IPCameraCapture
 
 def main():
     print("=" * 60)
@@ -22,7 +21,8 @@ def main():
         print("Cancelled.")
         return 0
     
-    # Initialize and start
+    # Initialize and start (imported only now; loads OpenCV and the model)
+    from ip_camera_capture import IPCameraCapture
     capture = IPCameraCapture()
     
     try:
@@ -3,20 +3,25 @@ Faulty Rings Detection - Main Test Script
 Integrates YOLOv8 with Firebase for Real-time Dashboard
 """
 
-import cv2
 import time
 import argparse
 import sys
-import os
-import base64
 from pathlib import Path
-from ultralytics import YOLO
-from glob import glob
 from datetime import datetime
 
 # --- IMPORT CUSTOM MODULES ---
-from ip_camera_capture import IPCameraCapture
+# Kept light: OpenCV, ultralytics, firebase_admin and pyarrow are imported on
+# first use, so `--help` and startup don't pay for them (see check_import_time.py)
 from cloud_client import CloudClient
+from detection_log import DetectionLog
+from tracker import DefectTracker
+from gallery import faults_dir, write_sidecar
+from model_registry import get_model
+from metrics import (FRAMES_CAPTURED, FRAMES_INFERRED, FRAMES_SKIPPED, DEFECTS, QUEUE_DEPTH, LAST_FRAME,
+                     start_http_server)
+from profiling import TRACER, stage, trace_predict
+from postprocess import (build_threshold_table, extract_detections, alert_mask,
+                         process_results, class_summary)
 
 # --- IMPORT CONFIGURATION ---
 try:
@@ -26,6 +31,12 @@ except ImportError:
     print("Please ensure you have created the configuration file.")
     sys.exit(1)
 
+VALID_CLASSES = ['breakage', 'crack', 'scratch']
+# We use a slightly higher threshold (0.6) for cloud alerts
+# to prevent false alarms on the dashboard. Per-class overrides come from
+# class_thresholds in ip_camera_config.yaml.
+ALERT_CONF = 0.6
+
 def print_summary(results, capture_count):
     """Prints a clean summary of what was detected locally."""
     print(f"\n--- Capture #{capture_count} Summary ---")
@@ -34,32 +45,95 @@ def print_summary(results, capture_count):
         return
 
     for result in results:
-        if result.boxes:
-            for box in result.boxes:
-                cls_name = result.names[int(box.cls[0])]
-                conf = float(box.conf[0])
-                print(f" • {cls_name}: {conf:.1%} confidence")
+        for cls_name, (count, conf) in class_summary(extract_detections(result), result.names).items():
+            print(f" • {cls_name}: {count}x, up to {conf:.1%} confidence")
     print("--------------------------------")
 
-def run_detection_system(model, source, conf_threshold, interval):
+def report_track(client, track):
+    """Push a tracked defect's latest first/last-seen, frame count and peak to its event"""
+    if client and client.connected and track.event_key:
+        fields = track.event_fields()
+        fields["confidence"] = round(track.peak_conf, 2)
+        client.update_detection(track.event_key, fields)
+    track.reported_conf = track.peak_conf
+
+def run_detection_system(model, source, conf_threshold, interval, log_dir="inspection_log", track=False,
+                         metrics_port=None, profile=None, capture_process=False,
+                         config_path="ip_camera_config.yaml", offline=False, select_frames=False,
+                         hot_swap_path=None, cascade=False, metrics_addr='127.0.0.1'):
+    import cv2
+    from ip_camera_capture import IPCameraCapture
+
     print("\n" + "="*60)
     print("🚀 STARTING RING DETECTION SYSTEM")
     print(f"📡 Database: {FIREBASE_DATABASE_URL}")
     print("="*60)
 
+    if metrics_port:
+        try:
+            start_http_server(metrics_port, metrics_addr)
+            print(f"📈 Metrics: http://{metrics_addr}:{metrics_port}/metrics")
+        except OSError as e:
+            print(f"⚠ Metrics endpoint disabled: {e}")
+
     # 1. Initialize Cloud Connection
     client = None
     try:
-        client = CloudClient(SERVICE_ACCOUNT_KEY_PATH, FIREBASE_DATABASE_URL)
-        client.update_system_status(is_active=True)
-        print("✅ Firebase Connected Successfully!")
+        if offline:
+            print("📴 OFFLINE mode (--offline): nothing is sent to Firebase.")
+        else:
+            client = CloudClient(SERVICE_ACCOUNT_KEY_PATH, FIREBASE_DATABASE_URL)
+            client.update_system_status(is_active=True)
+            print("✅ Firebase Connected Successfully!")
     except Exception as e:
         print(f"⚠ Firebase connection failed: {e}")
         print("⚠ System will run in OFFLINE mode.")
 
     # 2. Initialize Camera
-    capture = IPCameraCapture(config_path="ip_camera_config.yaml")
+    # Shares the already loaded model instead of loading model_path a second time
+    capture = IPCameraCapture(config_path=config_path, model=model)
+    camera_name = capture.config['ip_camera_url'] if source == 'ip_camera' else str(source)
+
+    # Cheap screening pass first; the full model only sees flagged frames
+    if cascade and capture.cascade is None:
+        capture.set_cascade(True)
+
+    # Alert threshold per class id, looked up once per frame for all boxes
+    thresholds = build_threshold_table(model.names, capture.config.get('class_thresholds'),
+                                       capture.config.get('alert_confidence', ALERT_CONF), VALID_CLASSES)
+
+    # Frames worth labeling go to the labeling queue (frame_selection.py)
+    selector = None
+    if select_frames:
+        from frame_selection import FrameSelector
+        selector = FrameSelector.from_config(capture.config)
+        print(f"🏷 Selecting frames for labeling into: {selector.queue_dir}")
+    # Predict low enough for the selector to see uncertain boxes; alerts still use conf_threshold
+    predict_conf = min(conf_threshold, selector.low_conf) if selector else conf_threshold
+
+    # Reload hot_swap_path in the background when it changes (or on SIGHUP), swap between frames
+    swapper = None
+    if hot_swap_path:
+        from hot_swap import ModelSwapper
+        swapper = ModelSwapper.from_config(hot_swap_path, model, capture.config, conf_threshold, thresholds,
+                                           log_path=Path(log_dir) / "model_swaps.jsonl" if log_dir else None)
+        if not swapper.start():
+            swapper = None
+
+    # Local inspection log (every frame, OK or defect)
+    event_log = None
+    if log_dir:
+        try:
+            event_log = DetectionLog(log_dir)
+            print(f"🗂 Logging inspections to: {Path(log_dir).absolute()}")
+        except Exception as e:
+            print(f"⚠ Inspection log disabled: {e}")
     
+    # Collapse repeated sightings of the same defect into one event
+    tracker = DefectTracker() if track else None
+    if tracker:
+        print("🔗 Tracking enabled: one cloud event per physical defect")
+
     # 3. Prepare image list if source is a directory
     image_files = []
     if source != 'ip_camera':
@@ -81,33 +155,60 @@ def run_detection_system(model, source, conf_threshold, interval):
             # Single image file
             image_files = [source_path]
     
-    if source == 'ip_camera':
+    ring = None
+    if source == 'ip_camera' and (capture_process or capture.config.get('capture_process')):
+        # Decoding runs in its own process; frames arrive through shared memory
+        ring = capture.start_capture_process()
+    elif source == 'ip_camera':
+        # Connects (and later reconnects) in the background with backoff
         print("📷 Connecting to IP Camera...")
-        capture.connect_camera()
+        capture.start_monitor(wait=capture.config['read_timeout_seconds'])
     
     capture_count = 0
-    valid_classes = ['breakage', 'crack', 'scratch']
     
     # Create directory for saving detected images
-    detections_dir = Path("detected_faults")
+    # Same place the dashboard's local gallery looks (gallery.py), whatever the working directory
+    detections_dir = faults_dir()
     detections_dir.mkdir(exist_ok=True)
     print(f"💾 Saving detected faults to: {detections_dir.absolute()}")
 
     try:
         while True:
             capture_count += 1
+            TRACER.begin_frame(capture_count)
+            if swapper:
+                model = capture.model = swapper.active()
+                if capture.cascade:
+                    capture.cascade.model = model
             
             # --- CAPTURE FRAME ---
             frame = None
-            if source == 'ip_camera':
-                if not capture.cap or not capture.cap.isOpened():
-                    print("⚠ Camera disconnected. Reconnecting...")
-                    capture.connect_camera()
-                    time.sleep(2)
+            source_file = None
+            if ring is not None:
+                try:
+                    with stage('capture'):
+                        frame = capture.capture_frame()
+                except RuntimeError as e:
+                    print(f"⚠ {e}")
+                    FRAMES_SKIPPED.inc(source=camera_name, reason='no_frame')
+                    TRACER.end_frame()
                     continue
-                ret, frame = capture.cap.read()
+                QUEUE_DEPTH.set(ring.lag(capture.last_frame), queue='frame_ring')
+            elif source == 'ip_camera':
+                health = capture.health
+                if not health.usable:
+                    # Reconnect runs in the health worker; wait for it instead of retrying here
+                    print(f"⚠ Camera {health.state}. Waiting for reconnect...")
+                    FRAMES_SKIPPED.inc(source=camera_name, reason=health.state)
+                    TRACER.end_frame()
+                    health.wait_connected(timeout=max(interval, 1))
+                    continue
+                with stage('capture'):
+                    ret, frame = health.read()
                 if not ret:
-                    print("⚠ Empty frame received.")
+                    print(f"⚠ No frame received (camera {health.state}).")
+                    FRAMES_SKIPPED.inc(source=camera_name, reason='empty_frame')
+                    TRACER.end_frame()
                     time.sleep(1)
                     continue
             else:
@@ -116,43 +217,84 @@ def run_detection_system(model, source, conf_threshold, interval):
                     print(f"\n✅ Finished processing all {len(image_files)} images")
                     break
                 
-                image_path = image_files[capture_count - 1]
-                frame = cv2.imread(str(image_path))
+                source_file = image_files[capture_count - 1]
+                with stage('capture'):
+                    frame = cv2.imread(str(source_file))
                 if frame is None:
-                    print(f"❌ Could not load image: {image_path}")
+                    print(f"❌ Could not load image: {source_file}")
+                    FRAMES_SKIPPED.inc(source=camera_name, reason='unreadable')
                     continue
+            FRAMES_CAPTURED.inc(source=camera_name)
 
             # --- RUN INFERENCE ---
             # verbose=False keeps the terminal clean
-            results = model.predict(source=frame, conf=conf_threshold, save=False, verbose=False)
+            t_start = time.perf_counter()
+            with stage('inference'):
+                results = (capture.cascade or model).predict(source=frame, conf=predict_conf, save=False, verbose=False)
+            latency_ms = (time.perf_counter() - t_start) * 1000
+            trace_predict(results[0] if results else None, t_start * 1e6)
+            FRAMES_INFERRED.inc(source=camera_name)
+            LAST_FRAME.set(time.time(), source=camera_name)
 
             # --- PROCESS RESULTS ---
-            max_conf = 0.0
-            defects_found = 0
-            detected_types = []
-
-            for result in results:
-                for box in result.boxes:
-                    cls_name = model.names[int(box.cls[0])]
-                    conf = float(box.conf[0])
-                    
-                    if cls_name.lower() in valid_classes:
-                        # We use a slightly higher threshold (0.6) for cloud alerts 
-                        # to prevent false alarms on the dashboard
-                        if conf >= 0.6:
-                            defects_found += 1
-                            detected_types.append(cls_name)
-                            if conf > max_conf:
-                                max_conf = conf
+            with stage('postprocess'):
+                candidates = None
+                if predict_conf < conf_threshold and results:
+                    # Boxes below --conf are only for frame selection
+                    candidates = extract_detections(results[0])
+                    results = [r[r.boxes.conf >= conf_threshold] for r in results]
+                records, defects_found, max_conf, detected_types = process_results(results, model.names, thresholds)
+
+            # --- FRAME SELECTION ---
+            reasons = []
+            if selector:
+                with stage('select'):
+                    reasons = selector.reasons(records if candidates is None else candidates, frame)
+
+            # Ring frames are borrowed: keep a private copy for plotting/saving, and
+            # drop the result if the capture process reused the slot meanwhile
+            if ring is not None:
+                if defects_found or reasons:
+                    frame = frame.copy()
+                    if results:
+                        results[0].orig_img = frame
+                if not ring.is_valid(capture.last_frame):
+                    print("⚠ Frame overwritten during inference (capture lapped the ring), skipping")
+                    FRAMES_SKIPPED.inc(source=camera_name, reason='overwritten')
+                    TRACER.end_frame()
+                    continue
+            if defects_found:
+                DEFECTS.inc(source=camera_name)
+            if swapper:
+                swapper.observe(frame, records, latency_ms, defects_found)
+            if reasons:
+                with stage('select_save'):
+                    queued = selector.save(frame, records if candidates is None else candidates, reasons)
+                print(f"   🏷 Queued for labeling ({', '.join(reasons)}): {queued.name}")
+
+            # --- TRACKING ---
+            started = None
+            if tracker:
+                with stage('track'):
+                    started, updated, closed = tracker.update(records[alert_mask(records, thresholds)])
+                    # Open events only change when the peak confidence rises; final values on close
+                    for t in closed + [t for t in updated if t.peak_conf > t.reported_conf]:
+                        report_track(client, t)
+                QUEUE_DEPTH.set(len(tracker.tracks), queue='open_tracks')
 
             # --- SEND TO CLOUD ---
-            if defects_found > 0:
+            image_path = source_file
+            if defects_found > 0 and started == []:
+                ids = ', '.join(f"#{t.track_id}" for t in tracker.tracks if t.missed == 0)
+                print(f"🔁 Capture #{capture_count}: defect still in view (track {ids})")
+            elif defects_found > 0:
                 # Get the most confident defect type
                 primary_defect = detected_types[0] if detected_types else "defect"
                 print(f"🚨 DEFECT DETECTED: {', '.join(set(detected_types))} ({max_conf:.1%})")
                 
                 # Draw bounding boxes on frame and save annotated image
-                annotated_frame = results[0].plot() if results else frame.copy()
+                with stage('plot'):
+                    annotated_frame = results[0].plot() if results else frame.copy()
                 
                 timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
                 image_filename = f"detected_{primary_defect}_{timestamp_str}.jpg"
@@ -160,35 +302,85 @@ def run_detection_system(model, source, conf_threshold, interval):
                 
                 try:
                     # Save annotated frame with bounding boxes
-                    cv2.imwrite(str(image_path), annotated_frame)
+                    with stage('imwrite'):
+                        cv2.imwrite(str(image_path), annotated_frame)
+                        # Confidence and boxes for the gallery index (not recoverable from the file name)
+                        hits = records[alert_mask(records, thresholds)]
+                        write_sidecar(image_path, unix_timestamp=time.time(), defect_type=primary_defect,
+                                      confidence=round(max_conf, 3), camera=camera_name,
+                                      boxes=[[int(c), round(float(p), 3), [round(float(v), 1) for v in b]]
+                                             for c, p, b in zip(hits['cls'], hits['conf'], hits['xyxy'])])
                     print(f"   💾 Saved: {image_path.name} (with annotations)")
                 except Exception as e:
                     print(f"   ⚠ Could not save image: {e}")
                     image_filename = None
+                    image_path = source_file
                 
                 if client and client.connected:
-                    # Send with the actual defect type detected
-                    client.send_detection(
-                        confidence=round(max_conf, 2), 
-                        ring_count=defects_found,
-                        defect_type=primary_defect,
-                        image_filename=image_filename
-                    )
+                    with stage('upload'):
+                        if tracker:
+                            # One record per newly seen defect, updated while it stays in view
+                            for t in started:
+                                t.event_key = client.send_detection(
+                                    confidence=round(t.peak_conf, 2),
+                                    ring_count=1,
+                                    defect_type=model.names[t.cls],
+                                    image_filename=image_filename,
+                                    extra=t.event_fields()
+                                )
+                                t.reported_conf = t.peak_conf
+                        else:
+                            # Send with the actual defect type detected
+                            client.send_detection(
+                                confidence=round(max_conf, 2), 
+                                ring_count=defects_found,
+                                defect_type=primary_defect,
+                                image_filename=image_filename
+                            )
             else:
                 print(f"✅ Capture #{capture_count}: Ring OK (or no ring)")
 
+            # --- LOCAL LOG ---
+            if event_log:
+                with stage('log'):
+                    event_log.append(
+                        camera=camera_name,
+                        cls=records['cls'],
+                        conf=records['conf'],
+                        xyxy=records['xyxy'],
+                        latency_ms=latency_ms,
+                        image_path=image_path,
+                        defect=defects_found > 0
+                    )
+                QUEUE_DEPTH.set(event_log.pending, queue='inspection_log')
+
             # --- LOCAL DISPLAY (Optional) ---
             # cv2.imshow("Monitor", results[0].plot())
             # if cv2.waitKey(1) == ord('q'): break
 
             # --- WAIT INTERVAL ---
+            TRACER.end_frame()
             time.sleep(interval)
 
     except KeyboardInterrupt:
         print("\n👋 Stopping system...")
     finally:
+        if tracker:
+            for t in tracker.close_all():
+                report_track(client, t)
         if client:
             client.update_system_status(is_active=False)
+        if event_log:
+            event_log.close()
+        if swapper:
+            swapper.stop()
+        if selector:
+            print(f"🏷 Queued for labeling: {selector.summary()}")
+        if capture.cascade:
+            print(f"🪜 Cascade: {capture.cascade.summary()}")
+        if profile:
+            TRACER.end_frame()
+            print(f"🧵 Trace saved: {profile} ({TRACER.save(profile)} events, open in ui.perfetto.dev)")
         capture.cleanup()
         try:
             cv2.destroyAllWindows()
@@ -197,19 +389,44 @@ def run_detection_system(model, source, conf_threshold, interval):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument('--model', default='runs/detect/train/weights/best.pt', help='Path to model weights')
+    parser.add_argument('--model', default='runs/detect/train/weights/best.pt',
+                        help='Path to model weights, or the URL of a running inference_server.py')
     parser.add_argument('--source', default='ip_camera', help='ip_camera or path/to/image.jpg')
     parser.add_argument('--conf', type=float, default=0.5, help='Confidence threshold')
-    parser.add_argument('--interval', type=int, default=5, help='Seconds between checks')
+    parser.add_argument('--interval', type=float, default=5, help='Seconds between checks')
+    parser.add_argument('--ip-config', default='ip_camera_config.yaml', help='IP camera config file')
+    parser.add_argument('--offline', action='store_true', help='Do not connect to Firebase (local log only)')
+    parser.add_argument('--log-dir', default='inspection_log', help='Local inspection log directory ("" to disable)')
+    parser.add_argument('--track', action='store_true', help='One cloud event per physical defect instead of per frame')
+    parser.add_argument('--metrics-port', type=int, default=None, help='Serve Prometheus metrics on this port')
+    parser.add_argument('--metrics-addr', default='127.0.0.1',
+                        help='Metrics bind address (0.0.0.0 to allow scraping from other machines)')
+    parser.add_argument('--profile', default=None, metavar='TRACE.json',
+                        help='Record per-stage spans and save a Chrome/Perfetto trace on exit')
+    parser.add_argument('--profile-sample', type=int, default=1, metavar='N',
+                        help='Trace 1 in N frames (default: every frame)')
+    parser.add_argument('--capture-process', action='store_true',
+                        help='Decode the camera in a separate process (shared-memory frame ring)')
+    parser.add_argument('--hot-swap', action='store_true',
+                        help='Reload --model when the file changes or on SIGHUP (shadow test, swap, rollback)')
+    parser.add_argument('--cascade', action='store_true',
+                        help='Low-res screening pass on every frame, full-res detection only on flagged frames')
+    parser.add_argument('--select-frames', action='store_true',
+                        help='Queue uncertain/novel frames with pre-filled labels in labeling_queue/')
     
     args = parser.parse_args()
+    if args.profile:
+        TRACER.configure(enabled=True, sample_every=args.profile_sample)
 
     # Load Model
     try:
         print(f"📦 Loading Model: {args.model}")
-        model = YOLO(args.model)
+        model = get_model(args.model)
     except Exception as e:
         print(f"❌ Failed to load model: {e}")
         sys.exit(1)
 
-    run_detection_system(model, args.source, args.conf, args.interval)
\ No newline at end of file
+    run_detection_system(model, args.source, args.conf, args.interval, args.log_dir, args.track,
+                         args.metrics_port, args.profile, args.capture_process, args.ip_config, args.offline,
+                         args.select_frames, args.model if args.hot_swap else None,
+                         args.cascade, args.metrics_addr)
\ No newline at end of file
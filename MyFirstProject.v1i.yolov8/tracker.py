@@ -0,0 +1,134 @@
+"""
+Defect Tracker
+Links defect boxes across consecutive frames (IoU, with a centroid-distance
+fallback for rings that move between captures) so one physical defect becomes
+one event with first-seen, last-seen, frame count and peak confidence.
+"""
+
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class Track:
+    track_id: int
+    cls: int
+    box: np.ndarray
+    first_seen: float
+    last_seen: float
+    peak_conf: float
+    frame_count: int = 1
+    missed: int = 0
+    # Set by the caller once the event is uploaded / updated
+    event_key: str = None
+    reported_conf: float = 0.0
+
+    def event_fields(self):
+        """Fields stored on the detection record for this track"""
+        return {
+            "track_id": self.track_id,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "frame_count": self.frame_count,
+            "peak_confidence": round(self.peak_conf, 4),
+        }
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU of [n, 4] and [m, 4] xyxy arrays"""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+class DefectTracker:
+    """
+    Greedy frame-to-frame association of same-class boxes.
+
+    A box joins an open track when IoU >= iou_threshold, or when its centre is
+    within `centroid_distance` track-box diagonals. Tracks not seen for more
+    than `max_missed` consecutive frames are closed.
+    """
+
+    def __init__(self, iou_threshold=0.3, centroid_distance=0.5, max_missed=2):
+        self.iou_threshold = iou_threshold
+        self.centroid_distance = centroid_distance
+        self.max_missed = max_missed
+        self.tracks = []
+        self._next_id = 1
+
+    def _score(self, track_boxes, boxes):
+        """Match score per (track, box): IoU, or a small positive value for a centroid hit"""
+        iou = iou_matrix(track_boxes, boxes)
+        ct = (track_boxes[:, :2] + track_boxes[:, 2:]) / 2
+        cb = (boxes[:, :2] + boxes[:, 2:]) / 2
+        diag = np.linalg.norm(track_boxes[:, 2:] - track_boxes[:, :2], axis=1)
+        dist = np.linalg.norm(ct[:, None, :] - cb[None, :, :], axis=2) / (diag[:, None] + 1e-9)
+        near = dist <= self.centroid_distance
+        return np.where(iou >= self.iou_threshold, iou, np.where(near, 1e-3, 0.0))
+
+    def update(self, records, now=None):
+        """
+        Feed the alerting boxes of one frame (postprocess DETECTION_DTYPE records).
+        Returns (started, updated, closed) lists of Track.
+        """
+        now = time.time() if now is None else now
+        started, updated = [], []
+        matched_tracks = set()
+        unmatched = np.ones(len(records), dtype=bool)
+
+        if self.tracks and len(records):
+            track_boxes = np.stack([t.box for t in self.tracks])
+            score = self._score(track_boxes, records['xyxy'])
+            same_cls = np.array([t.cls for t in self.tracks])[:, None] == records['cls'][None, :]
+            score = np.where(same_cls, score, 0.0)
+
+            # Greedy: best remaining pair first
+            for flat in np.argsort(-score, axis=None):
+                ti, bi = np.unravel_index(flat, score.shape)
+                if score[ti, bi] <= 0:
+                    break
+                if ti in matched_tracks or not unmatched[bi]:
+                    continue
+                matched_tracks.add(ti)
+                unmatched[bi] = False
+
+                track, conf = self.tracks[ti], float(records['conf'][bi])
+                track.box = records['xyxy'][bi].copy()
+                track.last_seen = now
+                track.frame_count += 1
+                track.missed = 0
+                track.peak_conf = max(track.peak_conf, conf)
+                updated.append(track)
+
+        closed, still_open = [], []
+        for i, track in enumerate(self.tracks):
+            if i not in matched_tracks:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    closed.append(track)
+                    continue
+            still_open.append(track)
+        self.tracks = still_open
+
+        for bi in np.nonzero(unmatched)[0]:
+            track = Track(track_id=self._next_id, cls=int(records['cls'][bi]),
+                          box=records['xyxy'][bi].copy(), first_seen=now, last_seen=now,
+                          peak_conf=float(records['conf'][bi]))
+            self._next_id += 1
+            self.tracks.append(track)
+            started.append(track)
+
+        return started, updated, closed
+
+    def close_all(self):
+        """Close every open track (end of run)"""
+        closed, self.tracks = self.tracks, []
+        return closed
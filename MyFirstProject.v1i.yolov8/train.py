@@ -1,30 +1,22 @@
 from ultralytics import YOLO
+import argparse
+import yaml
 import torch
 
-# Check if CUDA is available for GPU acceleration
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"Using device: {device}")
-
-# Load YOLOv8 small model for better accuracy
-# yolov8s.pt provides better accuracy than yolov8n.pt while still being fast
-# For even better accuracy, use: yolov8m.pt (medium) or yolov8l.pt (large)
-print("\n📦 Loading YOLOv8 small model for improved accuracy...")
-model = YOLO("yolov8s.pt")
+from finetune import BEST_MODEL
 
 # Train the model with optimized parameters for maximum accuracy
-print("\n🚀 Starting training with optimized parameters...")
-model.train(
+TRAIN_ARGS = dict(
     data="data.yaml",
     epochs=200,              # Increased epochs for better convergence
     imgsz=640,               # Image size (640 is optimal for YOLOv8)
     batch=16,                # Batch size (adjust based on GPU memory: 8, 16, 32)
-    device=device,            # Use GPU if available, else CPU
     patience=100,             # Early stopping patience (increased for better convergence)
     save=True,
     save_period=10,          # Save checkpoint every N epochs
     # Optimized data augmentation for better generalization
     hsv_h=0.02,              # Hue augmentation (slightly increased)
-    hsv_s=0.7,               # Saturation augmentation  
+    hsv_s=0.7,               # Saturation augmentation
     hsv_v=0.4,               # Value/brightness augmentation
     degrees=15,              # Rotation augmentation (increased for better angle coverage)
     translate=0.15,         # Translation augmentation (increased)
@@ -56,8 +48,70 @@ model.train(
     max_det=300,             # Maximum detections per image
 )
 
-print("\n✅ Training completed!")
-print("📊 Check results in: runs/detect/train/")
-print("🎯 Best model saved at: runs/detect/train/weights/best.pt")
+
+def main():
+    parser = argparse.ArgumentParser(description='Train YOLOv8 on the ring defect dataset')
+    parser.add_argument('--model', default='yolov8s.pt', help='Starting weights')
+    parser.add_argument('--hyp', default=None,
+                        help='YAML of training arguments overriding the defaults (e.g. from hyperparam_search.py)')
+    parser.add_argument('--distill', default=None, metavar='TEACHER_PT',
+                        help='Distill this trained model into --model (e.g. --model yolov8n.pt)')
+    parser.add_argument('--incremental', nargs='+', default=None, metavar='LABELED_DIR',
+                        help='Fine-tune runs/detect/train/weights/best.pt on these newly labeled captures '
+                             '(frozen backbone, short schedule, promoted only if no class regresses)')
+    parser.add_argument('--no-profile', action='store_true',
+                        help='Skip the CPU hardware probe and use the fixed batch/worker settings')
+    args = parser.parse_args()
+
+    # Check if CUDA is available for GPU acceleration
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    print(f"Using device: {device}")
+    train_args = dict(TRAIN_ARGS, device=device)
+
+    if args.hyp:
+        with open(args.hyp) as f:
+            overrides = yaml.safe_load(f) or {}
+        print(f"⚙️ Using hyperparameters from {args.hyp}: {overrides}")
+        train_args.update(overrides)
+
+    # On CPU, pick batch size, workers, caching and threads from a short probe
+    profile = None
+    if device == "cpu" and not args.no_profile:
+        from train_profile import profile_hardware, apply_profile
+        probe_model = BEST_MODEL if args.incremental else args.model
+        profile = profile_hardware(probe_model, train_args['data'], train_args['imgsz'])
+        apply_profile(profile, train_args)
+
+    if args.incremental:
+        from finetune import incremental_finetune
+        # Only what differs from TRAIN_ARGS (device, --hyp, probe) overrides the short fine-tune schedule
+        overrides = {k: v for k, v in train_args.items() if k not in TRAIN_ARGS or TRAIN_ARGS[k] != v}
+        incremental_finetune(args.incremental, BEST_MODEL, train_args['data'], overrides)
+        return
+
+    if args.distill:
+        from distill import train_student, compare_models
+        student_best = train_student(args.distill, args.model, train_args)
+        compare_models(args.distill, student_best, train_args['data'], train_args['imgsz'],
+                       output="distillation_report.json")
+        return
+
+    # Load YOLOv8 small model for better accuracy
+    # yolov8s.pt provides better accuracy than yolov8n.pt while still being fast
+    # For even better accuracy, use: yolov8m.pt (medium) or yolov8l.pt (large)
+    print("\n📦 Loading YOLOv8 small model for improved accuracy...")
+    model = YOLO(args.model)
+    if profile:
+        from train_profile import add_profile_callbacks
+        add_profile_callbacks(model, profile)
+
+    print("\n🚀 Starting training with optimized parameters...")
+    model.train(**train_args)
+
+    print("\n✅ Training completed!")
+    print("📊 Check results in: runs/detect/train/")
+    print("🎯 Best model saved at: runs/detect/train/weights/best.pt")
 
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Hardware-aware CPU Training Profile
+Runs a short probe benchmark and picks batch size, image caching and thread
+settings for train.py from the detected machine. Dataloader workers are
+recorded as the value ultralytics really uses on CPU (0).
+"""
+
+import os
+import time
+import random
+import shutil
+import resource
+import argparse
+from pathlib import Path
+
+import yaml
+
+# Fraction of available RAM the training run may use (model + batch + cache)
+MEMORY_BUDGET = 0.6
+# Batch sizes tried by the probe, smallest first
+PROBE_BATCHES = (4, 8, 16, 32)
+# Mosaic augmentation decodes four images per training sample
+MOSAIC_IMAGES = 4
+
+PROFILE_FILENAME = "hardware_profile.yaml"
+
+# Dataloader workers ultralytics actually uses for CPU training, whatever is requested
+CPU_WORKERS = 0
+
+
+def detect_hardware():
+    """Return usable cores and memory (bytes) for this process"""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+
+    physical = None
+    total = available = None
+    try:
+        import psutil
+        physical = psutil.cpu_count(logical=False)
+        mem = psutil.virtual_memory()
+        total, available = mem.total, mem.available
+    except ImportError:
+        try:
+            with open("/proc/meminfo") as f:
+                info = {line.split(':')[0]: int(line.split()[1]) * 1024 for line in f}
+            total, available = info['MemTotal'], info.get('MemAvailable', info['MemFree'])
+        except (OSError, KeyError, ValueError):
+            total = available = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+
+    return {
+        'cores': cores,
+        'physical_cores': physical or cores,
+        'memory_total': total,
+        'memory_available': available,
+    }
+
+
+def _max_rss():
+    """Peak resident set size of this process in bytes"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if os.uname().sysname == 'Darwin' else rss * 1024
+
+
+def _tensors(out):
+    """Flatten the (version dependent) training head output into tensors"""
+    if isinstance(out, dict):
+        out = list(out.values())
+    if isinstance(out, (list, tuple)):
+        return [t for o in out for t in _tensors(o)]
+    return [out] if hasattr(out, 'float') else []
+
+
+def probe_model(model_path, imgsz, threads, memory_limit, steps=3):
+    """
+    Time forward+backward passes on random batches of increasing size.
+    Stops before a batch whose projected peak memory would exceed `memory_limit`.
+    Returns {batch: images_per_sec} and the estimated memory per image.
+    """
+    import torch
+    from ultralytics import YOLO
+
+    torch.set_num_threads(threads)
+    net = YOLO(model_path).model.float().train()
+    for p in net.parameters():
+        p.requires_grad_(True)
+
+    results = {}
+    base_rss = _max_rss()
+    per_image = None
+    for batch in PROBE_BATCHES:
+        if per_image is not None and base_rss + per_image * batch > memory_limit:
+            break
+
+        x = torch.rand(batch, 3, imgsz, imgsz)
+        times = []
+        for step in range(steps + 1):
+            t0 = time.perf_counter()
+            out = net(x)
+            loss = sum(t.float().mean() for t in _tensors(out))
+            loss.backward()
+            net.zero_grad(set_to_none=True)
+            if step:  # first step is warm-up
+                times.append(time.perf_counter() - t0)
+
+        results[batch] = batch / (sum(times) / len(times))
+        per_image = max(per_image or 0, (_max_rss() - base_rss) / batch)
+        print(f"   batch={batch:<3} {results[batch]:6.1f} img/s")
+
+    return results, per_image or 0
+
+
+def probe_decode(image_dir, imgsz, samples=20):
+    """Average JPEG decode time (ms) and resized size (bytes) over a sample of images"""
+    import cv2
+
+    files = sorted(Path(image_dir).glob("*.jpg"))
+    if not files:
+        return 0.0, imgsz * imgsz * 3, 0
+
+    random.seed(0)
+    sample = random.sample(files, min(samples, len(files)))
+    decode_ms, resized = [], []
+    for f in sample:
+        t0 = time.perf_counter()
+        im = cv2.imread(str(f))
+        decode_ms.append((time.perf_counter() - t0) * 1000)
+        h, w = im.shape[:2]
+        r = imgsz / max(h, w)
+        resized.append(int(h * r) * int(w * r) * 3)
+
+    return sum(decode_ms) / len(decode_ms), sum(resized) / len(resized), len(files)
+
+
+def choose_profile(hardware, throughput, mem_per_image, decode_ms, image_bytes, n_images,
+                   cache_dir):
+    """Turn probe measurements into train() arguments"""
+    cores = hardware['cores']
+    budget = hardware['memory_available'] * MEMORY_BUDGET
+
+    # Largest batch that fits, unless a smaller one is clearly faster
+    fitting = {b: ips for b, ips in throughput.items() if mem_per_image * b <= budget}
+    fitting = fitting or {min(throughput): throughput[min(throughput)]}
+    best_ips = max(fitting.values())
+    batch = max(b for b, ips in fitting.items() if ips >= 0.9 * best_ips)
+    ips = fitting[batch]
+
+    # Decoded images are kept for the whole run if they fit next to the batch
+    cache_bytes = image_bytes * n_images
+    if cache_bytes <= budget - mem_per_image * batch:
+        cache = 'ram'
+    elif cache_bytes * 1.2 < shutil.disk_usage(cache_dir).free:
+        cache = 'disk'
+    else:
+        cache = False
+
+    # ultralytics forces workers=0 on CPU (BaseTrainer), so images are loaded in
+    # the training process between steps and torch gets every core
+    workers = CPU_WORKERS
+    threads = cores
+    load_ms = decode_ms if not cache else decode_ms * 0.1
+    loader_ms = batch * MOSAIC_IMAGES * load_ms
+
+    return {
+        'batch': batch,
+        'workers': workers,
+        'cache': cache,
+        'torch_threads': threads,
+        'probe_images_per_sec': round(ips, 2),
+        'loader_ms_per_batch': round(loader_ms, 1),
+        'estimated_cache_mb': round(cache_bytes / 2**20, 1),
+    }
+
+
+def profile_hardware(model_path, data="data.yaml", imgsz=640):
+    """Full probe: hardware detection, model benchmark and decode benchmark"""
+    print("\n🔬 Profiling hardware for CPU training...")
+    hardware = detect_hardware()
+    print(f"   {hardware['cores']} cores, "
+          f"{hardware['memory_available'] / 2**30:.1f} / {hardware['memory_total'] / 2**30:.1f} GB available")
+
+    with open(data) as f:
+        data_cfg = yaml.safe_load(f)
+    root = Path(data).parent / data_cfg.get('path', '.')
+    train_dir = root / data_cfg['train']
+
+    decode_ms, image_bytes, n_images = probe_decode(train_dir, imgsz)
+    print(f"   JPEG decode: {decode_ms:.1f} ms/image over {n_images} training images")
+
+    memory_limit = hardware['memory_available'] * MEMORY_BUDGET
+    throughput, mem_per_image = probe_model(model_path, imgsz, hardware['cores'], memory_limit)
+
+    choice = choose_profile(hardware, throughput, mem_per_image, decode_ms, image_bytes,
+                            n_images, train_dir)
+    print(f"   → batch={choice['batch']} workers={choice['workers']} (ultralytics loads in-process on CPU) "
+          f"cache={choice['cache']} threads={choice['torch_threads']}, "
+          f"~{choice['loader_ms_per_batch']:.0f} ms/batch loading")
+
+    return {
+        'hardware': hardware,
+        'probe': {
+            'imgsz': imgsz,
+            'images_per_sec': {b: round(v, 2) for b, v in throughput.items()},
+            'memory_per_image_mb': round(mem_per_image / 2**20, 1),
+            'decode_ms': round(decode_ms, 2),
+        },
+        'profile': choice,
+    }
+
+
+def apply_profile(profile, train_args):
+    """Set thread count and update train() keyword arguments in place"""
+    import torch
+
+    choice = profile['profile']
+    torch.set_num_threads(choice['torch_threads'])
+    train_args.update(batch=choice['batch'], workers=choice['workers'], cache=choice['cache'])
+    return train_args
+
+
+def add_profile_callbacks(model, profile):
+    """Write the profile next to args.yaml and record measured training throughput"""
+    def save(trainer):
+        with open(Path(trainer.save_dir) / PROFILE_FILENAME, 'w') as f:
+            yaml.safe_dump(profile, f, sort_keys=False)
+
+    def on_pretrain_routine_start(trainer):
+        import torch
+
+        # select_device() resets torch to min(8, cores - 1) threads; the trainer has set workers by now
+        torch.set_num_threads(profile['profile']['torch_threads'])
+        profile['effective'] = {'workers': trainer.args.workers, 'torch_threads': torch.get_num_threads()}
+        save(trainer)
+
+    def on_fit_epoch_end(trainer):
+        if 'train_images_per_sec' in profile or not trainer.epoch_time:
+            return
+        n = len(trainer.train_loader.dataset)
+        profile['train_images_per_sec'] = round(n / trainer.epoch_time, 2)
+        save(trainer)
+
+    model.add_callback("on_pretrain_routine_start", on_pretrain_routine_start)
+    model.add_callback("on_fit_epoch_end", on_fit_epoch_end)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Probe this machine and print a CPU training profile')
+    parser.add_argument('--model', default='yolov8s.pt', help='Model to benchmark')
+    parser.add_argument('--data', default='data.yaml', help='Dataset config')
+    parser.add_argument('--imgsz', type=int, default=640, help='Training image size')
+    args = parser.parse_args()
+
+    profile = profile_hardware(args.model, args.data, args.imgsz)
+    print()
+    print(yaml.safe_dump(profile, sort_keys=False))
+
+
+if __name__ == "__main__":
+    main()